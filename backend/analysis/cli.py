@@ -7,24 +7,51 @@ import pandas as pd
 def main() -> None:
 	root = Path(__file__).resolve().parents[1]
 	sys.path.insert(0, str(root))
-	from analysis.data_access import fetch_supabase_table, read_csv_table
+	from analysis.data_access import fetch_supabase_table, read_csv_table, read_memmap_table, read_parquet_table, read_sqlite_table
 	from analysis.metrics import summarize_co2, summarize_generation_mix, summarize_netzero
 
 	parser = argparse.ArgumentParser(description="Analysis CLI")
-	parser.add_argument("source", choices=["supabase", "csv"], help="Data source")
+	parser.add_argument("source", choices=["supabase", "csv", "parquet", "sqlite", "memmap"], help="Data source")
 	parser.add_argument("--limit", type=int, default=1000)
 	parser.add_argument("--csvdir", type=str, default="data")
+	parser.add_argument("--parquetdir", type=str, default="data/parquet")
+	parser.add_argument("--sqlite", type=str, default="data/simulator.db", help="SQLite database written with --output sqlite")
+	parser.add_argument("--memmapdir", type=str, default="data/memmap")
+	parser.add_argument("--days", type=int, default=None, help="CSV/Parquet/memmap: only the last N days")
+	parser.add_argument("--refresh", action="store_true", help="Supabase: drop the local cache and fetch everything again")
+	parser.add_argument("--no-cache", action="store_true", help="Supabase: bypass the local cache")
 	args = parser.parse_args()
 
 	if args.source == "supabase":
-		df_co2 = fetch_supabase_table("co2_intensity", limit=args.limit, order="timestamp")
-		df_gen = fetch_supabase_table("generation_mix", limit=args.limit, order="timestamp")
+		if args.refresh:
+			from analysis.fetch_cache import get_cache
+			if get_cache() is not None:
+				get_cache().invalidate()
+		# region_id breaks timestamp ties so pages never overlap
+		df_co2 = fetch_supabase_table("co2_intensity", limit=args.limit, order="timestamp,region_id", cache=not args.no_cache)
+		df_gen = fetch_supabase_table("generation_mix", limit=args.limit, order="timestamp,region_id", cache=not args.no_cache)
 		df_nz = fetch_supabase_table("netzero_alignment", limit=100, order="year")
+	elif args.source == "parquet":
+		start = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=args.days) if args.days else None
+		df_co2 = read_parquet_table(args.parquetdir, "co2_intensity", start=start)
+		df_gen = read_parquet_table(args.parquetdir, "generation_mix", start=start)
+		df_nz = read_parquet_table(args.parquetdir, "netzero_alignment")
+	elif args.source == "memmap":
+		start = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=args.days) if args.days else None
+		df_co2 = read_memmap_table(args.memmapdir, "co2_intensity", start=start)
+		df_gen = read_memmap_table(args.memmapdir, "generation_mix", start=start)
+		# Yearly alignment is not kept in the binary history
+		df_nz = pd.DataFrame()
+	elif args.source == "sqlite":
+		df_co2 = read_sqlite_table(args.sqlite, "co2_intensity", limit=args.limit, descending=True)
+		df_gen = read_sqlite_table(args.sqlite, "generation_mix", limit=args.limit, descending=True)
+		df_nz = read_sqlite_table(args.sqlite, "netzero_alignment", limit=100, order="year", descending=True)
 	else:
 		csvdir = Path(args.csvdir)
-		df_co2 = read_csv_table(str(csvdir / "co2_intensity.csv")) if (csvdir / "co2_intensity.csv").exists() else pd.DataFrame()
-		df_gen = read_csv_table(str(csvdir / "generation_mix.csv")) if (csvdir / "generation_mix.csv").exists() else pd.DataFrame()
-		df_nz = read_csv_table(str(csvdir / "netzero_alignment.csv")) if (csvdir / "netzero_alignment.csv").exists() else pd.DataFrame()
+		start = pd.Timestamp.now(tz="UTC") - pd.Timedelta(days=args.days) if args.days else None
+		df_co2 = read_csv_table(str(csvdir / "co2_intensity.csv"), limit=args.limit, start=start) if (csvdir / "co2_intensity.csv").exists() else pd.DataFrame()
+		df_gen = read_csv_table(str(csvdir / "generation_mix.csv"), limit=args.limit, start=start) if (csvdir / "generation_mix.csv").exists() else pd.DataFrame()
+		df_nz = read_csv_table(str(csvdir / "netzero_alignment.csv"), limit=100) if (csvdir / "netzero_alignment.csv").exists() else pd.DataFrame()
 
 	res = {
 		"co2": summarize_co2(df_co2),
@@ -1,9 +1,17 @@
 from __future__ import annotations
 
+import csv
+import io
+import logging
 import os
+from pathlib import Path
 from typing import Optional
+import numpy as np
 import pandas as pd
-import requests
+
+from simulator.transport import get_transport
+
+logger = logging.getLogger(__name__)
 
 
 def load_env():
@@ -16,23 +24,396 @@ def get_supabase_env() -> tuple[Optional[str], Optional[str]]:
 	return os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
 
 
-def fetch_supabase_table(table: str, limit: int = 1000, order: str = "timestamp") -> pd.DataFrame:
+# PostgREST (Supabase) returns at most max-rows (default 1000) rows per request
+SUPABASE_PAGE_ROWS = 1000
+SUPABASE_FETCH_WORKERS = 4
+
+
+def fetch_supabase_table(table: str, limit: int = 1000, order: str = "timestamp", columns: Optional[list[str]] = None, cache: bool = True) -> pd.DataFrame:
+	"""Latest ``limit`` rows of ``table``, newest first (paged, so ``limit`` may exceed max-rows).
+
+	Timestamp-ordered reads go through the local cache (see analysis.fetch_cache) unless
+	``cache`` is False or SUPABASE_CACHE_PATH is empty; only rows since the last read are fetched.
+	"""
+	if cache and order.split(",")[0] == "timestamp":
+		from .fetch_cache import get_cache
+		store = get_cache()
+		if store is not None:
+			return store.latest(table, limit, columns)
+	return fetch_supabase_range(table, columns=columns, order=order, descending=True, limit=limit)
+
+
+def fetch_supabase_cached(table: str, columns: Optional[list[str]] = None, start=None, end=None) -> pd.DataFrame:
+	"""fetch_supabase_range for start <= timestamp < end through the local cache, when enabled."""
+	from .fetch_cache import get_cache
+	store = get_cache()
+	if store is None:
+		return fetch_supabase_range(table, columns=columns, start=start, end=end, order="timestamp,region_id")
+	return store.range(table, columns, start, end)
+
+
+def fetch_supabase_range(table: str, columns: Optional[list[str]] = None, start=None, end=None, page_size: int = SUPABASE_PAGE_ROWS, order: str = "timestamp", descending: bool = False, limit: Optional[int] = None, max_workers: int = SUPABASE_FETCH_WORKERS) -> pd.DataFrame:
+	"""Rows of a Supabase table with start <= timestamp < end, as one DataFrame.
+
+	Only ``columns`` are selected. The first page also returns the exact row count; the
+	remaining pages are requested with ``Range`` headers, ``max_workers`` at a time over the
+	shared pooled transport, and each is parsed into a frame as it arrives. ``order`` is a
+	comma-separated column list; add a tie-breaker (e.g. ``timestamp,region_id``) when the
+	first column is not unique, so pages do not overlap.
+	"""
+	from concurrent.futures import ThreadPoolExecutor
+
 	url, key = get_supabase_env()
 	if not url or not key:
 		raise RuntimeError("Supabase URL/KEY not set in environment")
-	endpoint = f"{url}/rest/v1/{table}?select=*&order={order}.desc&limit={limit}"
-	headers = {
-		"apikey": key,
-		"Authorization": f"Bearer {key}",
+	order_cols = order.split(",")
+	for name in [table, *order_cols, *(columns or [])]:
+		if not name.isidentifier():
+			raise ValueError(f"Invalid table or column name: {name!r}")
+	params = {
+		"select": ",".join(columns) if columns else "*",
+		"order": ",".join(f"{c}.{'desc' if descending else 'asc'}" for c in order_cols),
 	}
-	resp = requests.get(endpoint, headers=headers, timeout=30)
-	resp.raise_for_status()
-	data = resp.json()
-	return pd.DataFrame(data)
+	bounds = []
+	if start is not None:
+		bounds.append(f"timestamp.gte.{_utc(start).isoformat()}")
+	if end is not None:
+		bounds.append(f"timestamp.lt.{_utc(end).isoformat()}")
+	if bounds:
+		params["and"] = f"({','.join(bounds)})"
+	endpoint = f"{url}/rest/v1/{table}"
+	headers = {"apikey": key, "Authorization": f"Bearer {key}"}
+	if limit is not None:
+		page_size = min(page_size, limit)
+
+	def page(first: int, last: int, count: bool = False):
+		resp = get_transport().get(endpoint, params=params, headers={**headers, "Range-Unit": "items", "Range": f"{first}-{last}", **({"Prefer": "count=exact"} if count else {})})
+		if resp.status_code == 416:
+			# Range past the end: the table shrank since the count
+			return pd.DataFrame(), 0
+		resp.raise_for_status()
+		total = resp.headers.get("Content-Range", "*/0").rsplit("/", 1)[-1]
+		return pd.DataFrame(resp.json()), int(total) if total.isdigit() else None
+
+	first, total = page(0, page_size - 1, count=True)
+	if total is not None and limit is not None:
+		total = min(total, limit)
+	frames = [first]
+	if total is not None and not first.empty and len(first) < total:
+		# The server may cap a page below page_size (max-rows)
+		page_size = len(first)
+		ranges = [(i, min(i + page_size, total) - 1) for i in range(page_size, total, page_size)]
+		with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+			frames.extend(df for df, _ in pool.map(lambda r: page(*r), ranges))
+	frames = [f for f in frames if not f.empty]
+	if not frames:
+		return pd.DataFrame(columns=columns)
+	df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+	return df[list(columns)] if columns is not None else df
+
+
+# Tail reads grow their window from this many bytes; range reads scan linearly below it
+CSV_READ_BLOCK_BYTES = 64 * 1024
+CSV_SCAN_ROWS = 2048
+
+
+def read_csv_table(path: str, limit: Optional[int] = None, start=None, end=None) -> pd.DataFrame:
+	"""Read a simulator CSV, or only part of it without parsing the rest.
+
+	``limit`` returns the last N rows by reading backwards from the end of the file.
+	``start``/``end`` return rows with start <= timestamp < end, found by binary search over
+	byte offsets, narrowed first by the sidecar ``<path>.idx`` from ``simulate compact --index``
+	when present. Both need the file in time order, as written by one simulator run or after
+	compaction. The rows they read are checked, and when they are out of order (e.g. several
+	backfills appended to one file) the whole file is read and filtered instead, and the result
+	is sorted by time. Rows must not contain quoted newlines.
+	"""
+	if limit is None and start is None and end is None:
+		return pd.read_csv(path)
+	if start is None and end is None:
+		df = _read_csv_tail(path, limit)
+		ordered = "timestamp" not in df.columns or _time_ordered(df["timestamp"])
+	else:
+		df = _read_csv_range(path, _utc(start), _utc(end))
+		ordered = df is not None
+		if ordered and limit is not None:
+			df = df.tail(limit).reset_index(drop=True)
+	if ordered:
+		return df
+	logger.warning("%s is not in time order; reading the whole file (run `python -m simulator.simulate compact`)", path)
+	return _read_csv_unordered(path, limit, _utc(start), _utc(end))
+
+
+def _time_ordered(values) -> bool:
+	ts = pd.to_datetime(values, utc=True, format="ISO8601")
+	return bool(ts.is_monotonic_increasing)
+
+
+def _read_csv_unordered(path: str, limit: Optional[int], start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> pd.DataFrame:
+	"""Full filtered read of a CSV that is not in time order; rows sorted by time, last ``limit`` kept."""
+	frames = []
+	for chunk in pd.read_csv(path, chunksize=CSV_SCAN_ROWS):
+		ts = pd.to_datetime(chunk["timestamp"], utc=True, format="ISO8601")
+		mask = pd.Series(True, index=chunk.index)
+		if start is not None:
+			mask &= ts >= start
+		if end is not None:
+			mask &= ts < end
+		frames.append(chunk[mask].assign(_ts=ts[mask]))
+	df = pd.concat(frames, ignore_index=True).sort_values("_ts", kind="stable").drop(columns="_ts")
+	if limit is not None:
+		df = df.tail(limit)
+	return df.reset_index(drop=True)
+
+
+def _csv_header(f) -> tuple[list[str], int]:
+	line = f.readline()
+	return next(csv.reader([line.decode("utf-8")])), f.tell()
+
+
+def _parse_csv_lines(header: list[str], data: bytes) -> pd.DataFrame:
+	return pd.read_csv(io.BytesIO(data), header=None, names=header)
+
+
+def _read_csv_tail(path: str, limit: int) -> pd.DataFrame:
+	with open(path, "rb") as f:
+		header, data_start = _csv_header(f)
+		size = f.seek(0, os.SEEK_END)
+		block = CSV_READ_BLOCK_BYTES
+		while True:
+			pos = max(data_start, size - block)
+			f.seek(pos)
+			data = f.read(size - pos)
+			# A line cut by a writer mid-append is not a row yet
+			data = data[:data.rfind(b"\n") + 1]
+			lines = data.split(b"\n")[:-1]
+			# The first line is partial unless the window reaches the header
+			complete = lines if pos == data_start else lines[1:]
+			if len(complete) >= limit or pos == data_start:
+				break
+			block *= 4
+	body = b"\n".join(complete[-limit:] if limit else []) + b"\n"
+	return _parse_csv_lines(header, body) if limit and complete else pd.DataFrame(columns=header)
+
+
+def _index_bounds(path: str, start: pd.Timestamp, lo: int, hi: int) -> tuple[int, int]:
+	"""Narrow [lo, hi) to the sparse index entries around ``start``."""
+	if not os.path.isfile(f"{path}.idx"):
+		return lo, hi
+	idx = pd.read_csv(f"{path}.idx")
+	if idx.empty:
+		return lo, hi
+	stamps = pd.to_datetime(idx["timestamp"], utc=True, format="ISO8601")
+	pos = int(stamps.searchsorted(start, side="right"))
+	offsets = idx["offset"].astype(int).tolist()
+	if pos > 0 and offsets[pos - 1] < hi:
+		lo = max(lo, offsets[pos - 1])
+	if pos < len(offsets) and offsets[pos] <= hi:
+		hi = min(hi, offsets[pos])
+	return lo, hi
+
+
+def _seek_time(f, path: str, ts_col: int, start: pd.Timestamp, data_start: int, size: int) -> int:
+	"""Offset of a line start at or before the first row with timestamp >= start."""
+	lo, hi = _index_bounds(path, start, data_start, size)
+	while hi - lo > CSV_READ_BLOCK_BYTES:
+		mid = (lo + hi) // 2
+		f.seek(mid)
+		f.readline()
+		pos = f.tell()
+		line = f.readline()
+		if not line.endswith(b"\n") or _utc(line.decode("utf-8").split(",")[ts_col]) >= start:
+			hi = mid
+		else:
+			lo = pos
+	return lo
+
+
+def _read_csv_range(path: str, start: Optional[pd.Timestamp], end: Optional[pd.Timestamp]) -> Optional[pd.DataFrame]:
+	"""Rows in [start, end), or None when the rows scanned show the file is not in time order."""
+	with open(path, "rb") as f:
+		header, data_start = _csv_header(f)
+		if "timestamp" not in header:
+			raise ValueError(f"{path} has no timestamp column for a time-range read")
+		ts_col = header.index("timestamp")
+		size = f.seek(0, os.SEEK_END)
+		offset = _seek_time(f, path, ts_col, start, data_start, size) if start is not None else data_start
+		f.seek(offset)
+		frames = []
+		last = None
+		for chunk in pd.read_csv(f, header=None, names=header, chunksize=CSV_SCAN_ROWS):
+			ts = pd.to_datetime(chunk["timestamp"], utc=True, format="ISO8601")
+			# The search lands on a row before start unless at the first row; the scan must not go backwards
+			if last is None and offset > data_start and ts.iloc[0] >= start:
+				return None
+			if not ts.is_monotonic_increasing or (last is not None and ts.iloc[0] < last):
+				return None
+			last = ts.iloc[-1]
+			mask = pd.Series(True, index=chunk.index)
+			if start is not None:
+				mask &= ts >= start
+			if end is not None:
+				mask &= ts < end
+			frames.append(chunk[mask])
+			if end is not None and ts.iloc[-1] >= end:
+				break
+	if not frames:
+		return pd.DataFrame(columns=header)
+	return pd.concat(frames, ignore_index=True)
+
+
+def read_parquet_table(root: str, table: str, start=None, end=None, columns: Optional[list[str]] = None) -> pd.DataFrame:
+	"""Read ``<root>/<table>`` as written by the simulator's Parquet output.
+
+	Only day partitions overlapping [start, end) are opened and only ``columns`` (plus the
+	timestamp needed to filter) are read. ``start``/``end`` are anything pd.Timestamp accepts;
+	naive values are taken as UTC.
+	"""
+	import pyarrow.parquet as pq
+
+	base = Path(root) / table
+	if not base.is_dir():
+		return pd.DataFrame(columns=columns)
+	start = _utc(start)
+	end = _utc(end)
+	files = []
+	for part in sorted(base.glob("date=*")):
+		day = pd.Timestamp(part.name.split("=", 1)[1], tz="UTC")
+		if (start is not None and day + pd.Timedelta(days=1) <= start) or (end is not None and day >= end):
+			continue
+		files.extend(sorted(part.glob("*.parquet")))
+	# Tables without a timestamp (netzero_alignment) are not partitioned
+	files.extend(sorted(base.glob("*.parquet")))
+	if not files:
+		return pd.DataFrame(columns=columns)
+
+	read_cols = None
+	if columns is not None:
+		read_cols = list(columns)
+		if (start is not None or end is not None) and "timestamp" not in read_cols:
+			read_cols.append("timestamp")
+	frames = [pq.read_table(f, columns=read_cols).to_pandas() for f in files]
+	df = pd.concat(frames, ignore_index=True)
+	if "timestamp" in df.columns and (start is not None or end is not None):
+		mask = pd.Series(True, index=df.index)
+		if start is not None:
+			mask &= df["timestamp"] >= start
+		if end is not None:
+			mask &= df["timestamp"] < end
+		df = df[mask]
+	if "timestamp" in df.columns:
+		df = df.sort_values("timestamp", kind="stable")
+	if columns is not None:
+		df = df[list(columns)]
+	return df.reset_index(drop=True)
+
+
+def read_sqlite_table(path: str, table: str, start=None, end=None, columns: Optional[list[str]] = None, limit: Optional[int] = None, order: str = "timestamp", descending: bool = False) -> pd.DataFrame:
+	"""Read a table from the simulator's SQLite database (see simulator.sqlite_store).
+
+	``start``/``end`` bound the timestamp to [start, end) and are answered from the timestamp
+	index; with ``descending=True`` and a ``limit`` this returns the latest rows, like
+	fetch_supabase_table. Timestamps are returned as ISO-8601 strings, as from Supabase.
+	"""
+	import sqlite3
+
+	for name in [table, order, *(columns or [])]:
+		if not name.isidentifier():
+			raise ValueError(f"Invalid table or column name: {name!r}")
+	if not os.path.isfile(path):
+		raise RuntimeError(f"SQLite database not found: {path}")
+	select = ", ".join(f'"{c}"' for c in columns) if columns else "*"
+	where, params = [], []
+	if start is not None:
+		where.append('"timestamp" >= ?')
+		params.append(_utc(start).isoformat())
+	if end is not None:
+		where.append('"timestamp" < ?')
+		params.append(_utc(end).isoformat())
+	sql = f"select {select} from {table}"
+	if where:
+		sql += " where " + " and ".join(where)
+	sql += f' order by "{order}" {"desc" if descending else "asc"}'
+	if limit is not None:
+		sql += " limit ?"
+		params.append(int(limit))
+	conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+	try:
+		return pd.read_sql_query(sql, conn, params=params)
+	finally:
+		conn.close()
+
+
+def read_segment_table(root: str, table: str, start=None, end=None, columns: Optional[list[str]] = None) -> pd.DataFrame:
+	"""Union of the CSV segments under ``<root>/<table>`` (see simulator.segments) for [start, end).
+
+	Sealed segments are chosen from the manifest by their time range and read compressed;
+	active segments of running writers are read up to their last complete row. Rows are
+	returned in time order with timestamps as UTC datetimes.
+	"""
+	from simulator.segments import list_segments
+
+	start, end = _utc(start), _utc(end)
+	bounds = [None if t is None else t.tz_convert(None).to_datetime64() for t in (start, end)]
+	for attempt in range(3):
+		try:
+			frames = [_read_segment(seg, columns) for seg in list_segments(root, table, *bounds)]
+			break
+		except FileNotFoundError:
+			# A writer sealed an active segment between listing and reading it; list again
+			if attempt == 2:
+				raise
+	frames = [f for f in frames if not f.empty]
+	if not frames:
+		return pd.DataFrame(columns=columns)
+	df = pd.concat(frames, ignore_index=True)
+	if "timestamp" in df.columns:
+		df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, format="ISO8601")
+		mask = pd.Series(True, index=df.index)
+		if start is not None:
+			mask &= df["timestamp"] >= start
+		if end is not None:
+			mask &= df["timestamp"] < end
+		df = df[mask].sort_values("timestamp", kind="stable")
+	if columns is not None:
+		df = df[list(columns)]
+	return df.reset_index(drop=True)
+
+
+def _read_segment(seg: dict, columns: Optional[list[str]]) -> pd.DataFrame:
+	usecols = None
+	if columns is not None:
+		usecols = lambda c: c in columns or c == "timestamp"
+	if seg["sealed"]:
+		return pd.read_csv(seg["path"], usecols=usecols, compression="infer")
+	with open(seg["path"], "rb") as f:
+		data = f.read()
+	# The writer may be mid-flush: only complete lines are rows
+	data = data[:data.rfind(b"\n") + 1]
+	if data.count(b"\n") < 2:
+		return pd.DataFrame()
+	return pd.read_csv(io.BytesIO(data), usecols=usecols)
+
 
+def read_memmap_table(root: str, table: str, start=None, end=None, columns: Optional[list[str]] = None, region_id: str = "default") -> pd.DataFrame:
+	"""Read [start, end) of the simulator's binary column files (see simulator.memmap_store).
 
-def read_csv_table(path: str) -> pd.DataFrame:
-	return pd.read_csv(path)
+	The range is found by binary search on the mapped timestamps; only that slice of each
+	requested column is copied into the frame. Timestamps come back as UTC datetimes.
+	"""
+	from simulator.memmap_store import MemmapTable
 
+	try:
+		view = MemmapTable(root, table, region_id).range(start, end, columns)
+	except FileNotFoundError:
+		return pd.DataFrame(columns=["timestamp", *(c for c in (columns or []) if c != "timestamp")])
+	df = pd.DataFrame({name: np.array(col) for name, col in view.items()})
+	df["timestamp"] = pd.to_datetime(df["timestamp"], unit="s", utc=True)
+	return df
 
 
+def _utc(value) -> Optional[pd.Timestamp]:
+	if value is None:
+		return None
+	ts = pd.Timestamp(value)
+	return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
@@ -0,0 +1,261 @@
+"""Local SQLite cache of Supabase rows, refreshed incrementally.
+
+Rows are cached per (table, columns) together with a high-water mark, the newest cached
+timestamp. A later read only fetches ``timestamp >= watermark`` and merges it on
+(region_id, timestamp). Re-reading the watermark step picks up regions that landed after
+the previous fetch, and re-upserts of it. A low mark records how far back the cache
+reaches (its oldest step may hold only some regions); reads that go further back fetch
+the missing span once.
+
+Invalidate with ``invalidate(table)``. When the rows exceed ``max_bytes``, whole entries
+are evicted, least recently used first. Settings: SUPABASE_CACHE_PATH
+(data/cache/supabase.db, empty disables) and SUPABASE_CACHE_MAX_MB (256).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import pandas as pd
+
+from .data_access import _utc, fetch_supabase_range
+
+logger = logging.getLogger(__name__)
+
+KEY_COLUMNS = ("region_id", "timestamp")
+
+SCHEMA = """
+create table if not exists entries (
+	key text primary key,
+	source text not null,
+	watermark text,
+	low text,
+	complete integer not null default 0,
+	bytes integer not null default 0,
+	last_used real not null
+);
+create table if not exists rows (
+	key text not null,
+	row_key text not null,
+	ts text not null,
+	data text not null,
+	primary key (key, row_key)
+) without rowid;
+create index if not exists idx_rows_key_ts on rows (key, ts);
+"""
+
+
+def _ts_text(values) -> pd.Series:
+	# Fixed-width UTC text sorts like the timestamps themselves
+	return pd.to_datetime(values, utc=True, format="ISO8601").dt.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _bound(value) -> Optional[str]:
+	return None if value is None else _utc(value).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _after(ts: str) -> str:
+	return (pd.Timestamp(ts) + pd.Timedelta(microseconds=1)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class SupabaseCache:
+	"""Incremental cache for tables keyed by (region_id, timestamp), e.g. co2_intensity."""
+
+	def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+		self.path = path
+		self.max_bytes = max_bytes
+		if os.path.dirname(path):
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+		conn = sqlite3.connect(path, timeout=30)
+		try:
+			# Must precede table creation and WAL; lets evictions hand pages back to the filesystem
+			conn.execute("pragma auto_vacuum=incremental")
+			conn.executescript(SCHEMA)
+		finally:
+			conn.close()
+
+	def _connect(self) -> sqlite3.Connection:
+		conn = sqlite3.connect(self.path, timeout=30)
+		conn.execute("pragma journal_mode=wal")
+		conn.execute("pragma synchronous=normal")
+		return conn
+
+	@staticmethod
+	def _key(table: str, columns: Optional[list[str]]) -> str:
+		return f"{table}:{','.join(columns) if columns else '*'}"
+
+	@staticmethod
+	def _fetch_columns(columns: Optional[list[str]]) -> Optional[list[str]]:
+		return None if columns is None else [*columns, *(c for c in KEY_COLUMNS if c not in columns)]
+
+	def range(self, table: str, columns: Optional[list[str]] = None, start=None, end=None) -> pd.DataFrame:
+		"""Rows with start <= timestamp < end in time order, fetching only what is not cached."""
+		key = self._key(table, columns)
+		conn = self._connect()
+		try:
+			entry = self._entry(conn, key)
+			lo = _bound(start)
+			if entry is not None:
+				self._refresh(conn, key, table, columns, entry)
+			if entry is None or not (entry["complete"] or (lo is not None and lo > entry["low"])):
+				# Cold, or the window reaches below the cached span: fetch [start, low], as the low step may be partial
+				upper = _after(entry["low"]) if entry is not None else None
+				df = fetch_supabase_range(table, self._fetch_columns(columns), start=start, end=upper, order="timestamp,region_id")
+				self._merge(conn, key, table, df, low=lo, complete=start is None)
+			where, params = "key = ?", [key]
+			if lo is not None:
+				where += " and ts >= ?"
+				params.append(lo)
+			if end is not None:
+				where += " and ts < ?"
+				params.append(_bound(end))
+			df = self._frame(conn, f"select data from rows where {where} order by ts, row_key", params, columns)
+			self._touch(conn, key)
+			return df
+		finally:
+			conn.close()
+
+	def latest(self, table: str, limit: int, columns: Optional[list[str]] = None) -> pd.DataFrame:
+		"""The newest ``limit`` rows, newest first, like fetch_supabase_table."""
+		key = self._key(table, columns)
+		conn = self._connect()
+		try:
+			entry = self._entry(conn, key)
+			if entry is not None:
+				self._refresh(conn, key, table, columns, entry)
+				entry = self._entry(conn, key)
+			while entry is None or (not entry["complete"] and self._count(conn, key, entry["low"]) < limit):
+				# The oldest cached step may lack regions that sort below the last fetch: fetch from it again
+				upper, ask = None, limit
+				if entry is not None:
+					upper = _after(entry["low"])
+					ask = limit - self._count(conn, key, entry["low"]) + self._count(conn, key, entry["low"], upper)
+				df = fetch_supabase_range(table, self._fetch_columns(columns), end=upper, order="timestamp,region_id", descending=True, limit=ask)
+				complete = len(df) < ask
+				self._merge(conn, key, table, df, low=None if complete else _ts_text(df["timestamp"]).min(), complete=complete)
+				entry = self._entry(conn, key)
+			df = self._frame(conn, "select data from rows where key = ? order by ts desc, row_key desc limit ?", [key, int(limit)], columns)
+			self._touch(conn, key)
+			return df
+		finally:
+			conn.close()
+
+	def invalidate(self, table: Optional[str] = None) -> int:
+		"""Drop the cached rows of ``table`` (every table when None); returns the entries removed."""
+		conn = self._connect()
+		try:
+			with conn:
+				keys = [r[0] for r in conn.execute("select key from entries where ? is null or source = ?", (table, table))]
+				for key in keys:
+					self._drop(conn, key)
+			self._vacuum(conn)
+			return len(keys)
+		finally:
+			conn.close()
+
+	def size_bytes(self) -> int:
+		conn = self._connect()
+		try:
+			return int(conn.execute("select coalesce(sum(bytes), 0) from entries").fetchone()[0])
+		finally:
+			conn.close()
+
+	def _refresh(self, conn: sqlite3.Connection, key: str, table: str, columns: Optional[list[str]], entry: dict) -> None:
+		# Everything from the watermark step on: late regions and re-upserts of that step are replaced
+		since = entry["watermark"] or entry["low"]
+		if since is None and not entry["complete"]:
+			return
+		df = fetch_supabase_range(table, self._fetch_columns(columns), start=since, order="timestamp,region_id")
+		self._merge(conn, key, table, df)
+
+	def _merge(self, conn: sqlite3.Connection, key: str, table: str, df: pd.DataFrame, low: Optional[str] = None, complete: bool = False) -> None:
+		with conn:
+			entry = self._entry(conn, key)
+			if entry is None:
+				conn.execute("insert into entries (key, source, low, complete, last_used) values (?, ?, ?, ?, ?)", (key, table, low, int(complete), time.time()))
+			elif not entry["complete"] and (complete or (low is not None and (entry["low"] is None or low < entry["low"]))):
+				conn.execute("update entries set low = ?, complete = ? where key = ?", (None if complete else low, int(complete), key))
+			if not df.empty:
+				ts = _ts_text(df["timestamp"])
+				regions = df["region_id"].astype(str) if "region_id" in df.columns else pd.Series("", index=df.index)
+				records = df.to_dict(orient="records")
+				conn.executemany(
+					"insert or replace into rows (key, row_key, ts, data) values (?, ?, ?, ?)",
+					[(key, f"{t}|{r}", t, json.dumps(rec, default=str)) for t, r, rec in zip(ts, regions, records)],
+				)
+				conn.execute("update entries set watermark = max(coalesce(watermark, ''), ?) where key = ?", (ts.max(), key))
+			conn.execute("update entries set bytes = (select coalesce(sum(length(data)), 0) from rows where key = ?) where key = ?", (key, key))
+		self._evict(conn, keep=key)
+
+	def _evict(self, conn: sqlite3.Connection, keep: str) -> None:
+		total = int(conn.execute("select coalesce(sum(bytes), 0) from entries").fetchone()[0])
+		if total <= self.max_bytes:
+			return
+		with conn:
+			for key, size in conn.execute("select key, bytes from entries where key != ? order by last_used", (keep,)).fetchall():
+				if total <= self.max_bytes:
+					break
+				self._drop(conn, key)
+				total -= size
+				logger.info("Evicted %s from the Supabase cache (%d bytes)", key, size)
+		if total > self.max_bytes:
+			logger.warning("Supabase cache entry %s alone exceeds %d bytes", keep, self.max_bytes)
+		self._vacuum(conn)
+
+	@staticmethod
+	def _vacuum(conn: sqlite3.Connection) -> None:
+		# executescript runs the pragma to completion; execute() would free a single page
+		conn.executescript("pragma incremental_vacuum;")
+
+	@staticmethod
+	def _drop(conn: sqlite3.Connection, key: str) -> None:
+		conn.execute("delete from rows where key = ?", (key,))
+		conn.execute("delete from entries where key = ?", (key,))
+
+	@staticmethod
+	def _entry(conn: sqlite3.Connection, key: str) -> Optional[dict]:
+		row = conn.execute("select watermark, low, complete from entries where key = ?", (key,)).fetchone()
+		return None if row is None else {"watermark": row[0], "low": row[1], "complete": bool(row[2])}
+
+	@staticmethod
+	def _count(conn: sqlite3.Connection, key: str, low: Optional[str], high: Optional[str] = None) -> int:
+		sql, params = "select count(*) from rows where key = ? and ts >= ?", [key, low or ""]
+		if high is not None:
+			sql += " and ts < ?"
+			params.append(high)
+		return int(conn.execute(sql, params).fetchone()[0])
+
+	@staticmethod
+	def _touch(conn: sqlite3.Connection, key: str) -> None:
+		with conn:
+			conn.execute("update entries set last_used = ? where key = ?", (time.time(), key))
+
+	@staticmethod
+	def _frame(conn: sqlite3.Connection, sql: str, params: list, columns: Optional[list[str]]) -> pd.DataFrame:
+		data = [r[0] for r in conn.execute(sql, params)]
+		if not data:
+			return pd.DataFrame(columns=columns)
+		df = pd.DataFrame(json.loads("[" + ",".join(data) + "]"))
+		return df[list(columns)] if columns is not None else df
+
+
+_shared: Optional[SupabaseCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_cache() -> Optional[SupabaseCache]:
+	"""The process-wide cache from the environment, or None when SUPABASE_CACHE_PATH is empty."""
+	global _shared
+	path = os.getenv("SUPABASE_CACHE_PATH", "data/cache/supabase.db")
+	if not path:
+		return None
+	with _shared_lock:
+		if _shared is None or _shared.path != path:
+			_shared = SupabaseCache(path, max_bytes=int(float(os.getenv("SUPABASE_CACHE_MAX_MB", "256")) * 1024 * 1024))
+		return _shared
@@ -13,7 +13,10 @@ import warnings
 # This allows us to import our simulator and analysis modules
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from simulator.simulate import simulate_generation_mix, simulate_co2_intensity, simulate_netzero_alignment, _now_tz, SimulatorConfig
+from simulator.simulate import simulate_keyed, simulate_netzero_alignment, _now_tz, SimulatorConfig
+from simulator.ensemble import simulate_ensemble
+from simulator.memmap_store import MemmapTable
+from simulator.models import iso_timestamps
 from analysis.goal_tracker import compute_goal_tracker
 
 app = Flask(__name__)
@@ -56,6 +59,18 @@ api = Api(
 # Suppress warnings for cleaner output
 warnings.filterwarnings('ignore')
 
+# Simulated series are keyed by (seed, timestamp), so every worker returns the same
+# values for the same time range and single points can be computed on their own.
+SIM_SEED = int(os.getenv('SIM_RANDOM_SEED', '0'))
+CO2_COLUMNS = ["timestamp", "co2_intensity_g_per_kwh"]
+MIX_COLUMNS = ["timestamp", "hydro_mw", "wind_mw", "solar_mw", "nuclear_mw", "fossil_mw", "total_mw", "renewable_share_pct"]
+MAX_ENSEMBLE_MEMBERS = 2000
+MAX_ENSEMBLE_HOURS = 24 * 14
+# Stored history written with OUTPUT_MODE=memmap; one request returns at most a year of 15-minute rows
+MEMMAP_DIR = os.getenv('MEMMAP_OUTPUT_DIR', 'data/memmap')
+HISTORY_TABLES = {"co2_intensity": CO2_COLUMNS, "generation_mix": MIX_COLUMNS}
+MAX_HISTORY_ROWS = 366 * 96
+
 # Define data models for API documentation
 co2_model = api.model('CO2Data', {
     'timestamp': fields.String(required=True, description='ISO timestamp'),
@@ -173,37 +188,28 @@ success_model = api.model('SuccessResponse', {
 def generate_live_data(periods=96, freq='15min'):
     """Generates a DataFrame of simulated power plant data."""
     cfg = SimulatorConfig(output_mode="none")
-    anchor = _now_tz(cfg.timezone)
+    anchor = pd.Timestamp(_now_tz(cfg.timezone)).floor(freq)
     timestamps = pd.to_datetime(pd.date_range(end=anchor, periods=periods, freq=freq))
-    
-    # Generate records using the correct simulation functions
-    mix_records = []
-    co2_records = []
-    
-    for ts in timestamps:
-        gen_record = simulate_generation_mix(ts)
-        co2_record = simulate_co2_intensity(ts, gen_record)
-        mix_records.append(gen_record)
-        co2_records.append(co2_record)
-    
-    # Convert records to DataFrames for easier manipulation
-    df_mix = pd.DataFrame([{
-        "timestamp": r.timestamp.isoformat(),
-        "hydro_mw": r.hydro_mw,
-        "wind_mw": r.wind_mw,
-        "solar_mw": r.solar_mw,
-        "nuclear_mw": r.nuclear_mw,
-        "fossil_mw": r.fossil_mw,
-        "total_mw": r.total_mw,
-        "renewable_share_pct": r.renewable_share_pct,
-        "co2_intensity_g_per_kwh": co2_records[i].co2_intensity_g_per_kwh
-    } for i, r in enumerate(mix_records)])
-    
-    df_co2 = pd.DataFrame([{
-        "timestamp": r.timestamp.isoformat(),
-        "co2_intensity_g_per_kwh": r.co2_intensity_g_per_kwh
-    } for r in co2_records])
+    df_co2, df_mix = simulate_frames(timestamps)
+    df_mix["co2_intensity_g_per_kwh"] = df_co2["co2_intensity_g_per_kwh"].values
+    return df_co2, df_mix
+
+def parse_timestamp(value):
+    """Parse a path timestamp into a one-element UTC DatetimeIndex, or None if invalid."""
+    try:
+        ts = pd.Timestamp(value)
+    except (ValueError, TypeError):
+        return None
+    if ts is pd.NaT:
+        return None
+    ts = ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+    return pd.DatetimeIndex([ts])
 
+def simulate_frames(timestamps):
+    """Vectorized simulation over a DatetimeIndex, returned as (co2, mix) DataFrames with ISO timestamps."""
+    co2, gen = simulate_keyed(timestamps, seed=SIM_SEED)
+    df_mix = gen.to_frame(MIX_COLUMNS, iso=True)
+    df_co2 = co2.to_frame(CO2_COLUMNS, iso=True)
     return df_co2, df_mix
 
 def generate_netzero_data():
@@ -254,6 +260,7 @@ system_ns = api.namespace('system', description='System health and status operat
 forecast_ns = api.namespace('forecast', description='Predictive forecasting operations')
 scenario_ns = api.namespace('scenario', description='What-if scenario modeling')
 insights_ns = api.namespace('insights', description='Automated insights and alerts')
+history_ns = api.namespace('history', description='Stored simulator history (memory-mapped column files)')
 
 @co2_ns.route('/')
 class CO2Data(Resource):
@@ -304,7 +311,7 @@ class CO2DataItem(Resource):
     @api.doc('get_co2_data_by_timestamp',
              responses={
                  200: 'Success',
-                 404: 'Not Found',
+                 400: 'Bad Request',
                  500: 'Internal Server Error'
              })
     @api.marshal_with(co2_model)
@@ -313,13 +320,13 @@ class CO2DataItem(Resource):
         
         Retrieve a specific CO₂ intensity measurement by timestamp.
         """
+        index = parse_timestamp(timestamp)
+        if index is None:
+            api.abort(400, f"Invalid timestamp: {timestamp}")
         try:
-            # In a real system, you would query the database
-            df_co2, _ = generate_live_data()
-            record = df_co2[df_co2['timestamp'] == timestamp]
-            if record.empty:
-                api.abort(404, f"CO₂ data not found for timestamp: {timestamp}")
-            return record.iloc[0].to_dict()
+            # Keyed generation: compute just this point, identical to the value in the listing
+            df_co2, _ = simulate_frames(index)
+            return df_co2.iloc[0].to_dict()
         except Exception as e:
             api.abort(500, f"Error retrieving CO₂ data: {str(e)}")
 
@@ -438,7 +445,7 @@ class MixDataItem(Resource):
     @api.doc('get_mix_data_by_timestamp',
              responses={
                  200: 'Success',
-                 404: 'Not Found',
+                 400: 'Bad Request',
                  500: 'Internal Server Error'
              })
     @api.marshal_with(mix_model)
@@ -447,12 +454,13 @@ class MixDataItem(Resource):
         
         Retrieve a specific generation mix measurement by timestamp.
         """
+        index = parse_timestamp(timestamp)
+        if index is None:
+            api.abort(400, f"Invalid timestamp: {timestamp}")
         try:
-            _, df_mix = generate_live_data()
-            record = df_mix[df_mix['timestamp'] == timestamp]
-            if record.empty:
-                api.abort(404, f"Mix data not found for timestamp: {timestamp}")
-            return record.iloc[0].to_dict()
+            df_co2, df_mix = simulate_frames(index)
+            df_mix["co2_intensity_g_per_kwh"] = df_co2["co2_intensity_g_per_kwh"].values
+            return df_mix.iloc[0].to_dict()
         except Exception as e:
             api.abort(500, f"Error retrieving mix data: {str(e)}")
 
@@ -825,18 +833,12 @@ class CO2Forecast(Resource):
             config = SimulatorConfig()
             
             # Generate historical timestamps (last 7 days)
-            anchor = _now_tz(config.timezone)
+            anchor = pd.Timestamp(_now_tz(config.timezone)).floor('15min')
             timestamps = pd.to_datetime(pd.date_range(end=anchor, periods=672, freq='15min'))
             
             # Generate historical data using the simulator
-            historical_data = []
-            for ts in timestamps:
-                gen_record = simulate_generation_mix(ts)
-                co2_record = simulate_co2_intensity(ts, gen_record)
-                historical_data.append({
-                    "timestamp": co2_record.timestamp.isoformat(),
-                    "co2_intensity_g_per_kwh": co2_record.co2_intensity_g_per_kwh
-                })
+            df_hist, _ = simulate_frames(timestamps)
+            historical_data = df_hist.to_dict(orient='records')
             
             if len(historical_data) < 100:
                 api.abort(400, "Insufficient historical data for forecasting")
@@ -904,6 +906,100 @@ class CO2Forecast(Resource):
         except Exception as e:
             api.abort(500, f"Error generating forecast: {str(e)}")
 
+@forecast_ns.route('/ensemble')
+class EnsembleForecast(Resource):
+    @api.doc('forecast_ensemble',
+             description='Monte Carlo ensemble of the simulator with P10/P50/P90 uncertainty bands',
+             params={
+                 'members': f'Number of ensemble members (default: 1000, max: {MAX_ENSEMBLE_MEMBERS})',
+                 'hours': f'Horizon in hours from the current 15-minute slot (default: 168, max: {MAX_ENSEMBLE_HOURS})',
+                 'seed': 'Random seed (default: SIM_RANDOM_SEED)'
+             },
+             responses={
+                 200: 'Success',
+                 400: 'Bad Request',
+                 500: 'Internal Server Error'
+             })
+    def get(self):
+        """P10/P50/P90 bands per technology and for CO2 intensity from a simulated ensemble"""
+        try:
+            members = int(request.args.get('members', 1000))
+            hours = int(request.args.get('hours', 168))
+            seed = int(request.args.get('seed', SIM_SEED))
+        except ValueError:
+            api.abort(400, "members, hours and seed must be integers")
+        if not 1 <= members <= MAX_ENSEMBLE_MEMBERS or not 1 <= hours <= MAX_ENSEMBLE_HOURS:
+            api.abort(400, f"members must be 1-{MAX_ENSEMBLE_MEMBERS} and hours 1-{MAX_ENSEMBLE_HOURS}")
+
+        try:
+            config = SimulatorConfig()
+            anchor = pd.Timestamp(_now_tz(config.timezone)).floor('15min')
+            timestamps = pd.date_range(start=anchor, periods=hours * 4, freq='15min')
+            ensemble = simulate_ensemble(timestamps, members=members, seed=seed)
+            bands = ensemble.bands_frame()
+            return {
+                'bands': bands.to_dict(orient='records'),
+                'model_info': {
+                    'type': 'Monte Carlo ensemble',
+                    'members': ensemble.size,
+                    'percentiles': [10, 50, 90],
+                    'forecast_horizon_hours': hours,
+                    'seed': seed
+                },
+                'metadata': {
+                    'generated_at': datetime.datetime.now().isoformat(),
+                    'data_source': 'simulated_ensemble'
+                }
+            }
+        except Exception as e:
+            api.abort(500, f"Error generating ensemble: {str(e)}")
+
+# ============================================================================
+# HISTORY ENDPOINTS
+# ============================================================================
+
+@history_ns.route('/<string:table>')
+class StoredHistory(Resource):
+    @api.doc('get_history',
+             description='Time range of the stored history, read from memory-mapped column files by binary search',
+             params={
+                 'start': 'Range start (ISO 8601, inclusive; default: first stored row)',
+                 'end': 'Range end (ISO 8601, exclusive; default: after the last stored row)',
+                 'region': 'Region id (default: default)'
+             },
+             responses={
+                 200: 'Success',
+                 400: 'Bad Request',
+                 404: 'Not Found',
+                 500: 'Internal Server Error'
+             })
+    def get(self, table):
+        """Stored CO2 intensity or generation mix rows in [start, end)"""
+        if table not in HISTORY_TABLES:
+            api.abort(404, f"Unknown table: {table} (expected one of {', '.join(HISTORY_TABLES)})")
+        bounds = {}
+        for name in ('start', 'end'):
+            value = request.args.get(name)
+            if value is not None:
+                index = parse_timestamp(value)
+                if index is None:
+                    api.abort(400, f"Invalid {name} timestamp: {value}")
+                bounds[name] = index[0].to_pydatetime()
+        try:
+            store = MemmapTable(MEMMAP_DIR, table, request.args.get('region', 'default'))
+        except FileNotFoundError:
+            api.abort(404, f"No stored history for {table}")
+        i, j = store.index_range(bounds.get('start'), bounds.get('end'))
+        if j - i > MAX_HISTORY_ROWS:
+            api.abort(400, f"Range has {j - i} rows; at most {MAX_HISTORY_ROWS} per request")
+        try:
+            view = store.range(bounds.get('start'), bounds.get('end'), HISTORY_TABLES[table][1:])
+            df = pd.DataFrame({name: col for name, col in view.items() if name != 'timestamp'})
+            df.insert(0, 'timestamp', iso_timestamps(view['timestamp'].astype('datetime64[s]')))
+            return {'data': df.to_dict(orient='records'), 'rows': len(df)}
+        except Exception as e:
+            api.abort(500, f"Error reading history: {str(e)}")
+
 # ============================================================================
 # SCENARIO MODELING ENDPOINTS
 # ============================================================================
@@ -936,24 +1032,13 @@ class ScenarioModeler(Resource):
             config = SimulatorConfig()
             
             # Generate current mix timestamps (last 24 hours)
-            anchor = _now_tz(config.timezone)
+            anchor = pd.Timestamp(_now_tz(config.timezone)).floor('15min')
             timestamps = pd.to_datetime(pd.date_range(end=anchor, periods=96, freq='15min'))
             
             # Generate current mix data using the simulator
-            current_mix = []
-            for ts in timestamps:
-                gen_record = simulate_generation_mix(ts)
-                current_mix.append({
-                    "timestamp": gen_record.timestamp.isoformat(),
-                    "hydro_mw": gen_record.hydro_mw,
-                    "wind_mw": gen_record.wind_mw,
-                    "solar_mw": gen_record.solar_mw,
-                    "nuclear_mw": gen_record.nuclear_mw,
-                    "fossil_mw": gen_record.fossil_mw,
-                    "total_mw": gen_record.total_mw,
-                    "renewable_share_pct": gen_record.renewable_share_pct,
-                    "co2_intensity_g_per_kwh": simulate_co2_intensity(ts, gen_record).co2_intensity_g_per_kwh
-                })
+            df_co2_now, df_mix_now = simulate_frames(timestamps)
+            df_mix_now["co2_intensity_g_per_kwh"] = df_co2_now["co2_intensity_g_per_kwh"].values
+            current_mix = df_mix_now.to_dict(orient='records')
             
             # Apply scenario modifications
             scenario_mix = []
@@ -1066,35 +1151,18 @@ class InsightsFeed(Resource):
             config = SimulatorConfig()
             
             # Generate timestamps for historical data
-            anchor = _now_tz(config.timezone)
+            anchor = pd.Timestamp(_now_tz(config.timezone)).floor('15min')
             co2_timestamps = pd.to_datetime(pd.date_range(end=anchor, periods=672, freq='15min'))
             mix_timestamps = pd.to_datetime(pd.date_range(end=anchor, periods=96, freq='15min'))
             
             # Generate CO2 data (last 7 days)
-            co2_data = []
-            for ts in co2_timestamps:
-                gen_record = simulate_generation_mix(ts)
-                co2_record = simulate_co2_intensity(ts, gen_record)
-                co2_data.append({
-                    "timestamp": co2_record.timestamp.isoformat(),
-                    "co2_intensity_g_per_kwh": co2_record.co2_intensity_g_per_kwh
-                })
+            df_co2_week, _ = simulate_frames(co2_timestamps)
+            co2_data = df_co2_week.to_dict(orient='records')
             
             # Generate mix data (last 24 hours)
-            mix_data = []
-            for ts in mix_timestamps:
-                gen_record = simulate_generation_mix(ts)
-                mix_data.append({
-                    "timestamp": gen_record.timestamp.isoformat(),
-                    "hydro_mw": gen_record.hydro_mw,
-                    "wind_mw": gen_record.wind_mw,
-                    "solar_mw": gen_record.solar_mw,
-                    "nuclear_mw": gen_record.nuclear_mw,
-                    "fossil_mw": gen_record.fossil_mw,
-                    "total_mw": gen_record.total_mw,
-                    "renewable_share_pct": gen_record.renewable_share_pct,
-                    "co2_intensity_g_per_kwh": simulate_co2_intensity(ts, gen_record).co2_intensity_g_per_kwh
-                })
+            df_co2_day, df_mix_day = simulate_frames(mix_timestamps)
+            df_mix_day["co2_intensity_g_per_kwh"] = df_co2_day["co2_intensity_g_per_kwh"].values
+            mix_data = df_mix_day.to_dict(orient='records')
             # Generate net-zero data for goal tracker
             netzero_data = []
             for year in range(2020, 2026):
@@ -0,0 +1,175 @@
+"""asyncio/httpx variant of SupabaseClient for concurrent writes.
+
+Requests share one pooled ``httpx.AsyncClient`` and at most ``max_concurrency`` are in flight.
+``write_many`` sends independent writes (the three tables, and the chunks of a large
+multi-region batch) concurrently, so a tick takes about as long as its slowest request.
+If one write fails the others are cancelled. Timeouts, retries and backoff follow
+simulator.transport (HTTP_* settings). Requires ``httpx`` (pip install httpx).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from dataclasses import asdict
+from typing import Awaitable, List, Optional, Sequence, Tuple
+
+from .models import RecordBatch
+from .supabase_client import dedup_batch
+from .transport import BACKOFF_MAX_SECONDS, RETRY_STATUS, TransportStats, transport_settings
+
+logger = logging.getLogger(__name__)
+
+
+def _httpx():
+	try:
+		import httpx
+	except ImportError as e:
+		raise RuntimeError("SUPABASE_ASYNC needs httpx (pip install httpx)") from e
+	return httpx
+
+
+async def gather_or_cancel(aws: Sequence[Awaitable]) -> list:
+	"""Run awaitables concurrently; on the first failure cancel the rest and re-raise it."""
+	tasks = [asyncio.ensure_future(aw) for aw in aws]
+	try:
+		return await asyncio.gather(*tasks)
+	except BaseException:
+		for task in tasks:
+			task.cancel()
+		await asyncio.gather(*tasks, return_exceptions=True)
+		raise
+
+
+class AsyncSupabaseClient:
+	"""PostgREST inserts over httpx with bounded concurrency. Create and use it on one event loop."""
+
+	def __init__(self, url: Optional[str], key: Optional[str], max_concurrency: int = 8, settings: Optional[dict] = None):
+		httpx = _httpx()
+		settings = {**transport_settings(), **(settings or {})}
+		self.url = url
+		self.key = key
+		self.max_retries = settings["max_retries"]
+		self.backoff_seconds = settings["backoff_seconds"]
+		self._client = httpx.AsyncClient(
+			timeout=httpx.Timeout(settings["read_timeout"], connect=settings["connect_timeout"]),
+			limits=httpx.Limits(max_connections=max(max_concurrency, settings["pool_size"]), max_keepalive_connections=settings["pool_size"]),
+			headers={"apikey": key or "", "Authorization": f"Bearer {key}", "Content-Type": "application/json"},
+		)
+		self._semaphore = asyncio.Semaphore(max_concurrency)
+		self._stats = TransportStats()
+
+	def enabled(self) -> bool:
+		return bool(self.url and self.key)
+
+	def stats(self) -> TransportStats:
+		return TransportStats(**asdict(self._stats))
+
+	async def insert_batch(self, table: str, batch: RecordBatch, on_conflict: Optional[str] = None, resolution: Optional[str] = None, chunk_size: Optional[int] = None) -> None:
+		"""Insert a RecordBatch; chunks are serialized once each and posted concurrently."""
+		if not self.enabled() or not len(batch):
+			return
+		if on_conflict:
+			batch = dedup_batch(batch, on_conflict, keep_last=resolution != "ignore-duplicates")
+		chunks = batch.chunks(chunk_size or len(batch))
+		await gather_or_cancel([self._post(table, chunk.to_json(), on_conflict, resolution) for chunk in chunks])
+
+	async def write_many(self, writes: Sequence[Tuple[str, RecordBatch, Optional[str], Optional[str], Optional[int]]]) -> None:
+		"""Concurrent insert_batch calls: (table, batch, on_conflict, resolution, chunk_size) each."""
+		await gather_or_cancel([self.insert_batch(*w) for w in writes])
+
+	async def _post(self, table: str, body: str, on_conflict: Optional[str], resolution: Optional[str]) -> None:
+		httpx = _httpx()
+		params = {"on_conflict": on_conflict} if on_conflict else None
+		headers = {"Prefer": f"{'resolution=' + resolution + ',' if resolution else ''}return=minimal"}
+		# Only upserts may be re-sent after the server might have applied them
+		idempotent = bool(on_conflict)
+		for attempt in range(self.max_retries + 1):
+			resp, error = None, None
+			async with self._semaphore:
+				start = time.perf_counter()
+				try:
+					resp = await self._client.post(f"{self.url}/rest/v1/{table}", params=params, content=body.encode("utf-8"), headers=headers)
+				except (httpx.TransportError, httpx.TimeoutException) as e:
+					error = e
+				latency = time.perf_counter() - start
+			s = self._stats
+			s.requests += 1
+			s.last_latency_s = latency
+			s.max_latency_s = max(s.max_latency_s, latency)
+			s.total_latency_s += latency
+			if error is not None:
+				retryable = idempotent or isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+			else:
+				retryable = resp.status_code == 429 or (resp.status_code in RETRY_STATUS and idempotent)
+			if not retryable or attempt == self.max_retries:
+				if error is not None:
+					s.failures += 1
+					raise error
+				if resp.is_error:
+					s.failures += 1
+					raise httpx.HTTPStatusError(f"{resp.status_code} for {table} | details: {resp.text}", request=resp.request, response=resp)
+				return
+			retry_after = resp.headers.get("Retry-After") if resp is not None else None
+			delay = min(BACKOFF_MAX_SECONDS, float(retry_after)) if retry_after and retry_after.isdigit() else random.uniform(0, min(BACKOFF_MAX_SECONDS, self.backoff_seconds * 2 ** attempt))
+			s.retries += 1
+			logger.warning("POST %s failed (%s); retry %d/%d in %.2fs", table, error or resp.status_code, attempt + 1, self.max_retries, delay)
+			await asyncio.sleep(delay)
+
+	async def aclose(self) -> None:
+		await self._client.aclose()
+
+	async def __aenter__(self) -> "AsyncSupabaseClient":
+		return self
+
+	async def __aexit__(self, *exc) -> None:
+		await self.aclose()
+
+
+class AsyncSupabaseWriter:
+	"""Synchronous facade for a sink worker thread: owns an event loop and an AsyncSupabaseClient.
+
+	The loop and client are created on the first write, so they live on the thread that
+	calls write_many/close (the worker), not on the thread that built the pipeline, which
+	may itself be running an event loop.
+	"""
+
+	def __init__(self, url: Optional[str], key: Optional[str], max_concurrency: int = 8):
+		# Fail at startup rather than on the first step when httpx is missing
+		_httpx()
+		self.url = url
+		self.key = key
+		self.max_concurrency = max_concurrency
+		self._loop: Optional[asyncio.AbstractEventLoop] = None
+		self.client: Optional[AsyncSupabaseClient] = None
+
+	@staticmethod
+	async def _make(url, key, max_concurrency) -> AsyncSupabaseClient:
+		# Created inside the loop: the semaphore and connection pool belong to it
+		return AsyncSupabaseClient(url, key, max_concurrency=max_concurrency)
+
+	def _run(self, coro):
+		if self._loop is None:
+			self._loop = asyncio.new_event_loop()
+		return self._loop.run_until_complete(coro)
+
+	def enabled(self) -> bool:
+		return bool(self.url and self.key)
+
+	def write_many(self, writes: List[tuple]) -> None:
+		if self.client is None:
+			self.client = self._run(self._make(self.url, self.key, self.max_concurrency))
+		self._run(self.client.write_many(writes))
+
+	def close(self) -> None:
+		if self._loop is None:
+			return
+		try:
+			if self.client is not None:
+				self._run(self.client.aclose())
+		finally:
+			self._loop.close()
+			self._loop = None
+			self.client = None
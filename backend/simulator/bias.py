@@ -1,21 +1,20 @@
-import math
 import random
 from typing import Tuple
 
+import numpy as np
+
+from . import kernels
+
 
 def bounded_normal(base: float, std_dev: float, lower: float, upper: float) -> float:
-	value = random.gauss(mu=base, sigma=std_dev)
-	return max(lower, min(upper, value))
+	# random.gauss(mu, sigma) is mu + z * sigma, so drawing z here keeps the same stream
+	return kernels.clip_normal(base, std_dev, lower, upper, random.gauss(0.0, 1.0))
 
 
 def diurnal_profile(hour: int, min_factor: float = 0.7, max_factor: float = 1.3) -> float:
 	"""Return a diurnal factor with peak demand early evening, trough at night."""
-	# Peak around 19:00, trough around 03:00
-	phase = (hour - 19) % 24
-	# Use cosine centered at 0 for peak at 19:00
-	# Normalize to [min_factor, max_factor] - increased range for more variation
-	cos_val = (math.cos(phase / 24 * 2 * math.pi) + 1) / 2
-	return min_factor + (max_factor - min_factor) * cos_val
+	# Peak around 19:00, trough around 03:00; range widened for more variation
+	return kernels.diurnal_profile(hour, min_factor, max_factor)
 
 
 def weather_variation() -> Tuple[float, float, float]:
@@ -46,10 +45,47 @@ def compute_co2_intensity(renewable_share_pct: float, base_range=(50, 500)) -> f
 	low, high = base_range
 	# DRAMATIC inverse relationship for testing
 	# When renewables 80%, intensity ~ low; at 10%, ~ high
-	norm = max(0.0, min(1.0, (80 - renewable_share_pct) / 70))
-	base = low + norm * (high - low)
+	base = kernels.co2_base(renewable_share_pct, low, high)
 	# Add LOTS of noise for dramatic variation
 	return bounded_normal(base, std_dev=50, lower=low, upper=high)
 
 
+# --- Vectorized counterparts -------------------------------------------------
+# Same distributions and clamping as the scalar helpers above, drawn as whole
+# arrays from a NumPy Generator. ``shape`` may be an int or a tuple.
+
+
+def bounded_normal_batch(rng: np.random.Generator, base, std_dev, lower, upper, shape) -> np.ndarray:
+	return np.clip(rng.normal(loc=base, scale=std_dev, size=shape), lower, upper)
+
+
+def diurnal_profile_batch(hour: np.ndarray, min_factor: float = 0.7, max_factor: float = 1.3) -> np.ndarray:
+	"""Vectorized diurnal_profile over an array of hours."""
+	phase = (np.asarray(hour) - 19) % 24
+	cos_val = (np.cos(phase / 24 * 2 * np.pi) + 1) / 2
+	return min_factor + (max_factor - min_factor) * cos_val
+
 
+def weather_variation_batch(rng: np.random.Generator, shape, scale=1.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+	"""Vectorized weather_variation: arrays of wind, solar, hydro factors. ``scale`` widens or narrows the spread (per region)."""
+	wind = bounded_normal_batch(rng, 1.0, 0.8 * scale, 0.1, 3.0, shape)
+	solar = bounded_normal_batch(rng, 1.0, 1.0 * scale, 0.05, 4.0, shape)
+	hydro = bounded_normal_batch(rng, 1.0, 0.3 * scale, 0.3, 2.0, shape)
+	return wind, solar, hydro
+
+
+def planned_outage_factor_batch(rng: np.random.Generator, shape) -> np.ndarray:
+	return np.where(rng.random(size=shape) < 0.15, 0.3, 1.0)
+
+
+def fossil_price_shock_factor_batch(rng: np.random.Generator, shape) -> np.ndarray:
+	return np.where(rng.random(size=shape) < 0.1, 0.4, 1.0)
+
+
+def compute_co2_intensity_batch(rng: np.random.Generator, renewable_share_pct: np.ndarray, base_range=(50, 500)) -> np.ndarray:
+	"""Vectorized compute_co2_intensity over an array of renewable shares."""
+	low, high = base_range
+	share = np.asarray(renewable_share_pct, dtype=float)
+	norm = np.clip((80 - share) / 70, 0.0, 1.0)
+	base = low + norm * (high - low)
+	return bounded_normal_batch(rng, base, 50, low, high, share.shape)
@@ -0,0 +1,136 @@
+"""Compact the CSV outputs: sort, snap to the step grid and keep the latest row per key.
+
+Long continuous runs leave jittered duplicate timestamps in co2_intensity.csv and
+generation_mix.csv and one netzero_alignment row per step. Each file is rewritten as an
+external merge sort: sorted, deduplicated runs of ``run_rows`` rows are spilled to
+temporary files and then merged, so memory stays bounded whatever the file size. Values
+are copied as text, unchanged. The result replaces the original atomically.
+
+With ``index=True`` a sidecar ``<file>.idx`` records the timestamp, row number and byte
+offset of every ``index_every``-th row, so readers can seek to a time instead of scanning.
+"""
+
+from __future__ import annotations
+
+import csv
+import heapq
+import logging
+import os
+import tempfile
+from typing import Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from .models import iso_timestamps
+
+logger = logging.getLogger(__name__)
+
+COMPACT_RUN_ROWS = 200_000
+INDEX_EVERY_ROWS = 1024
+# Dedup keys per table; the latest row (in file order) wins
+TABLE_KEYS = {
+	"co2_intensity": ("timestamp", "region_id"),
+	"generation_mix": ("timestamp", "region_id"),
+	"netzero_alignment": ("year",),
+}
+_SEQ = "_seq"
+
+
+def snap_timestamps(values: pd.Series, step_minutes: int) -> List[str]:
+	"""ISO-8601 UTC text of ``values`` rounded to the nearest step."""
+	ts = pd.to_datetime(values, utc=True, format="ISO8601").dt.round(f"{step_minutes}min")
+	return iso_timestamps(ts.dt.tz_convert(None).to_numpy(dtype="datetime64[us]"))
+
+
+def _sort_key(header: List[str], keys) -> Callable:
+	idx = [header.index(k) for k in keys if k in header]
+	seq = len(header)
+	if keys == ("year",):
+		return lambda row: (int(row[idx[0]]), int(row[seq]))
+	# Snapped timestamps have a fixed-width format, so text order is time order
+	return lambda row: (tuple(row[i] for i in idx), int(row[seq]))
+
+
+def _write_runs(path: str, keys, step_minutes: int, run_rows: int, tmpdir: str):
+	"""Spill sorted, deduplicated runs; returns (header, run paths, rows read)."""
+	runs, header, rows_in = [], None, 0
+	for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=run_rows):
+		header = list(chunk.columns)
+		by = [k for k in keys if k in chunk.columns]
+		chunk[_SEQ] = range(rows_in, rows_in + len(chunk))
+		rows_in += len(chunk)
+		if "timestamp" in chunk.columns:
+			chunk["timestamp"] = snap_timestamps(chunk["timestamp"], step_minutes)
+		order = [chunk[k].astype(int) if k == "year" else chunk[k] for k in by]
+		chunk = chunk.assign(**{f"_k{i}": v for i, v in enumerate(order)})
+		chunk = chunk.sort_values([f"_k{i}" for i in range(len(by))] + [_SEQ], kind="stable")
+		chunk = chunk.drop_duplicates(subset=by, keep="last")
+		run = os.path.join(tmpdir, f"run-{len(runs):05d}.csv")
+		chunk[header + [_SEQ]].to_csv(run, index=False, header=False)
+		runs.append(run)
+	return header, runs, rows_in
+
+
+def _latest_per_key(rows: Iterator[List[str]], key: Callable) -> Iterator[List[str]]:
+	"""Last row of each run of equal keys (rows with the same key arrive in file order)."""
+	pending = None
+	for row in rows:
+		if pending is not None and key(row) != key(pending):
+			yield pending
+		pending = row
+	if pending is not None:
+		yield pending
+
+
+def compact_csv(path: str, keys, step_minutes: int = 15, run_rows: int = COMPACT_RUN_ROWS, index: bool = False, index_every: int = INDEX_EVERY_ROWS) -> Dict[str, int]:
+	"""Rewrite one CSV sorted by ``keys`` with one row per key; returns row counts."""
+	directory = os.path.dirname(os.path.abspath(path))
+	with tempfile.TemporaryDirectory(dir=directory, prefix=".compact-") as tmpdir:
+		header, runs, rows_in = _write_runs(path, keys, step_minutes, run_rows, tmpdir)
+		if header is None:
+			return {"rows_in": 0, "rows_out": 0}
+		key = _sort_key(header, keys)
+		dedup = lambda row: key(row)[0]
+		ts_col = header.index("timestamp") if "timestamp" in header else None
+		files = [open(run, newline="", encoding="utf-8") for run in runs]
+		out_path = os.path.join(tmpdir, "compacted.csv")
+		idx_path = os.path.join(tmpdir, "compacted.idx")
+		entries = []
+		rows_out = 0
+		try:
+			with open(out_path, "w", newline="", encoding="utf-8") as out:
+				writer = csv.writer(out)
+				writer.writerow(header)
+				rows = heapq.merge(*(csv.reader(f) for f in files), key=key)
+				for row in _latest_per_key(rows, dedup):
+					if index and ts_col is not None and rows_out % index_every == 0:
+						entries.append((row[ts_col], rows_out, out.tell()))
+					writer.writerow(row[:-1])
+					rows_out += 1
+		finally:
+			for f in files:
+				f.close()
+		if index and ts_col is not None:
+			with open(idx_path, "w", newline="", encoding="utf-8") as f:
+				writer = csv.writer(f)
+				writer.writerow(["timestamp", "row", "offset"])
+				writer.writerows(entries)
+		os.replace(out_path, path)
+		if index and ts_col is not None:
+			os.replace(idx_path, f"{path}.idx")
+		elif os.path.isfile(f"{path}.idx"):
+			# An index from an earlier compaction no longer matches the rewritten rows
+			os.remove(f"{path}.idx")
+	return {"rows_in": rows_in, "rows_out": rows_out}
+
+
+def compact_dir(directory: str, step_minutes: int = 15, run_rows: int = COMPACT_RUN_ROWS, index: bool = False, tables: Optional[List[str]] = None) -> Dict[str, Dict[str, int]]:
+	"""Compact every simulator CSV present in ``directory``. Do not run while a simulator appends to it."""
+	stats = {}
+	for table in tables or list(TABLE_KEYS):
+		path = os.path.join(directory, f"{table}.csv")
+		if not os.path.isfile(path):
+			continue
+		stats[table] = compact_csv(path, TABLE_KEYS[table], step_minutes=step_minutes, run_rows=run_rows, index=index)
+		logger.info("Compacted %s: %d -> %d rows", path, stats[table]["rows_in"], stats[table]["rows_out"])
+	return stats
@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass
-from typing import Optional
+from typing import FrozenSet, Optional
 
 
 @dataclass(frozen=True)
@@ -11,8 +11,52 @@ class SimulatorConfig:
 	wall_interval_seconds: int = 5
 	step_minutes: int = 15
 	random_seed: Optional[int] = None
-	output_mode: str = "csv"  # csv | supabase | both
+	rng_mode: str = "sequential"  # sequential | keyed (draws keyed by seed + timestamp)
+	# independent (fresh draws every step) | ar1 (persistent weather, outages and price shocks)
+	weather_model: str = "independent"
+	state_file: str = "data/process_state.json"  # ar1 process state, resumed across runs
+	output_mode: str = "csv"  # csv | supabase | parquet | sqlite | memmap | segments | both (= csv,supabase), or a comma-separated list
 	csv_output_dir: str = "data"
+	# Buffered CSV sink: flush after this many rows or seconds; fsync none | per-flush | per-row
+	csv_flush_rows: int = 1000
+	csv_flush_seconds: float = 5.0
+	csv_fsync: str = "none"
+	# Parquet output, partitioned by table and day; one part file per day per flush
+	parquet_output_dir: str = "data/parquet"
+	parquet_flush_rows: int = 10000
+	parquet_flush_seconds: float = 600.0
+	# Rotated CSV segments, one per writer process and hour/day; closed ones compressed (gzip | zstd | none)
+	segment_output_dir: str = "data/segments"
+	segment_rotation: str = "daily"  # hourly | daily
+	segment_compression: str = "gzip"
+	# Embedded SQLite database with the Supabase schema, for running the stack offline
+	sqlite_path: str = "data/simulator.db"
+	# Append-only binary column files (np.memmap) for the CO2 and generation-mix history
+	memmap_output_dir: str = "data/memmap"
+	memmap_float_dtype: str = "float64"  # float64 | float32 (half the size, ~7 significant digits)
+	# Output pipeline: one worker per output behind a bounded queue; when full, block | drop-newest | drop-oldest
+	sink_queue_size: int = 64
+	sink_backpressure: str = "block"
+	# Supabase worker: steps combined per insert and retries of a failed insert
+	supabase_batch_steps: int = 16
+	supabase_max_retries: int = 3
+	# Rows are accumulated across ticks and sent at this many rows or after this many seconds
+	supabase_batch_rows: int = 1000
+	supabase_batch_seconds: float = 5.0
+	# Durable local spool for Supabase writes (replayed as idempotent upserts); None/"" = send directly.
+	# Opt-in: the upserts need database/sql/06_regions.sql and 07_unique_steps.sql applied
+	supabase_spool_dir: Optional[str] = None
+	# Upsert direct (unspooled) writes on (region_id, timestamp) as well; same migrations required
+	supabase_step_upserts: bool = False
+	supabase_spool_batch_rows: int = 5000
+	# Direct sends (no spool) over asyncio/httpx: the three tables and their chunks concurrently
+	supabase_async: bool = False
+	supabase_max_concurrency: int = 8
+	# Retention job: raw rows older than this many days are folded into hourly/daily rollups
+	retention_days: int = 30
+	# Multi-region: catalogue CSV path or "synthetic:N"; None = the single default grid
+	regions: Optional[str] = None
+	workers: int = 1  # process pool size for region shards and backfill chunks
 	# Supabase
 	supabase_url: Optional[str] = None
 	supabase_key: Optional[str] = None
@@ -21,6 +65,12 @@ class SimulatorConfig:
 	table_generation_mix: str = "generation_mix"
 	table_netzero_alignment: str = "netzero_alignment"
 
+	def outputs(self) -> FrozenSet[str]:
+		"""Configured outputs parsed from output_mode, e.g. {"csv", "parquet"}."""
+		if self.output_mode == "both":
+			return frozenset(("csv", "supabase"))
+		return frozenset(m.strip() for m in self.output_mode.split(",") if m.strip())
+
 
 def load_config_from_env() -> SimulatorConfig:
 	from dotenv import load_dotenv
@@ -32,8 +82,37 @@ def load_config_from_env() -> SimulatorConfig:
 		wall_interval_seconds=int(os.getenv("SIM_WALL_INTERVAL_SECONDS", os.getenv("WALL_INTERVAL_SECONDS", "5"))),
 		step_minutes=int(os.getenv("SIM_STEP_MINUTES", os.getenv("STEP_MINUTES", "15"))),
 		random_seed=int(os.getenv("SIM_RANDOM_SEED")) if os.getenv("SIM_RANDOM_SEED") else None,
+		rng_mode=os.getenv("SIM_RNG_MODE", "sequential"),
+		weather_model=os.getenv("SIM_WEATHER_MODEL", "independent"),
+		state_file=os.getenv("SIM_STATE_FILE", "data/process_state.json"),
 		output_mode=os.getenv("OUTPUT_MODE", "csv"),
 		csv_output_dir=os.getenv("CSV_OUTPUT_DIR", "data"),
+		csv_flush_rows=int(os.getenv("CSV_FLUSH_ROWS", "1000")),
+		csv_flush_seconds=float(os.getenv("CSV_FLUSH_SECONDS", "5")),
+		csv_fsync=os.getenv("CSV_FSYNC", "none"),
+		parquet_output_dir=os.getenv("PARQUET_OUTPUT_DIR", "data/parquet"),
+		parquet_flush_rows=int(os.getenv("PARQUET_FLUSH_ROWS", "10000")),
+		parquet_flush_seconds=float(os.getenv("PARQUET_FLUSH_SECONDS", "600")),
+		segment_output_dir=os.getenv("SEGMENT_OUTPUT_DIR", "data/segments"),
+		segment_rotation=os.getenv("SEGMENT_ROTATION", "daily"),
+		segment_compression=os.getenv("SEGMENT_COMPRESSION", "gzip"),
+		sqlite_path=os.getenv("SQLITE_PATH", "data/simulator.db"),
+		memmap_output_dir=os.getenv("MEMMAP_OUTPUT_DIR", "data/memmap"),
+		memmap_float_dtype=os.getenv("MEMMAP_FLOAT_DTYPE", "float64"),
+		sink_queue_size=int(os.getenv("SINK_QUEUE_SIZE", "64")),
+		sink_backpressure=os.getenv("SINK_BACKPRESSURE", "block"),
+		supabase_batch_steps=int(os.getenv("SUPABASE_BATCH_STEPS", "16")),
+		supabase_max_retries=int(os.getenv("SUPABASE_MAX_RETRIES", "3")),
+		supabase_batch_rows=int(os.getenv("SUPABASE_BATCH_ROWS", "1000")),
+		supabase_batch_seconds=float(os.getenv("SUPABASE_BATCH_SECONDS", "5")),
+		supabase_spool_dir=os.getenv("SUPABASE_SPOOL_DIR") or None,
+		supabase_step_upserts=os.getenv("SUPABASE_STEP_UPSERTS", "false").lower() in ("1", "true", "yes"),
+		supabase_spool_batch_rows=int(os.getenv("SUPABASE_SPOOL_BATCH_ROWS", "5000")),
+		supabase_async=os.getenv("SUPABASE_ASYNC", "false").lower() in ("1", "true", "yes"),
+		supabase_max_concurrency=int(os.getenv("SUPABASE_MAX_CONCURRENCY", "8")),
+		retention_days=int(os.getenv("RETENTION_DAYS", "30")),
+		regions=os.getenv("SIM_REGIONS") or None,
+		workers=int(os.getenv("SIM_WORKERS", "1")),
 		supabase_url=os.getenv("SUPABASE_URL") or None,
 		supabase_key=os.getenv("SUPABASE_KEY") or None,
 		table_co2_intensity=os.getenv("TABLE_CO2_INTENSITY", "co2_intensity"),
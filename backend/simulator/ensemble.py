@@ -0,0 +1,80 @@
+"""Monte Carlo ensembles: K independent realisations of the same time range.
+
+Members are drawn as (K, T) arrays in one vectorized pass over the distributions in
+bias.py. They are generated in fixed groups of ENSEMBLE_GROUP_MEMBERS, each with its own
+SeedSequence child, so a given seed gives the same ensemble whether the groups run
+in-process or spread across a process pool.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from .simulate import _generation_mix_columns, _timestamp_arrays, simulate_co2_intensity_batch
+
+ENSEMBLE_GROUP_MEMBERS = 100
+DEFAULT_PERCENTILES = (10, 50, 90)
+ENSEMBLE_FIELDS = ("hydro_mw", "wind_mw", "solar_mw", "nuclear_mw", "fossil_mw", "total_mw", "renewable_share_pct", "co2_intensity_g_per_kwh")
+
+
+@dataclass
+class Ensemble:
+	"""``members[field]`` has shape (K, T): one row per member, one column per timestamp."""
+	timestamps: np.ndarray
+	members: Dict[str, np.ndarray]
+
+	@property
+	def size(self) -> int:
+		return next(iter(self.members.values())).shape[0]
+
+	def percentiles(self, q: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Dict[str, np.ndarray]]:
+		"""Per-timestamp bands across members, e.g. ``bands["co2_intensity_g_per_kwh"]["p90"]``."""
+		bands = {}
+		for name, values in self.members.items():
+			pct = np.percentile(values, q, axis=0)
+			bands[name] = {f"p{p:g}": row for p, row in zip(q, pct)}
+		return bands
+
+	def bands_frame(self, q: Sequence[float] = DEFAULT_PERCENTILES, fields: Optional[Sequence[str]] = None):
+		"""Percentile bands as a DataFrame with ISO timestamps and ``<field>_p<q>`` columns."""
+		import pandas as pd
+		from .models import iso_timestamps
+		bands = self.percentiles(q)
+		data = {"timestamp": iso_timestamps(self.timestamps)}
+		for name in fields or self.members:
+			for label, values in bands[name].items():
+				data[f"{name}_{label}"] = np.round(values, 1)
+		return pd.DataFrame(data)
+
+
+def _ensemble_group(task) -> Dict[str, np.ndarray]:
+	"""(members, T) draws for one group; also the process-pool entry point."""
+	hour, n_members, seed_seq, base_total_mw = task
+	rng = np.random.default_rng(seed_seq)
+	grid = _generation_mix_columns(np.broadcast_to(hour, (n_members, len(hour))), rng, base_total_mw=base_total_mw)
+	grid["co2_intensity_g_per_kwh"] = simulate_co2_intensity_batch(grid["renewable_share_pct"], rng=rng)
+	return grid
+
+
+def simulate_ensemble(timestamps, members: int = 100, seed: Optional[int] = None, base_total_mw: float = 7000.0, pool: Optional[ProcessPoolExecutor] = None) -> Ensemble:
+	"""Simulate ``members`` realisations of the generation mix and CO₂ intensity over ``timestamps``.
+
+	With a ``pool`` the member groups are spread across processes; the result is the same
+	as without one.
+	"""
+	if members < 1:
+		raise ValueError("members must be at least 1")
+	ts, hour = _timestamp_arrays(timestamps)
+	sizes = [ENSEMBLE_GROUP_MEMBERS] * (members // ENSEMBLE_GROUP_MEMBERS)
+	if members % ENSEMBLE_GROUP_MEMBERS:
+		sizes.append(members % ENSEMBLE_GROUP_MEMBERS)
+	children = np.random.SeedSequence(seed).spawn(len(sizes))
+	tasks = [(hour, n, child, base_total_mw) for n, child in zip(sizes, children)]
+	if pool is not None and len(tasks) > 1:
+		parts = list(pool.map(_ensemble_group, tasks))
+	else:
+		parts = [_ensemble_group(task) for task in tasks]
+	grid = {name: np.concatenate([p[name] for p in parts], axis=0) for name in ENSEMBLE_FIELDS}
+	return Ensemble(timestamps=ts, members=grid)
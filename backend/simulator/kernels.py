@@ -0,0 +1,107 @@
+"""Hot-loop kernels, compiled with Numba when it is installed.
+
+Only the array kernel (scale_mix) dispatches to compiled code: the scalar helpers are
+called once per value from the step-by-step paths, where a jitted call's dispatch overhead
+outweighs the arithmetic, so they stay plain Python. Numba is optional: without it (or with
+SIM_NUMBA=0) scale_mix falls back to the equivalent NumPy expression. Random draws stay
+outside the kernels, so both paths consume the RNG identically and give the same results.
+"""
+
+import math
+import os
+from typing import Tuple
+
+import numpy as np
+
+try:
+	if os.getenv("SIM_NUMBA", "1") == "0":
+		raise ImportError("disabled by SIM_NUMBA=0")
+	from numba import njit
+	HAVE_NUMBA = True
+except ImportError:
+	HAVE_NUMBA = False
+
+	def njit(*args, **kwargs):
+		"""Stand-in decorator: leave the function as plain Python."""
+		if len(args) == 1 and callable(args[0]) and not kwargs:
+			return args[0]
+		return lambda fn: fn
+
+
+def diurnal_profile(hour: float, min_factor: float, max_factor: float) -> float:
+	# Peak around 19:00, trough around 03:00 (cosine centred at 0 for the peak)
+	phase = (hour - 19) % 24
+	cos_val = (math.cos(phase / 24 * 2 * math.pi) + 1) / 2
+	return min_factor + (max_factor - min_factor) * cos_val
+
+
+def clip_normal(base: float, std_dev: float, lower: float, upper: float, z: float) -> float:
+	"""``base + z * std_dev`` clamped to [lower, upper]; ``z`` is a standard normal draw."""
+	value = base + z * std_dev
+	return float(max(lower, min(upper, value)))
+
+
+def co2_base(renewable_share_pct: float, low: float, high: float) -> float:
+	"""Noise-free CO2 intensity: ``low`` at 80% renewables and above, ``high`` at 10% and below."""
+	norm = max(0.0, min(1.0, (80 - renewable_share_pct) / 70))
+	return low + norm * (high - low)
+
+
+def scale_step(hydro: float, wind: float, solar: float, nuclear: float, fossil: float, target_total: float) -> Tuple[float, float, float, float, float, float, float]:
+	"""Scale one step's mix to ``target_total``; returns the five sources, total and renewable %."""
+	raw_total = hydro + wind + solar + nuclear + fossil
+	scale = target_total / raw_total if raw_total > 0 else 1.0
+	hydro *= scale
+	wind *= scale
+	solar *= scale
+	nuclear *= scale
+	fossil *= scale
+	total = hydro + wind + solar + nuclear + fossil
+	renew_pct = 100.0 * (hydro + wind + solar) / total if total > 0 else 0.0
+	return hydro, wind, solar, nuclear, fossil, total, renew_pct
+
+
+_scale_step_jit = njit(cache=True)(scale_step)
+
+
+@njit(cache=True)
+def _scale_mix_loop(hydro, wind, solar, nuclear, fossil, target_total, out):
+	for i in range(hydro.shape[0]):
+		h, w, s, n, f, t, r = _scale_step_jit(hydro[i], wind[i], solar[i], nuclear[i], fossil[i], target_total[i])
+		out[0, i] = h
+		out[1, i] = w
+		out[2, i] = s
+		out[3, i] = n
+		out[4, i] = f
+		out[5, i] = t
+		out[6, i] = r
+
+
+def _scale_mix_numpy(hydro, wind, solar, nuclear, fossil, target_total):
+	shape = hydro.shape
+	raw_total = hydro + wind + solar + nuclear + fossil
+	scale = np.divide(target_total, raw_total, out=np.ones(shape), where=raw_total > 0)
+	hydro = hydro * scale
+	wind = wind * scale
+	solar = solar * scale
+	nuclear = nuclear * scale
+	fossil = fossil * scale
+	total = hydro + wind + solar + nuclear + fossil
+	renew_pct = np.divide(100.0 * (hydro + wind + solar), total, out=np.zeros(shape), where=total > 0)
+	return hydro, wind, solar, nuclear, fossil, total, renew_pct
+
+
+def _scale_mix_fused(hydro, wind, solar, nuclear, fossil, target_total):
+	shape = hydro.shape
+	flat = [np.ascontiguousarray(a, dtype=np.float64).ravel() for a in (hydro, wind, solar, nuclear, fossil, target_total)]
+	out = np.empty((7, flat[0].shape[0]))
+	_scale_mix_loop(*flat, out)
+	return tuple(row.reshape(shape) for row in out)
+
+
+def scale_mix(hydro, wind, solar, nuclear, fossil, target_total):
+	"""Array version of scale_step over broadcastable inputs, in one fused pass when compiled."""
+	arrays = np.broadcast_arrays(hydro, wind, solar, nuclear, fossil, target_total)
+	if HAVE_NUMBA:
+		return _scale_mix_fused(*arrays)
+	return _scale_mix_numpy(*arrays)
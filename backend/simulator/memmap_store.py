@@ -0,0 +1,188 @@
+"""Append-only fixed-width binary columns for the hot history, readable with np.memmap.
+
+Layout: ``<root>/<table>/<region_id>/<column>.col``, one file per column. Each file is a
+64-byte header (magic + NumPy dtype string) followed by the raw little-endian values.
+``timestamp.col`` holds int64 epoch seconds in non-decreasing order, so a time range is two
+binary searches and every column slice is a view into the mapped file (nothing is parsed
+or copied). Rows at or before a region's last stored timestamp are skipped, so re-running a
+span after a restart or backfill does not fail or duplicate. Tables without a timestamp (netzero_alignment) are not stored.
+"""
+
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .models import DEFAULT_REGION_ID, RecordBatch, _to_datetime64
+from .storage import ensure_dir
+
+MAGIC = b"PSACOL01"
+HEADER_BYTES = 64
+FLOAT_DTYPES = ("float32", "float64")
+TIMESTAMP_DTYPE = np.dtype("<i8")
+
+logger = logging.getLogger(__name__)
+
+
+def _header(dtype: np.dtype) -> bytes:
+	return (MAGIC + dtype.str.encode("ascii")).ljust(HEADER_BYTES, b"\0")
+
+
+def _read_dtype(path: str) -> np.dtype:
+	with open(path, "rb") as f:
+		header = f.read(HEADER_BYTES)
+	if len(header) < HEADER_BYTES or not header.startswith(MAGIC):
+		raise ValueError(f"Not a column file: {path}")
+	return np.dtype(header[len(MAGIC):].rstrip(b"\0").decode("ascii"))
+
+
+def _rows(path: str, dtype: np.dtype) -> int:
+	return max(0, os.path.getsize(path) - HEADER_BYTES) // dtype.itemsize
+
+
+def epoch_seconds(value) -> int:
+	"""Epoch seconds of a datetime (naive = UTC), ISO-8601 string, datetime64 or int."""
+	if isinstance(value, (int, np.integer)):
+		return int(value)
+	if isinstance(value, str):
+		value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+	if isinstance(value, datetime):
+		value = _to_datetime64(value)
+	return int(np.datetime64(value, "s").astype(np.int64))
+
+
+class MemmapSink:
+	"""Appends one table's batches to its column files, one directory per region."""
+
+	def __init__(self, root: str, table: str, float_dtype: str = "float64"):
+		if float_dtype not in FLOAT_DTYPES:
+			raise ValueError(f"float_dtype must be one of {FLOAT_DTYPES}, got {float_dtype!r}")
+		self.root = root
+		self.table = table
+		self.float_dtype = np.dtype(float_dtype).newbyteorder("<")
+		self._files: Dict[str, Dict[str, object]] = {}
+		self._last_ts: Dict[str, int] = {}
+
+	def write_batch(self, batch: RecordBatch) -> int:
+		if not len(batch) or "timestamp" not in batch.names:
+			return 0
+		region = batch.columns.get("region_id", DEFAULT_REGION_ID)
+		if region is None or np.ndim(region) == 0:
+			return self._append(region or DEFAULT_REGION_ID, batch)
+		return sum(self._append(region_id, batch.take(region == region_id)) for region_id in dict.fromkeys(region.tolist()))
+
+	def _value_columns(self, batch: RecordBatch) -> List[str]:
+		return [n for n in batch.names if n not in ("id", "timestamp", "region_id") and batch.columns[n] is not None]
+
+	def _open(self, region_id: str, columns: List[str]) -> Dict[str, object]:
+		directory = os.path.join(self.root, self.table, region_id)
+		ensure_dir(directory)
+		names = ["timestamp", *columns]
+		paths = {n: os.path.join(directory, f"{n}.col") for n in names}
+		dtypes = {n: TIMESTAMP_DTYPE if n == "timestamp" else self.float_dtype for n in names}
+		for name, path in paths.items():
+			if os.path.isfile(path) and os.path.getsize(path) >= HEADER_BYTES:
+				dtypes[name] = _read_dtype(path)
+		# Drop a partially appended last row (e.g. after a crash) so all columns line up
+		rows = min(_rows(p, dtypes[n]) if os.path.isfile(p) else 0 for n, p in paths.items())
+		files = {}
+		for name, path in paths.items():
+			f = open(path, "r+b" if os.path.isfile(path) else "w+b")
+			f.truncate(HEADER_BYTES + rows * dtypes[name].itemsize)
+			f.seek(0)
+			f.write(_header(dtypes[name]))
+			f.seek(0, os.SEEK_END)
+			files[name] = (f, dtypes[name])
+		if rows:
+			last = np.memmap(paths["timestamp"], dtype=TIMESTAMP_DTYPE, mode="r", offset=HEADER_BYTES + (rows - 1) * 8, shape=(1,))
+			self._last_ts[region_id] = int(last[0])
+		return files
+
+	def _append(self, region_id: str, batch: RecordBatch) -> int:
+		files = self._files.get(region_id)
+		if files is None:
+			files = self._files[region_id] = self._open(region_id, self._value_columns(batch))
+		ts = batch.column("timestamp").astype("datetime64[s]").astype(np.int64)
+		if np.any(np.diff(ts) < 0):
+			order = np.argsort(ts, kind="stable")
+			batch, ts = batch.take(order), ts[order]
+		# The files are append-only: rows at or before the last stored timestamp (a restart or a
+		# backfill over an earlier range) are skipped, so re-writing a span is a no-op. Within the
+		# batch the last row of each timestamp wins.
+		last = self._last_ts.get(region_id)
+		keep = np.append(ts[1:] != ts[:-1], True)
+		if last is not None:
+			keep &= ts > last
+		if not keep.all():
+			skipped = int(len(ts) - keep.sum())
+			logger.info("%s/%s: skipped %d duplicate or already stored row(s)", self.table, region_id, skipped)
+			batch, ts = batch.take(keep), ts[keep]
+			if not len(ts):
+				return 0
+		# Values first and the timestamp last, so readers never see a timestamp without its values
+		for name, (f, dtype) in files.items():
+			if name != "timestamp":
+				f.write(np.ascontiguousarray(batch.column(name), dtype=dtype).tobytes())
+		f, dtype = files["timestamp"]
+		f.write(ts.astype(dtype).tobytes())
+		for f, _ in files.values():
+			f.flush()
+		self._last_ts[region_id] = int(ts[-1])
+		return len(ts)
+
+	def flush(self) -> None:
+		for files in self._files.values():
+			for f, _ in files.values():
+				f.flush()
+
+	def close(self) -> None:
+		for files in self._files.values():
+			for f, _ in files.values():
+				f.close()
+		self._files = {}
+
+
+class MemmapTable:
+	"""Read-only view of one table and region; columns are np.memmap arrays of equal length."""
+
+	def __init__(self, root: str, table: str, region_id: str = DEFAULT_REGION_ID):
+		self.directory = os.path.join(root, table, region_id)
+		if not os.path.isfile(os.path.join(self.directory, "timestamp.col")):
+			raise FileNotFoundError(f"No column files in {self.directory}")
+		paths = {name[:-4]: os.path.join(self.directory, name) for name in sorted(os.listdir(self.directory)) if name.endswith(".col")}
+		dtypes = {n: _read_dtype(p) for n, p in paths.items()}
+		# A writer may be mid-append: only rows present in every column are visible
+		self.rows = min(_rows(p, dtypes[n]) for n, p in paths.items())
+		self.columns: Dict[str, np.ndarray] = {}
+		for name, path in paths.items():
+			if self.rows:
+				self.columns[name] = np.memmap(path, dtype=dtypes[name], mode="r", offset=HEADER_BYTES, shape=(self.rows,))
+			else:
+				self.columns[name] = np.empty(0, dtype=dtypes[name])
+
+	@staticmethod
+	def regions(root: str, table: str) -> List[str]:
+		base = os.path.join(root, table)
+		return sorted(d for d in os.listdir(base) if os.path.isdir(os.path.join(base, d))) if os.path.isdir(base) else []
+
+	def __len__(self) -> int:
+		return self.rows
+
+	@property
+	def names(self) -> List[str]:
+		return list(self.columns.keys())
+
+	def index_range(self, start=None, end=None) -> Tuple[int, int]:
+		"""Row positions [i, j) with start <= timestamp < end, by binary search."""
+		ts = self.columns["timestamp"]
+		i = int(np.searchsorted(ts, epoch_seconds(start), side="left")) if start is not None else 0
+		j = int(np.searchsorted(ts, epoch_seconds(end), side="left")) if end is not None else self.rows
+		return i, max(i, j)
+
+	def range(self, start=None, end=None, columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+		"""Views of ``columns`` (default all, always with timestamp) over [start, end)."""
+		i, j = self.index_range(start, end)
+		names = ["timestamp", *[c for c in (columns or self.names) if c != "timestamp"]]
+		return {n: self.columns[n][i:j] for n in names}
@@ -1,13 +1,18 @@
-from dataclasses import dataclass
-from typing import Optional
-from datetime import datetime
+import json
+from dataclasses import MISSING, dataclass, fields
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from datetime import datetime, timezone
 
+import numpy as np
+
+DEFAULT_REGION_ID = "default"
 
 @dataclass
 class Co2IntensityRecord:
 	id: Optional[int]
 	timestamp: datetime
 	co2_intensity_g_per_kwh: float
+	region_id: str = DEFAULT_REGION_ID
 
 
 @dataclass
@@ -21,6 +26,7 @@ class GenerationMixRecord:
 	fossil_mw: float
 	total_mw: float
 	renewable_share_pct: float
+	region_id: str = DEFAULT_REGION_ID
 
 
 @dataclass
@@ -31,4 +37,168 @@ class NetZeroAlignmentRecord:
 	alignment_pct: float
 
 
+def iso_timestamps(values) -> List[str]:
+	"""Bulk ISO-8601 formatting of a UTC datetime64 column (same text as datetime.isoformat())."""
+	ts = np.asarray(values).astype("datetime64[us]")
+	unit = "us" if (ts.astype(np.int64) % 1_000_000).any() else "s"
+	return np.char.add(np.datetime_as_string(ts, unit=unit), "+00:00").tolist()
+
+
+def _to_datetime64(value: datetime) -> np.datetime64:
+	if value.tzinfo is not None:
+		value = value.astimezone(timezone.utc).replace(tzinfo=None)
+	return np.datetime64(value, "us")
+
+
+class RecordBatch:
+	"""Struct-of-arrays batch of records for one table.
+
+	Columns follow the field order of ``record_type``. Generated fields are NumPy arrays
+	(timestamps as UTC ``datetime64``); fields that were not generated are None (e.g. ``id``,
+	left to the database) or a scalar shared by every row (e.g. ``region_id``).
+	"""
+
+	__slots__ = ("record_type", "columns", "_length")
+
+	def __init__(self, record_type, columns: Dict[str, Any]):
+		self.record_type = record_type
+		self.columns: Dict[str, Any] = {}
+		for f in fields(record_type):
+			value = columns.get(f.name, None if f.default is MISSING else f.default)
+			self.columns[f.name] = value if value is None or np.ndim(value) == 0 else np.asarray(value)
+		self._length = max((len(v) for v in self.columns.values() if v is not None and np.ndim(v) > 0), default=0)
+
+	@classmethod
+	def from_records(cls, records: Sequence, record_type=None) -> "RecordBatch":
+		records = list(records)
+		if not records:
+			return cls.empty(record_type)
+		record_type = record_type or type(records[0])
+		columns: Dict[str, Any] = {}
+		for f in fields(record_type):
+			values = [getattr(r, f.name) for r in records]
+			if all(v is None for v in values):
+				columns[f.name] = None
+			elif isinstance(values[0], datetime):
+				columns[f.name] = np.array([_to_datetime64(v) for v in values])
+			else:
+				columns[f.name] = np.array(values)
+		return cls(record_type, columns)
+
+	@classmethod
+	def empty(cls, record_type) -> "RecordBatch":
+		return cls(record_type, {f.name: np.array([]) for f in fields(record_type) if f.default is MISSING})
+
+	@classmethod
+	def concat(cls, batches: Sequence["RecordBatch"]) -> "RecordBatch":
+		batches = [b for b in batches if len(b)]
+		if not batches:
+			raise ValueError("concat needs at least one non-empty batch")
+		columns = {}
+		for name in batches[0].columns:
+			parts = [b.column(name) for b in batches]
+			columns[name] = None if any(p is None for p in parts) else np.concatenate(parts)
+		return cls(batches[0].record_type, columns)
+
+	def __len__(self) -> int:
+		return self._length
+
+	def __getitem__(self, name: str):
+		return self.column(name)
+
+	@property
+	def names(self) -> List[str]:
+		return list(self.columns.keys())
+
+	def column(self, name: str) -> Optional[np.ndarray]:
+		"""A column as an array of the batch length (scalars are broadcast without copying)."""
+		value = self.columns[name]
+		if value is None or np.ndim(value) > 0:
+			return value
+		return np.broadcast_to(np.asarray(value, dtype=object if isinstance(value, str) else None), (self._length,))
+
+	def slice(self, start: int, stop: int) -> "RecordBatch":
+		return RecordBatch(self.record_type, {k: v[start:stop] if v is not None and np.ndim(v) > 0 else v for k, v in self.columns.items()})
+
+	def take(self, index) -> "RecordBatch":
+		"""Rows selected by a boolean mask or integer index array."""
+		return RecordBatch(self.record_type, {k: v[index] if v is not None and np.ndim(v) > 0 else v for k, v in self.columns.items()})
+
+	def chunks(self, size: int) -> Iterator["RecordBatch"]:
+		for start in range(0, len(self), size):
+			yield self.slice(start, start + size)
+
+	def _column_lists(self, names: Sequence[str]) -> List[List[Any]]:
+		lists = []
+		for name in names:
+			value = self.columns[name]
+			if value is None:
+				lists.append([""] * self._length)
+			elif np.ndim(value) == 0:
+				lists.append([value] * self._length)
+			elif np.issubdtype(value.dtype, np.datetime64):
+				lists.append(iso_timestamps(value))
+			else:
+				lists.append(value.tolist())
+		return lists
+
+	def rows(self, names: Optional[Sequence[str]] = None) -> Iterator[tuple]:
+		"""Row tuples over ``names`` (default all), timestamps as ISO-8601 text; None columns are empty."""
+		return zip(*self._column_lists(self.names if names is None else names))
+
+	def csv_rows(self) -> Iterator[tuple]:
+		"""Rows in ``names`` order for csv.writer; None columns are written empty."""
+		return self.rows()
+
+	def to_frame(self, columns: Optional[Sequence[str]] = None, iso: bool = False):
+		"""pandas DataFrame over the column arrays (None columns are dropped).
+
+		With ``iso=True`` timestamp columns are ISO-8601 strings, as in the CSV and API output.
+		"""
+		import pandas as pd
+		names = [n for n in (columns or self.names) if self.columns[n] is not None]
+		data = {}
+		for name in names:
+			col = self.column(name)
+			data[name] = iso_timestamps(col) if iso and np.issubdtype(col.dtype, np.datetime64) else col
+		return pd.DataFrame(data, copy=False)
+
+	def to_json(self) -> str:
+		"""JSON array of row objects for PostgREST; None columns are omitted so database defaults apply.
+
+		Floats are written in their shortest round-trip form (252.2, as json.dumps would); NaN is null.
+		"""
+		names = [n for n in self.names if self.columns[n] is not None]
+		if not self._length or not names:
+			return "[]"
+		# Each column is encoded once, then rows are filled into a template
+		template = "{" + ",".join(f"{json.dumps(n)}:%s" for n in names) + "}"
+		values = [self._json_values(n) for n in names]
+		return "[" + ",".join([template % row for row in zip(*values)]) + "]"
+
+	def _json_values(self, name: str) -> List[str]:
+		value = self.columns[name]
+		if np.ndim(value) == 0:
+			return [json.dumps(value.item() if isinstance(value, np.generic) else value)] * self._length
+		if np.issubdtype(value.dtype, np.datetime64):
+			# ISO-8601 text needs no escaping
+			return [f'"{v}"' for v in iso_timestamps(value)]
+		if value.dtype.kind in "fiub":
+			if value.dtype.kind == "f" and not np.isfinite(value).all():
+				value = np.where(np.isfinite(value), value, None)
+			# Numbers and null contain no commas, so one dumps call per column can be split
+			return json.dumps(value.tolist(), separators=(",", ":"))[1:-1].split(",")
+		return [json.dumps(v) for v in value.tolist()]
+
+	def to_row_dicts(self) -> List[Dict[str, Any]]:
+		"""Per-row dicts (as ``asdict`` of each record would give); only for small batches."""
+		names = self.names
+		return [dict(zip(names, row)) for row in zip(*(self._native(n) for n in names))]
 
+	def _native(self, name: str) -> List[Any]:
+		value = self.columns[name]
+		if value is None or np.ndim(value) == 0:
+			return [value] * self._length
+		if np.issubdtype(value.dtype, np.datetime64):
+			return [v.replace(tzinfo=timezone.utc) for v in value.astype("datetime64[us]").tolist()]
+		return value.tolist()
@@ -0,0 +1,253 @@
+"""Fan-out of generated steps to every configured output, one worker thread per sink.
+
+Each sink (csv, parquet, sqlite, memmap, supabase) has its own bounded queue, batching and
+retry policy, so a slow or failing output neither delays nor aborts the others. When a
+queue is full the producer blocks or drops a step, according to the backpressure policy.
+Per-sink queue depth, write latency and error counters are available from ``stats()``.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import SimulatorConfig
+from .models import RecordBatch
+
+logger = logging.getLogger(__name__)
+
+BACKPRESSURE_POLICIES = ("block", "drop-newest", "drop-oldest")
+
+_STOP = object()
+
+
+@dataclass(frozen=True)
+class SinkPolicy:
+	queue_size: int = 64
+	# Up to this many queued steps are concatenated into one write
+	batch_steps: int = 1
+	# Retries after a failed write, with exponential backoff from retry_backoff_seconds
+	max_retries: int = 0
+	retry_backoff_seconds: float = 0.5
+
+
+@dataclass
+class SinkStats:
+	enqueued: int = 0
+	written: int = 0
+	rows: int = 0
+	dropped: int = 0
+	errors: int = 0
+	retries: int = 0
+	queue_depth: int = 0
+	last_latency_s: float = 0.0
+	max_latency_s: float = 0.0
+	total_latency_s: float = 0.0
+
+
+def _concat(batches: List[RecordBatch]) -> RecordBatch:
+	# A single step, or steps that are all empty (e.g. no yearly record), need no copy
+	if len(batches) == 1 or not any(len(b) for b in batches):
+		return batches[0]
+	return RecordBatch.concat(batches)
+
+
+class SinkWorker:
+	"""One output behind a bounded queue, written by a daemon thread.
+
+	``write`` is called as write(co2, gen, nz) with RecordBatches; ``close`` runs on the
+	worker thread after the queue has drained.
+	"""
+
+	def __init__(self, name: str, write: Callable, policy: SinkPolicy = SinkPolicy(), close: Optional[Callable] = None):
+		self.name = name
+		self.policy = policy
+		self._write = write
+		self._close = close
+		self._queue: queue.Queue = queue.Queue(maxsize=max(1, policy.queue_size))
+		self._lock = threading.Lock()
+		self._stats = SinkStats()
+		self._thread = threading.Thread(target=self._run, name=f"sink-{name}", daemon=True)
+		self._thread.start()
+
+	def put(self, item: Tuple[RecordBatch, RecordBatch, RecordBatch], backpressure: str = "block") -> bool:
+		"""Queue one step; returns False when it was dropped."""
+		entry = (time.monotonic(), item)
+		if backpressure == "block":
+			if self._queue.full():
+				logger.warning("%s sink is %d steps behind; producer is waiting", self.name, self._queue.qsize())
+			self._queue.put(entry)
+		else:
+			try:
+				self._queue.put_nowait(entry)
+			except queue.Full:
+				if backpressure == "drop-newest":
+					self._count(dropped=1)
+					return False
+				# drop-oldest: make room by discarding the step that has waited longest
+				try:
+					self._queue.get_nowait()
+					self._queue.task_done()
+					self._count(dropped=1)
+				except queue.Empty:
+					pass
+				self._queue.put(entry)
+		self._count(enqueued=1)
+		return True
+
+	def _count(self, **deltas) -> None:
+		with self._lock:
+			for key, value in deltas.items():
+				setattr(self._stats, key, getattr(self._stats, key) + value)
+
+	def _next_batch(self) -> Tuple[List[tuple], bool]:
+		"""Block for one entry, then take up to batch_steps - 1 more that are already queued."""
+		entries, stop = [], False
+		entry = self._queue.get()
+		while True:
+			if entry is _STOP:
+				stop = True
+				break
+			entries.append(entry)
+			if len(entries) >= self.policy.batch_steps:
+				break
+			try:
+				entry = self._queue.get_nowait()
+			except queue.Empty:
+				break
+		return entries, stop
+
+	def _write_with_retries(self, co2: RecordBatch, gen: RecordBatch, nz: RecordBatch) -> None:
+		for attempt in range(self.policy.max_retries + 1):
+			try:
+				self._write(co2, gen, nz)
+				return
+			except Exception as e:
+				if attempt == self.policy.max_retries:
+					raise
+				delay = self.policy.retry_backoff_seconds * 2 ** attempt
+				self._count(retries=1)
+				logger.warning("%s write failed (%s); retry %d/%d in %.1fs", self.name, e, attempt + 1, self.policy.max_retries, delay)
+				time.sleep(delay)
+
+	def _run(self) -> None:
+		stop = False
+		while not stop:
+			entries, stop = self._next_batch()
+			if entries:
+				co2, gen, nz = (_concat([item[i] for _, item in entries]) for i in range(3))
+				try:
+					self._write_with_retries(co2, gen, nz)
+					latency = time.monotonic() - entries[0][0]
+					with self._lock:
+						s = self._stats
+						s.written += len(entries)
+						s.rows += len(co2) + len(gen) + len(nz)
+						s.last_latency_s = latency
+						s.max_latency_s = max(s.max_latency_s, latency)
+						s.total_latency_s += latency
+				except Exception as e:
+					# Keep the worker alive: one failed write must not stop later ones
+					self._count(errors=len(entries))
+					logger.warning("%s write of %d step(s) failed: %s", self.name, len(entries), e)
+			for _ in range(len(entries) + stop):
+				self._queue.task_done()
+		if self._close is not None:
+			try:
+				self._close()
+			except Exception as e:
+				logger.warning("%s close failed: %s", self.name, e)
+
+	def stats(self) -> SinkStats:
+		with self._lock:
+			snapshot = SinkStats(**asdict(self._stats))
+		snapshot.queue_depth = self._queue.qsize()
+		return snapshot
+
+	def join(self) -> None:
+		"""Wait until everything queued so far has been written."""
+		self._queue.join()
+
+	def stop(self) -> None:
+		"""Drain the queue, close the sink and end the thread."""
+		self._queue.put(_STOP)
+		self._thread.join()
+
+
+class SinkPipeline:
+	"""Fans each submitted step out to all sink workers."""
+
+	def __init__(self, workers: List[SinkWorker], backpressure: str = "block"):
+		if backpressure not in BACKPRESSURE_POLICIES:
+			raise ValueError(f"backpressure must be one of {BACKPRESSURE_POLICIES}, got {backpressure!r}")
+		self.workers = workers
+		self.backpressure = backpressure
+
+	def submit(self, co2: RecordBatch, gen: RecordBatch, nz: RecordBatch) -> None:
+		for worker in self.workers:
+			worker.put((co2, gen, nz), self.backpressure)
+
+	def join(self) -> None:
+		for worker in self.workers:
+			worker.join()
+
+	def stats(self) -> Dict[str, SinkStats]:
+		return {worker.name: worker.stats() for worker in self.workers}
+
+	def depths(self) -> Dict[str, int]:
+		return {name: s.queue_depth for name, s in self.stats().items()}
+
+	def close(self) -> Dict[str, SinkStats]:
+		"""Drain and close every sink; returns the final stats."""
+		for worker in self.workers:
+			worker.stop()
+		return self.stats()
+
+	def __enter__(self) -> "SinkPipeline":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
+
+
+def build_pipeline(cfg: SimulatorConfig, backpressure: Optional[str] = None, queue_size: Optional[int] = None) -> SinkPipeline:
+	"""A pipeline with one worker per configured output.
+
+	Local files already buffer in their own sinks, so they take one step per write and are
+	not retried (a partly written step would be duplicated). Supabase accumulates rows across
+	steps into fewer requests and retries transient failures; with ``supabase_spool_dir`` set
+	the worker only appends to the durable spool, which sends in the background. Otherwise
+	``supabase_async`` sends each step's tables concurrently over httpx instead of batching.
+	"""
+	from .simulate import close_sinks, open_sinks, supabase_writes, write_supabase_batches, write_tables
+	from .supabase_client import SupabaseClient
+
+	size = queue_size or cfg.sink_queue_size
+	workers = []
+	for kind, tables in open_sinks(cfg).items():
+		write = lambda co2, gen, nz, tables=tables: write_tables(tables, co2, gen, nz)
+		close = lambda kind=kind, tables=tables: close_sinks({kind: tables})
+		workers.append(SinkWorker(kind, write, SinkPolicy(queue_size=size), close=close))
+	if "supabase" in cfg.outputs() and cfg.supabase_url and cfg.supabase_key:
+		policy = SinkPolicy(queue_size=size, batch_steps=cfg.supabase_batch_steps, max_retries=cfg.supabase_max_retries)
+		if cfg.supabase_spool_dir:
+			# Steps are fsynced to the spool; its own flusher sends them (once batch_rows/batch_seconds
+			# is reached) and retries until they land
+			from .spool import SupabaseSpool
+			sb = SupabaseSpool(cfg.supabase_spool_dir, SupabaseClient(cfg.supabase_url, cfg.supabase_key), max_batch_rows=cfg.supabase_spool_batch_rows, linger_rows=cfg.supabase_batch_rows, linger_seconds=cfg.supabase_batch_seconds)
+			write = lambda co2, gen, nz, sb=sb: write_supabase_batches(cfg, sb, co2, gen, nz)
+		elif cfg.supabase_async:
+			# A step takes as long as its slowest request; the writer creates its event loop on the worker
+			# thread at the first write (build_pipeline may be called from inside the runner's loop)
+			from .async_supabase import AsyncSupabaseWriter
+			sb = AsyncSupabaseWriter(cfg.supabase_url, cfg.supabase_key, max_concurrency=cfg.supabase_max_concurrency)
+			write = lambda co2, gen, nz, sb=sb: sb.write_many(supabase_writes(cfg, co2, gen, nz))
+		else:
+			sb = SupabaseClient(cfg.supabase_url, cfg.supabase_key, batch_rows=cfg.supabase_batch_rows, batch_seconds=cfg.supabase_batch_seconds)
+			write = lambda co2, gen, nz, sb=sb: write_supabase_batches(cfg, sb, co2, gen, nz)
+		workers.append(SinkWorker("supabase", write, policy, close=sb.close))
+	return SinkPipeline(workers, backpressure or cfg.sink_backpressure)
@@ -0,0 +1,150 @@
+"""Autocorrelated weather and outage processes.
+
+The independent draws in bias.py change every step, so an outage lasts exactly one step.
+Here the wind, solar and hydro factors follow AR(1) processes and nuclear outages and fossil
+price shocks follow two-state Markov chains, with the same per-step distributions as the
+independent helpers but realistic persistence. A whole horizon is generated in one
+vectorized pass, and the state at its end can be saved and resumed by the next run.
+"""
+
+import json
+import math
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+
+# Keep phi**-block within float64 precision in the blocked AR(1) scan
+_AR1_BLOCK_DYNAMIC_RANGE = 1e8
+
+
+@dataclass(frozen=True)
+class ProcessParams:
+	# Correlation times (hours) of the weather factors
+	wind_tau_hours: float = 6.0
+	solar_tau_hours: float = 2.0
+	hydro_tau_hours: float = 72.0
+	# Long-run share of steps in each state, and mean duration (hours) of one episode
+	outage_probability: float = 0.15
+	outage_mean_hours: float = 12.0
+	price_shock_probability: float = 0.1
+	price_shock_mean_hours: float = 6.0
+
+
+@dataclass
+class ProcessState:
+	"""State after the last generated step; weather values are standard-normal latents."""
+	wind: float = 0.0
+	solar: float = 0.0
+	hydro: float = 0.0
+	outage: bool = False
+	price_shock: bool = False
+	# Last generated step (ISO 8601), for logging and sanity checks only
+	timestamp: Optional[str] = None
+
+
+def ar1_scan(eps: np.ndarray, phi: float, z0) -> np.ndarray:
+	"""Stationary AR(1) along the last axis: z[t] = phi * z[t-1] + sqrt(1 - phi**2) * eps[t].
+
+	Solved in closed form per block (z = phi**t * (z0 + cumsum(eps * phi**-t))), with blocks
+	short enough that phi**-t stays well conditioned; only the block boundaries are sequential.
+	"""
+	eps = np.asarray(eps, dtype=float)
+	n = eps.shape[-1]
+	c = math.sqrt(1.0 - phi * phi)
+	if phi <= 0.0:
+		return c * eps
+	block = n if phi >= 1.0 else max(1, int(math.log(_AR1_BLOCK_DYNAMIC_RANGE) / -math.log(phi)))
+	decay = phi ** np.arange(min(block, n))
+	out = np.empty_like(eps)
+	prev = np.asarray(z0, dtype=float)
+	for start in range(0, n, block):
+		seg = eps[..., start:start + block]
+		d = decay[:seg.shape[-1]]
+		z = phi * d * prev[..., None] + c * d * np.cumsum(seg / d, axis=-1)
+		out[..., start:start + seg.shape[-1]] = z
+		prev = z[..., -1]
+	return out
+
+
+def markov_scan(u: np.ndarray, p_start: float, p_end: float, s0) -> np.ndarray:
+	"""Two-state chain along the last axis driven by uniforms ``u``.
+
+	An off step turns on when u < p_start and an on step turns off when u >= 1 - p_end. With
+	p_start + p_end <= 1 those regions are disjoint, so each step either sets, resets or keeps
+	the state, and the chain is a forward fill of the last set/reset event.
+	"""
+	if p_start + p_end > 1.0:
+		raise ValueError("p_start + p_end must not exceed 1")
+	u = np.asarray(u, dtype=float)
+	events = np.where(u < p_start, 1, np.where(u >= 1.0 - p_end, 0, -1))
+	idx = np.where(events >= 0, np.arange(u.shape[-1]), -1)
+	last = np.maximum.accumulate(idx, axis=-1)
+	filled = np.take_along_axis(events, np.maximum(last, 0), axis=-1)
+	return np.where(last >= 0, filled, np.asarray(s0, dtype=int)[..., None]).astype(bool)
+
+
+def _phi(step_hours: float, tau_hours: float) -> float:
+	return math.exp(-step_hours / tau_hours) if tau_hours > 0 else 0.0
+
+
+def _switch_probabilities(step_hours: float, probability: float, mean_hours: float):
+	"""Per-step (start, end) probabilities for a chain that is on ``probability`` of the time."""
+	p_end = 1.0 - math.exp(-step_hours / mean_hours) if mean_hours > 0 else 1.0
+	p_start = min(1.0 - p_end, p_end * probability / (1.0 - probability))
+	return p_start, p_end
+
+
+@dataclass
+class WeatherOutageProcess:
+	"""Stateful generator of per-step weather, outage and price-shock factors."""
+	step_minutes: int = 15
+	params: ProcessParams = field(default_factory=ProcessParams)
+	state: ProcessState = field(default_factory=ProcessState)
+
+	@classmethod
+	def stationary(cls, rng: np.random.Generator, step_minutes: int = 15, params: ProcessParams = ProcessParams()) -> "WeatherOutageProcess":
+		"""Start from a draw of the long-run distribution rather than from calm weather."""
+		z = rng.normal(size=3)
+		u = rng.random(size=2)
+		state = ProcessState(wind=float(z[0]), solar=float(z[1]), hydro=float(z[2]), outage=bool(u[0] < params.outage_probability), price_shock=bool(u[1] < params.price_shock_probability))
+		return cls(step_minutes=step_minutes, params=params, state=state)
+
+	def advance(self, rng: np.random.Generator, n_steps: int, scale: float = 1.0) -> Dict[str, np.ndarray]:
+		"""Factors for the next ``n_steps`` steps, as keyword arguments for _generation_mix_columns."""
+		p, s = self.params, self.state
+		h = self.step_minutes / 60.0
+		eps = rng.normal(size=(3, n_steps))
+		u = rng.random(size=(2, n_steps))
+		wind_z = ar1_scan(eps[0], _phi(h, p.wind_tau_hours), s.wind)
+		solar_z = ar1_scan(eps[1], _phi(h, p.solar_tau_hours), s.solar)
+		hydro_z = ar1_scan(eps[2], _phi(h, p.hydro_tau_hours), s.hydro)
+		outage = markov_scan(u[0], *_switch_probabilities(h, p.outage_probability, p.outage_mean_hours), s.outage)
+		shock = markov_scan(u[1], *_switch_probabilities(h, p.price_shock_probability, p.price_shock_mean_hours), s.price_shock)
+		if n_steps:
+			self.state = ProcessState(wind=float(wind_z[-1]), solar=float(solar_z[-1]), hydro=float(hydro_z[-1]), outage=bool(outage[-1]), price_shock=bool(shock[-1]), timestamp=s.timestamp)
+		# Same clamps and spreads as bias.weather_variation_batch
+		return {
+			"wind_factor": np.clip(1.0 + 0.8 * scale * wind_z, 0.1, 3.0),
+			"solar_factor": np.clip(1.0 + 1.0 * scale * solar_z, 0.05, 4.0),
+			"hydro_factor": np.clip(1.0 + 0.3 * scale * hydro_z, 0.3, 2.0),
+			"outage_factor": np.where(outage, 0.3, 1.0),
+			"price_shock_factor": np.where(shock, 0.4, 1.0),
+		}
+
+	def save(self, path: str) -> None:
+		os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+		tmp = f"{path}.tmp"
+		with open(tmp, "w", encoding="utf-8") as f:
+			json.dump({"step_minutes": self.step_minutes, "state": asdict(self.state)}, f)
+		os.replace(tmp, path)
+
+	@classmethod
+	def load(cls, path: str, step_minutes: int = 15) -> Optional["WeatherOutageProcess"]:
+		"""The saved process, or None when there is no state file yet."""
+		if not os.path.isfile(path):
+			return None
+		with open(path, encoding="utf-8") as f:
+			data = json.load(f)
+		return cls(step_minutes=step_minutes, state=ProcessState(**data["state"]))
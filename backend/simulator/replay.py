@@ -0,0 +1,232 @@
+"""Replay stored history into the configured outputs at a chosen speed.
+
+Rows are streamed from the CSV files (or paged from Supabase) in chunks, merged across the
+CO₂ and generation-mix tables by timestamp, and emitted one simulated step at a time on a
+monotonic schedule: a step ``dt`` after the previous one is written ``dt / speed`` later.
+A speed of 0 writes as fast as possible, one chunk at a time. CSVs must be in time order
+(see ``simulate compact``); this is checked before anything is written.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .config import SimulatorConfig
+from .models import Co2IntensityRecord, GenerationMixRecord, NetZeroAlignmentRecord, RecordBatch
+from .pipeline import build_pipeline
+from .simulate import _now_tz
+from .supabase_client import SupabaseClient
+
+logger = logging.getLogger(__name__)
+
+REPLAY_CHUNK_ROWS = 10000
+
+
+def _frame_to_batch(record_type, frame: pd.DataFrame) -> RecordBatch:
+	"""RecordBatch from a stored frame; ids are dropped so the outputs assign their own."""
+	columns = {}
+	for name in frame.columns:
+		if name == "id":
+			continue
+		if name == "timestamp":
+			columns[name] = pd.to_datetime(frame[name], utc=True, format="ISO8601").dt.tz_convert(None).to_numpy(dtype="datetime64[ns]")
+		else:
+			columns[name] = frame[name].to_numpy()
+	return RecordBatch(record_type, columns)
+
+
+def _csv_chunks(path: str, record_type, start: Optional[datetime], end: Optional[datetime], chunk_rows: int) -> Iterator[RecordBatch]:
+	if not os.path.isfile(path):
+		logger.warning("Replay source %s not found; skipping", path)
+		return
+	for frame in pd.read_csv(path, chunksize=chunk_rows):
+		batch = _frame_to_batch(record_type, frame)
+		yield _time_filter(batch, start, end)
+
+
+def check_csv_order(path: str, start: Optional[datetime] = None, end: Optional[datetime] = None, chunk_rows: int = REPLAY_CHUNK_ROWS) -> None:
+	"""Raise ValueError unless the rows of ``path`` in [start, end) are in time order (reads only the timestamp column)."""
+	if not os.path.isfile(path):
+		return
+	last = None
+	for frame in pd.read_csv(path, usecols=["timestamp"], chunksize=chunk_rows):
+		ts = pd.to_datetime(frame["timestamp"], utc=True, format="ISO8601").dt.tz_convert(None).to_numpy(dtype="datetime64[ns]")
+		if start is not None:
+			ts = ts[ts >= _utc64(start)]
+		if end is not None:
+			ts = ts[ts < _utc64(end)]
+		if not len(ts):
+			continue
+		if np.any(ts[1:] < ts[:-1]) or (last is not None and ts[0] < last):
+			raise ValueError(f"{path} is not in time order; run `python -m simulator.simulate compact --input-dir {os.path.dirname(path) or '.'}` before replaying it")
+		last = ts[-1]
+
+
+def _supabase_chunks(sb: SupabaseClient, table: str, record_type, start: Optional[datetime], end: Optional[datetime], chunk_rows: int) -> Iterator[RecordBatch]:
+	# region_id breaks timestamp ties, so offset pages neither skip nor repeat rows of a step
+	params = {"select": "*", "order": "timestamp.asc,region_id.asc"}
+	bounds = []
+	if start is not None:
+		bounds.append(f"timestamp.gte.{start.isoformat()}")
+	if end is not None:
+		bounds.append(f"timestamp.lt.{end.isoformat()}")
+	if bounds:
+		params["and"] = f"({','.join(bounds)})"
+	offset = 0
+	while True:
+		rows = sb.select_rows(table, params, offset=offset, limit=chunk_rows)
+		if not rows:
+			return
+		yield _frame_to_batch(record_type, pd.DataFrame(rows))
+		if len(rows) < chunk_rows:
+			return
+		offset += len(rows)
+
+
+def _time_filter(batch: RecordBatch, start: Optional[datetime], end: Optional[datetime]) -> RecordBatch:
+	if start is None and end is None:
+		return batch
+	ts = batch["timestamp"]
+	keep = np.ones(len(batch), dtype=bool)
+	if start is not None:
+		keep &= ts >= _utc64(start)
+	if end is not None:
+		keep &= ts < _utc64(end)
+	return batch.take(keep)
+
+
+def _utc64(value: datetime) -> np.datetime64:
+	return pd.Timestamp(value).tz_convert("UTC").tz_localize(None).to_datetime64()
+
+
+def _merge_by_time(co2_chunks: Iterator[RecordBatch], gen_chunks: Iterator[RecordBatch]) -> Iterator[Tuple[RecordBatch, RecordBatch]]:
+	"""Pair up both streams into windows that cover the same timestamps (each stream sorted by time).
+
+	A window ends before the last timestamp buffered from any open stream, since the next
+	chunk may still hold rows for it (e.g. the remaining regions of that step).
+	"""
+	streams = [[co2_chunks, RecordBatch.empty(Co2IntensityRecord), False], [gen_chunks, RecordBatch.empty(GenerationMixRecord), False]]
+
+	def pull(stream) -> None:
+		nxt = next(stream[0], None)
+		stream[2] = nxt is None
+		stream[1] = _concat(stream[1], nxt)
+
+	while True:
+		for stream in streams:
+			while not stream[2] and not len(stream[1]):
+				pull(stream)
+		if all(done and not len(buf) for _, buf, done in streams):
+			return
+		ends = [buf["timestamp"][-1] for _, buf, done in streams if not done]
+		cut = min(ends) if ends else None
+		parts = []
+		for stream in streams:
+			now, stream[1] = _split(stream[1], cut)
+			parts.append(now)
+		if not any(len(p) for p in parts):
+			# Only rows at the cut timestamp are buffered; read on until that step is complete
+			for stream in streams:
+				if not stream[2] and stream[1]["timestamp"][-1] == cut:
+					pull(stream)
+			continue
+		yield parts[0], parts[1]
+
+
+def _concat(buf: RecordBatch, nxt: Optional[RecordBatch]) -> RecordBatch:
+	if nxt is None or not len(nxt):
+		return buf
+	return RecordBatch.concat([buf, nxt]) if len(buf) else nxt
+
+
+def _split(batch: RecordBatch, cut) -> Tuple[RecordBatch, RecordBatch]:
+	if cut is None:
+		return batch, RecordBatch.empty(batch.record_type)
+	n = int(np.searchsorted(batch["timestamp"], cut, side="left"))
+	return batch.slice(0, n), batch.slice(n, len(batch))
+
+
+def _steps(co2: RecordBatch, gen: RecordBatch) -> Iterator[Tuple[np.datetime64, RecordBatch, RecordBatch]]:
+	"""Split a window into one (timestamp, co2, gen) group per distinct timestamp."""
+	times = np.union1d(co2["timestamp"], gen["timestamp"])
+	co2_bounds = np.searchsorted(co2["timestamp"], times, side="right")
+	gen_bounds = np.searchsorted(gen["timestamp"], times, side="right")
+	co2_start = gen_start = 0
+	for t, c, g in zip(times, co2_bounds, gen_bounds):
+		yield t, co2.slice(co2_start, c), gen.slice(gen_start, g)
+		co2_start, gen_start = c, g
+
+
+def _shifted(batch: RecordBatch, offset: np.timedelta64) -> RecordBatch:
+	if not len(batch) or not offset:
+		return batch
+	columns = dict(batch.columns)
+	columns["timestamp"] = batch["timestamp"] + offset
+	return RecordBatch(batch.record_type, columns)
+
+
+def run_replay(cfg: SimulatorConfig, source: str = "csv", input_dir: str = "data", speed: float = 1.0, shift_to_now: bool = False, start: Optional[datetime] = None, end: Optional[datetime] = None, chunk_rows: int = REPLAY_CHUNK_ROWS) -> dict:
+	"""Re-emit stored CO₂ intensity and generation mix rows to the configured outputs.
+
+	``speed`` is the simulated-to-wall-clock ratio (1.0 = real time, 0 = no pacing). With
+	``shift_to_now`` the first replayed step is moved to the current step and the rest keep
+	their spacing. Returns replay statistics.
+	"""
+	sb = SupabaseClient(cfg.supabase_url, cfg.supabase_key)
+	if source == "supabase":
+		if not sb.enabled():
+			raise RuntimeError("Supabase URL/KEY not set; cannot replay from Supabase")
+		co2_chunks = _supabase_chunks(sb, cfg.table_co2_intensity, Co2IntensityRecord, start, end, chunk_rows)
+		gen_chunks = _supabase_chunks(sb, cfg.table_generation_mix, GenerationMixRecord, start, end, chunk_rows)
+	else:
+		# The streams are merged by time in one pass, so an unsorted file would be replayed out of order
+		for name in ("co2_intensity.csv", "generation_mix.csv"):
+			check_csv_order(os.path.join(input_dir, name), start, end, chunk_rows)
+		co2_chunks = _csv_chunks(os.path.join(input_dir, "co2_intensity.csv"), Co2IntensityRecord, start, end, chunk_rows)
+		gen_chunks = _csv_chunks(os.path.join(input_dir, "generation_mix.csv"), GenerationMixRecord, start, end, chunk_rows)
+
+	no_nz = RecordBatch.empty(NetZeroAlignmentRecord)
+	first: Optional[np.datetime64] = None
+	offset = np.timedelta64(0, "ns")
+	rows = steps = 0
+	max_lag = 0.0
+	# Unpaced replay must not drop steps; paced replay follows the configured backpressure
+	pipeline = build_pipeline(cfg, backpressure="block" if speed <= 0 else None)
+	t0 = time.monotonic()
+	try:
+		for co2_win, gen_win in _merge_by_time(co2_chunks, gen_chunks):
+			if not len(co2_win) and not len(gen_win):
+				continue
+			if first is None:
+				first = min(b["timestamp"][0] for b in (co2_win, gen_win) if len(b))
+				if shift_to_now:
+					step = pd.Timedelta(minutes=cfg.step_minutes)
+					offset = _utc64(pd.Timestamp(_now_tz(cfg.timezone)).floor(step)) - first
+			if speed <= 0:
+				pipeline.submit(_shifted(co2_win, offset), _shifted(gen_win, offset), no_nz)
+				rows += len(co2_win) + len(gen_win)
+				steps += len(np.union1d(co2_win["timestamp"], gen_win["timestamp"]))
+				continue
+			for ts, co2, gen in _steps(co2_win, gen_win):
+				due = t0 + (ts - first) / np.timedelta64(1, "s") / speed
+				delay = due - time.monotonic()
+				if delay > 0:
+					time.sleep(delay)
+				max_lag = max(max_lag, -delay)
+				pipeline.submit(_shifted(co2, offset), _shifted(gen, offset), no_nz)
+				rows += len(co2) + len(gen)
+				steps += 1
+	finally:
+		sink_stats = pipeline.close()
+
+	elapsed = time.monotonic() - t0
+	rate = rows / elapsed if elapsed > 0 else float("inf")
+	print(f"Replayed {steps} steps ({rows} rows) from {source} at speed {speed or 'max'} in {elapsed:.2f}s: {rate:,.0f} rows/sec (max lag {max_lag:.2f}s)")
+	return {"steps": steps, "rows": rows, "seconds": elapsed, "rows_per_sec": rate, "max_lag_s": max_lag, "sinks": sink_stats}
@@ -0,0 +1,383 @@
+"""Retention: fold old raw time-series rows into hourly/daily rollups and delete them.
+
+Raw ``co2_intensity`` and ``generation_mix`` rows are kept for ``retain_days``; everything
+before the cutoff (midnight UTC, ``retain_days`` ago) is aggregated per region into
+``<table>_hourly`` and ``<table>_daily`` and then removed, so storage grows with the number
+of hours and days, not steps. Each rollup row has ``samples`` (raw row count) and the
+mean/min/max of every metric; CO2 rollups also carry the energy-weighted intensity
+(weighted by generation_mix.total_mw) and ``energy_mwh``.
+
+Backends: CSV directories, the SQLite database and the Parquet dataset are handled here;
+Supabase runs the same job server-side (``public.apply_retention``, database/sql/08_retention.sql).
+SQLite, Supabase and Parquet merge rows that arrive late into existing rollups; CSV rollups
+are only appended to, so late rows for a bucket already written are dropped. The CSV files
+are rewritten like ``compact``, so stop the simulator writing to them first.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from .models import DEFAULT_REGION_ID, iso_timestamps
+from .storage import ensure_dir
+
+logger = logging.getLogger(__name__)
+
+RETENTION_CHUNK_ROWS = 200_000
+# Rollup table suffix -> pandas floor frequency and length of the ISO timestamp prefix kept
+RESOLUTIONS = {"hourly": ("h", 13), "daily": ("D", 10)}
+METRICS = {
+	"co2_intensity": ("co2_intensity_g_per_kwh",),
+	"generation_mix": ("hydro_mw", "wind_mw", "solar_mw", "nuclear_mw", "fossil_mw", "total_mw", "renewable_share_pct"),
+}
+WEIGHTED = "co2_intensity_g_per_kwh_weighted"
+# Parquet schema metadata of a rollup file: the raw part files already folded into it
+ROLLED_UP_PARTS_KEY = b"rolled_up_parts"
+
+
+def rollup_columns(table: str) -> List[str]:
+	"""Column order of ``<table>_hourly`` / ``<table>_daily``."""
+	cols = ["timestamp", "region_id", "samples"]
+	for metric in METRICS[table]:
+		cols += [f"{metric}_mean", f"{metric}_min", f"{metric}_max"]
+	if table == "co2_intensity":
+		cols.append(WEIGHTED)
+	return cols + ["energy_mwh"]
+
+
+def retention_cutoff(retain_days: int, now: Optional[datetime] = None) -> datetime:
+	"""Midnight UTC ``retain_days`` before ``now``; rollup buckets before it are complete."""
+	now = now or datetime.now(timezone.utc)
+	day = (now - timedelta(days=retain_days)).astimezone(timezone.utc)
+	return day.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _iso(ts: pd.Series) -> List[str]:
+	return iso_timestamps(ts.dt.tz_convert(None).to_numpy(dtype="datetime64[us]"))
+
+
+# --- Aggregation (CSV and Parquet) -------------------------------------------
+
+
+def rollup_frames(co2: pd.DataFrame, gen: pd.DataFrame, resolution: str, step_minutes: int) -> Dict[str, pd.DataFrame]:
+	"""Rollups of raw frames (UTC ``timestamp``, ``region_id`` and metric columns) per table."""
+	freq = RESOLUTIONS[resolution][0]
+	step_hours = step_minutes / 60
+	out = {}
+	# total_mw per step, for the energy weighting of CO2 intensity
+	energy = None
+	if len(gen):
+		energy = gen.assign(_step=gen["timestamp"].dt.round(f"{step_minutes}min")).groupby(["_step", "region_id"])["total_mw"].mean().rename("_mw")
+	for table, df in (("co2_intensity", co2), ("generation_mix", gen)):
+		if not len(df):
+			continue
+		metrics = list(METRICS[table])
+		df = df.assign(_bucket=df["timestamp"].dt.floor(freq))
+		if table == "co2_intensity":
+			df = df.assign(_step=df["timestamp"].dt.round(f"{step_minutes}min"))
+			df = df.join(energy, on=["_step", "region_id"]) if energy is not None else df.assign(_mw=float("nan"))
+			df["_w"] = df["co2_intensity_g_per_kwh"] * df["_mw"]
+		else:
+			df = df.assign(_mw=df["total_mw"])
+		grouped = df.groupby(["_bucket", "region_id"], sort=True)
+		agg = grouped[metrics].agg(["mean", "min", "max"])
+		agg.columns = [f"{m}_{stat}" for m, stat in agg.columns]
+		agg.insert(0, "samples", grouped.size())
+		mw = grouped["_mw"].sum(min_count=1)
+		if table == "co2_intensity":
+			agg[WEIGHTED] = grouped["_w"].sum(min_count=1) / mw.where(mw != 0)
+		agg["energy_mwh"] = mw * step_hours
+		agg = agg.reset_index().rename(columns={"_bucket": "timestamp"})
+		out[table] = agg[rollup_columns(table)]
+	return out
+
+
+def merge_rollups(old: pd.DataFrame, new: pd.DataFrame, table: str) -> pd.DataFrame:
+	"""Combine rollups of the same buckets like the SQLite/Supabase upserts: sample-weighted means, energy-weighted intensity."""
+	if not len(old):
+		return new
+	if not len(new):
+		return old
+	both = pd.concat([old, new], ignore_index=True)
+	keys = [both["timestamp"], both["region_id"]]
+	grouped = both.groupby(keys, sort=True)
+	out = grouped["samples"].sum().to_frame()
+	for metric in METRICS[table]:
+		out[f"{metric}_mean"] = (both[f"{metric}_mean"] * both["samples"]).groupby(keys, sort=True).sum(min_count=1) / out["samples"]
+		out[f"{metric}_min"] = grouped[f"{metric}_min"].min()
+		out[f"{metric}_max"] = grouped[f"{metric}_max"].max()
+	energy = both["energy_mwh"].fillna(0)
+	if table == "co2_intensity":
+		weighted = (both[WEIGHTED] * both["energy_mwh"]).fillna(0).groupby(keys, sort=True).sum()
+		total = energy.groupby(keys, sort=True).sum()
+		out[WEIGHTED] = weighted / total.where(total != 0)
+	out["energy_mwh"] = grouped["energy_mwh"].sum(min_count=1)
+	out = out.rename_axis(["timestamp", "region_id"]).reset_index()
+	return out[rollup_columns(table)]
+
+
+def _raw_frame(df: pd.DataFrame, table: str) -> pd.DataFrame:
+	"""Typed copy of raw rows: UTC timestamps, float metrics, region_id filled in."""
+	out = pd.DataFrame({"timestamp": pd.to_datetime(df["timestamp"], utc=True, format="ISO8601")})
+	out["region_id"] = df["region_id"].replace("", DEFAULT_REGION_ID) if "region_id" in df.columns else DEFAULT_REGION_ID
+	for metric in METRICS[table]:
+		out[metric] = pd.to_numeric(df[metric])
+	return out
+
+
+# --- CSV ------------------------------------------------------------------
+
+
+def _last_timestamp(path: str) -> Optional[str]:
+	"""Timestamp (first field) of the last row of a CSV, read from the end of the file."""
+	with open(path, "rb") as f:
+		f.seek(0, os.SEEK_END)
+		f.seek(max(0, f.tell() - 65536))
+		last = next((line for line in reversed(f.read().splitlines()) if line.strip()), b"")
+	field = last.split(b",", 1)[0].decode("utf-8")
+	return None if field in ("", "timestamp") else field
+
+
+def _split_csv(path: str, cutoff: pd.Timestamp, table: str, chunk_rows: int) -> Tuple[pd.DataFrame, str, int]:
+	"""Old rows (typed) and a temporary copy of the file with only the rows to keep."""
+	kept_path = f"{path}.retain.tmp"
+	old, kept = [], 0
+	with open(path, encoding="utf-8") as f:
+		header = f.readline()
+	with open(kept_path, "w", newline="", encoding="utf-8") as out:
+		out.write(header)
+		for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_rows):
+			ts = pd.to_datetime(chunk["timestamp"], utc=True, format="ISO8601")
+			mask = (ts < cutoff).to_numpy()
+			if mask.any():
+				old.append(_raw_frame(chunk[mask], table))
+			# Kept rows are copied as text, unchanged
+			chunk[~mask].to_csv(out, index=False, header=False)
+			kept += int((~mask).sum())
+	frame = pd.concat(old, ignore_index=True) if old else pd.DataFrame(columns=["timestamp", "region_id", *METRICS[table]])
+	return frame, kept_path, kept
+
+
+def _append_rollup_csv(path: str, df: pd.DataFrame) -> int:
+	# A rerun after a crash between appending and replacing the raw file skips buckets already written
+	if os.path.isfile(path):
+		last = _last_timestamp(path)
+		if last is not None:
+			df = df[df["timestamp"] > pd.Timestamp(last)]
+	if not len(df):
+		return 0
+	df = df.assign(timestamp=_iso(df["timestamp"]))
+	exists = os.path.isfile(path) and os.path.getsize(path) > 0
+	df.to_csv(path, mode="a", index=False, header=not exists)
+	return len(df)
+
+
+def apply_csv_retention(directory: str, cutoff: datetime, step_minutes: int = 15, chunk_rows: int = RETENTION_CHUNK_ROWS) -> Dict[str, int]:
+	"""Roll up and drop rows before ``cutoff`` in ``directory``/<table>.csv."""
+	cutoff = pd.Timestamp(cutoff)
+	raw, temps, stats = {}, {}, {}
+	try:
+		for table in METRICS:
+			path = os.path.join(directory, f"{table}.csv")
+			if os.path.isfile(path):
+				raw[table], temps[table], stats[f"{table}_kept"] = _split_csv(path, cutoff, table, chunk_rows)
+				stats[f"{table}_deleted"] = len(raw[table])
+		if not any(len(df) for df in raw.values()):
+			return stats
+		empty = lambda t: pd.DataFrame(columns=["timestamp", "region_id", *METRICS[t]])
+		co2, gen = raw.get("co2_intensity", empty("co2_intensity")), raw.get("generation_mix", empty("generation_mix"))
+		for resolution in RESOLUTIONS:
+			for table, df in rollup_frames(co2, gen, resolution, step_minutes).items():
+				stats[f"{table}_{resolution}"] = _append_rollup_csv(os.path.join(directory, f"{table}_{resolution}.csv"), df)
+		for table, tmp in list(temps.items()):
+			path = os.path.join(directory, f"{table}.csv")
+			os.replace(tmp, path)
+			del temps[table]
+			# Byte offsets of a compaction index no longer match
+			if os.path.isfile(f"{path}.idx"):
+				os.remove(f"{path}.idx")
+	finally:
+		for tmp in temps.values():
+			if os.path.isfile(tmp):
+				os.remove(tmp)
+	return stats
+
+
+# --- Parquet --------------------------------------------------------------
+
+
+def _read_rollup_parquet(pq, path: str) -> Tuple[pd.DataFrame, set]:
+	"""An existing rollup file and the names of the raw parts already folded into it."""
+	if not os.path.isfile(path):
+		return pd.DataFrame(), set()
+	arrow = pq.read_table(path)
+	parts = (arrow.schema.metadata or {}).get(ROLLED_UP_PARTS_KEY)
+	return arrow.to_pandas(), set(json.loads(parts)) if parts else set()
+
+
+def apply_parquet_retention(root: str, cutoff: datetime, step_minutes: int = 15) -> Dict[str, int]:
+	"""Roll up and delete the raw part files of ``date=`` partitions before ``cutoff``.
+
+	Each day's rollups are merged into ``<root>/<table>_<resolution>/date=<day>/rollup.parquet``,
+	so rows that land in a day after it was rolled up are added to its buckets. The file
+	records which raw parts it includes, so a rerun after a crash does not count them twice.
+	"""
+	from .storage import _pyarrow
+
+	pa, pq = _pyarrow()
+	cutoff_day = pd.Timestamp(cutoff).strftime("%Y-%m-%d")
+	days = set()
+	for table in METRICS:
+		base = os.path.join(root, table)
+		if os.path.isdir(base):
+			days.update(d.split("=", 1)[1] for d in os.listdir(base) if d.startswith("date=") and d.split("=", 1)[1] < cutoff_day)
+	stats: Dict[str, int] = {}
+	for day in sorted(days):
+		files, frames = {}, {}
+		for table, metrics in METRICS.items():
+			part = os.path.join(root, table, f"date={day}")
+			files[table] = sorted(os.path.join(part, f) for f in os.listdir(part) if f.endswith(".parquet")) if os.path.isdir(part) else []
+			for f in files[table]:
+				df = pq.read_table(f).to_pandas()
+				if "region_id" not in df.columns:
+					df["region_id"] = DEFAULT_REGION_ID
+				df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+				frames[f] = df
+			stats[f"{table}_deleted"] = stats.get(f"{table}_deleted", 0) + sum(len(frames[f]) for f in files[table])
+
+		def raw(table: str, paths: List[str]) -> pd.DataFrame:
+			parts = [frames[f] for f in paths]
+			return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=["timestamp", "region_id", *METRICS[table]])
+
+		# CO2 rollups are weighted by every generation-mix row of the day still held raw
+		gen_all = raw("generation_mix", files["generation_mix"])
+		for table in METRICS:
+			for resolution in RESOLUTIONS:
+				directory = os.path.join(root, f"{table}_{resolution}", f"date={day}")
+				path = os.path.join(directory, "rollup.parquet")
+				old, done = _read_rollup_parquet(pq, path)
+				todo = [f for f in files[table] if os.path.basename(f) not in done]
+				if not todo:
+					continue
+				new = raw(table, todo)
+				co2, gen = (new, gen_all) if table == "co2_intensity" else (raw("co2_intensity", []), new)
+				agg = rollup_frames(co2, gen, resolution, step_minutes).get(table)
+				if agg is None:
+					continue
+				agg = agg.assign(timestamp=agg["timestamp"].astype("datetime64[us, UTC]"))
+				merged = merge_rollups(old, agg, table)
+				arrow = pa.Table.from_pandas(merged, preserve_index=False)
+				parts = sorted(done | {os.path.basename(f) for f in todo})
+				arrow = arrow.replace_schema_metadata({**(arrow.schema.metadata or {}), ROLLED_UP_PARTS_KEY: json.dumps(parts).encode("utf-8")})
+				ensure_dir(directory)
+				pq.write_table(arrow, f"{path}.tmp")
+				os.replace(f"{path}.tmp", path)
+				stats[f"{table}_{resolution}"] = stats.get(f"{table}_{resolution}", 0) + len(agg)
+		# Only the parts rolled up above: a part written meanwhile is left for the next run
+		for table in METRICS:
+			for f in files[table]:
+				os.remove(f)
+			part = os.path.join(root, table, f"date={day}")
+			if os.path.isdir(part) and not os.listdir(part):
+				os.rmdir(part)
+	return stats
+
+
+# --- SQLite ---------------------------------------------------------------
+
+
+def _sqlite_rollup_sql(table: str, resolution: str, step_minutes: int) -> Tuple[str, str]:
+	"""DDL and the upsert that folds raw rows before the cutoff (bound twice) into one rollup table."""
+	prefix = RESOLUTIONS[resolution][1]
+	rollup = f"{table}_{resolution}"
+	cols = rollup_columns(table)
+	ddl_cols = ['"timestamp" text not null', "region_id text not null", "samples integer not null"]
+	ddl_cols += [f"{c} real" for c in cols[3:]]
+	ddl = f'create table if not exists {rollup} ({", ".join(ddl_cols)}, primary key (region_id, "timestamp"));'
+	suffix = ":00:00+00:00" if resolution == "hourly" else "T00:00:00+00:00"
+	bucket = f"substr(r.\"timestamp\", 1, {prefix}) || '{suffix}'"
+	select = [bucket, "r.region_id", "count(*)"]
+	update = ["samples = t.samples + excluded.samples"]
+	for metric in METRICS[table]:
+		select += [f"avg(r.{metric})", f"min(r.{metric})", f"max(r.{metric})"]
+		update += [
+			f"{metric}_mean = (t.{metric}_mean * t.samples + excluded.{metric}_mean * excluded.samples) / (t.samples + excluded.samples)",
+			f"{metric}_min = min(t.{metric}_min, excluded.{metric}_min)",
+			f"{metric}_max = max(t.{metric}_max, excluded.{metric}_max)",
+		]
+	hours = step_minutes / 60
+	if table == "co2_intensity":
+		# One total_mw per step (averaged in case a step was written twice) weights the intensity
+		source = (
+			"co2_intensity r left join (select region_id, \"timestamp\", avg(total_mw) as mw from generation_mix"
+			" where \"timestamp\" < ? group by region_id, \"timestamp\") g on g.region_id = r.region_id and g.\"timestamp\" = r.\"timestamp\""
+		)
+		select += ["sum(r.co2_intensity_g_per_kwh * g.mw) / nullif(sum(g.mw), 0)", f"sum(g.mw) * {hours}"]
+		update.append(
+			f"{WEIGHTED} = (coalesce(t.{WEIGHTED} * t.energy_mwh, 0) + coalesce(excluded.{WEIGHTED} * excluded.energy_mwh, 0))"
+			" / nullif(coalesce(t.energy_mwh, 0) + coalesce(excluded.energy_mwh, 0), 0)"
+		)
+	else:
+		source = "generation_mix r"
+		select.append(f"sum(r.total_mw) * {hours}")
+	update.append("energy_mwh = coalesce(t.energy_mwh, 0) + coalesce(excluded.energy_mwh, 0)")
+	names = ", ".join(f'"{c}"' for c in cols)
+	sql = (
+		f"insert into {rollup} as t ({names}) select {', '.join(select)} from {source}"
+		f" where r.\"timestamp\" < ? group by 1, 2"
+		f" on conflict (region_id, \"timestamp\") do update set {', '.join(update)}"
+	)
+	return ddl, sql
+
+
+def apply_sqlite_retention(path: str, cutoff: datetime, step_minutes: int = 15) -> Dict[str, int]:
+	"""Roll up and delete rows before ``cutoff`` in one transaction."""
+	from .sqlite_store import connect
+
+	cutoff_iso = cutoff.astimezone(timezone.utc).isoformat()
+	conn = connect(path)
+	stats: Dict[str, int] = {}
+	try:
+		with conn:
+			for table in METRICS:
+				for resolution in RESOLUTIONS:
+					ddl, sql = _sqlite_rollup_sql(table, resolution, step_minutes)
+					conn.execute(ddl)
+					params = (cutoff_iso, cutoff_iso) if table == "co2_intensity" else (cutoff_iso,)
+					stats[f"{table}_{resolution}"] = conn.execute(sql, params).rowcount
+			for table in METRICS:
+				stats[f"{table}_deleted"] = conn.execute(f'delete from {table} where "timestamp" < ?', (cutoff_iso,)).rowcount
+	finally:
+		conn.close()
+	return stats
+
+
+# --- Entry point ----------------------------------------------------------
+
+
+def apply_retention(cfg, retain_days: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, Dict[str, object]]:
+	"""Run retention on every configured output that keeps raw history; returns stats per output."""
+	from .supabase_client import SupabaseClient
+
+	retain_days = cfg.retention_days if retain_days is None else retain_days
+	cutoff = retention_cutoff(retain_days, now)
+	outputs = cfg.outputs()
+	results: Dict[str, Dict[str, object]] = {}
+	if "csv" in outputs and os.path.isdir(cfg.csv_output_dir):
+		results["csv"] = apply_csv_retention(cfg.csv_output_dir, cutoff, cfg.step_minutes)
+	if "sqlite" in outputs and os.path.isfile(cfg.sqlite_path):
+		results["sqlite"] = apply_sqlite_retention(cfg.sqlite_path, cutoff, cfg.step_minutes)
+	if "parquet" in outputs and os.path.isdir(cfg.parquet_output_dir):
+		results["parquet"] = apply_parquet_retention(cfg.parquet_output_dir, cutoff, cfg.step_minutes)
+	sb = SupabaseClient(cfg.supabase_url, cfg.supabase_key)
+	if "supabase" in outputs and sb.enabled():
+		results["supabase"] = sb.rpc("apply_retention", {"retain_days": retain_days, "step_minutes": cfg.step_minutes})
+	for output, stats in results.items():
+		logger.info("Retention (raw before %s) on %s: %s", cutoff.isoformat(), output, stats)
+	return results
@@ -0,0 +1,124 @@
+"""Drift-free asyncio runner for continuous mode.
+
+Tick ``k`` is due at ``start + k * wall_interval_seconds`` on the event loop's monotonic
+clock, so write latency never shifts the cadence. Each step is handed to the sink pipeline
+(one worker per output behind a bounded queue); a slow Supabase delays only its own
+worker. When the sinks fall behind, the queues fill up and generation waits or steps are
+dropped (SINK_BACKPRESSURE), and the lag and skipped ticks are reported.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Dict, Optional
+
+from .config import SimulatorConfig
+from .pipeline import SinkStats, build_pipeline
+from .transport import TransportStats, get_transport
+
+logger = logging.getLogger(__name__)
+
+# Log a status line every this many ticks even when on time
+STATUS_EVERY_TICKS = 100
+
+
+@dataclass
+class RunnerStats:
+	ticks: int = 0
+	missed_ticks: int = 0
+	last_lag_s: float = 0.0
+	max_lag_s: float = 0.0
+	sinks: Dict[str, SinkStats] = field(default_factory=dict)
+	http: Optional[TransportStats] = None
+
+
+def _install_signal_handlers(stop: asyncio.Event) -> None:
+	loop = asyncio.get_running_loop()
+	for sig in (signal.SIGINT, signal.SIGTERM):
+		try:
+			loop.add_signal_handler(sig, stop.set)
+		except (NotImplementedError, RuntimeError):
+			# Not supported on this platform / not the main thread; Ctrl+C still cancels asyncio.run
+			pass
+
+
+async def run_continuous_async(cfg: SimulatorConfig, queue_size: Optional[int] = None, max_ticks: Optional[int] = None, stop: Optional[asyncio.Event] = None) -> RunnerStats:
+	"""Generate one simulated step per wall-clock interval until stopped, then flush all queued writes.
+
+	Ticks that are due while a previous one is still running are skipped (counted in
+	``missed_ticks``) so the schedule re-aligns; simulated time still advances one step per
+	generated tick, so the written series has no gaps.
+	"""
+	from .simulate import _regions, current_anchor, generate_step, load_process
+
+	loop = asyncio.get_running_loop()
+	stop = stop or asyncio.Event()
+	_install_signal_handlers(stop)
+	stats = RunnerStats()
+	pipeline = build_pipeline(cfg, queue_size=queue_size)
+	# Region shards reuse one process pool for the whole run
+	pool = ProcessPoolExecutor(max_workers=cfg.workers) if _regions(cfg) and cfg.workers > 1 else None
+	# ar1 weather/outage state carries over from the last backfill or run, and is saved every tick
+	process = load_process(cfg)
+
+	interval = float(cfg.wall_interval_seconds)
+	step = timedelta(minutes=cfg.step_minutes)
+	anchor = current_anchor(cfg)
+	start = loop.time()
+	tick = 0
+	try:
+		while not stop.is_set() and (max_ticks is None or stats.ticks < max_ticks):
+			due = start + tick * interval
+			delay = due - loop.time()
+			if delay > 0:
+				try:
+					await asyncio.wait_for(stop.wait(), timeout=delay)
+					break
+				except asyncio.TimeoutError:
+					pass
+			lag = max(0.0, loop.time() - due)
+			stats.last_lag_s = lag
+			stats.max_lag_s = max(stats.max_lag_s, lag)
+
+			item = await asyncio.to_thread(generate_step, cfg, anchor, pool, process)
+			if process is not None:
+				await asyncio.to_thread(process.save, cfg.state_file)
+			# Blocks (off the event loop) while a full queue waits under the "block" policy
+			await asyncio.to_thread(pipeline.submit, *item)
+			stats.ticks += 1
+			anchor = anchor + step
+
+			# Skip ticks whose slot has already passed instead of bursting to catch up
+			missed = int((loop.time() - start) // interval) - tick if interval > 0 else 0
+			if missed > 0:
+				stats.missed_ticks += missed
+				logger.warning("Tick %d finished %.2fs after it was due; skipped %d tick(s) (queue depths %s)", tick, loop.time() - due, missed, pipeline.depths())
+				tick += missed
+			tick += 1
+			if stats.ticks % STATUS_EVERY_TICKS == 0:
+				logger.info("ticks=%d missed=%d lag=%.3fs max_lag=%.3fs sinks=%s http=%s", stats.ticks, stats.missed_ticks, lag, stats.max_lag_s, _summary(pipeline.stats()), _http_summary(get_transport().stats()))
+	finally:
+		# Graceful shutdown: let every sink drain its queue and close
+		stats.sinks = await asyncio.to_thread(pipeline.close)
+		if pool is not None:
+			pool.shutdown()
+		stats.http = get_transport().stats()
+		logger.info("Stopped after %d ticks (missed %d, max lag %.3fs, sinks %s, http %s)", stats.ticks, stats.missed_ticks, stats.max_lag_s, _summary(stats.sinks), _http_summary(stats.http))
+	return stats
+
+
+def _summary(sinks: Dict[str, SinkStats]) -> Dict[str, str]:
+	"""Compact per-sink status for log lines."""
+	return {
+		name: f"depth={s.queue_depth} written={s.written} dropped={s.dropped} errors={s.errors} max_latency={s.max_latency_s:.3f}s"
+		for name, s in sinks.items()
+	}
+
+
+def _http_summary(s: TransportStats) -> str:
+	return f"requests={s.requests} retries={s.retries} failures={s.failures} mean_latency={s.mean_latency_s:.3f}s max_latency={s.max_latency_s:.3f}s"
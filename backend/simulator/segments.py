@@ -0,0 +1,226 @@
+"""Rotated, compressed CSV segments that many writer processes can share.
+
+Layout: ``<root>/<table>/<bucket>/<writer>-<seq>.csv`` where ``bucket`` is the hour
+(``2025-01-01T13``) or day (``2025-01-01``) of the rows' timestamps. Every writer appends
+only to its own segments, so concurrent simulators never interleave rows. When a writer
+moves on to a later bucket (or closes), its segment is compressed (gzip or zstd), recorded
+in ``<root>/<table>/manifest.jsonl`` with its time range, and the raw file removed.
+Manifest lines are appended with a single O_APPEND write, so writers need no lock.
+
+Tables without a timestamp (netzero_alignment) use the bucket ``static``.
+"""
+
+import gzip
+import json
+import os
+import shutil
+import socket
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .models import RecordBatch, iso_timestamps
+from .storage import CsvSink, ensure_dir
+
+ROTATIONS = {"hourly": "h", "daily": "D"}
+COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+MANIFEST = "manifest.jsonl"
+STATIC_BUCKET = "static"
+
+
+def _zstd():
+	try:
+		import zstandard
+	except ImportError as e:
+		raise RuntimeError("zstd segments need zstandard (pip install zstandard)") from e
+	return zstandard
+
+
+def default_writer_id() -> str:
+	return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def bucket_bounds(bucket: str, rotation: str):
+	"""[start, end) of a bucket as datetime64, or (None, None) for the static bucket."""
+	if bucket == STATIC_BUCKET:
+		return None, None
+	unit = ROTATIONS[rotation] if rotation else ("h" if "T" in bucket else "D")
+	start = np.datetime64(bucket, unit)
+	return start, start + np.timedelta64(1, unit)
+
+
+@dataclass
+class _Segment:
+	sink: CsvSink
+	path: str
+	bucket: str
+	rows: int = 0
+	min_ts: Optional[np.datetime64] = None
+	max_ts: Optional[np.datetime64] = None
+
+
+class SegmentedCsvSink:
+	"""CSV writer for one table that rotates to a new segment per time bucket and compresses closed ones."""
+
+	def __init__(self, root: str, table: str, rotation: str = "daily", compression: str = "gzip", writer_id: Optional[str] = None, flush_rows: int = 1000, flush_seconds: float = 5.0):
+		if rotation not in ROTATIONS:
+			raise ValueError(f"rotation must be one of {tuple(ROTATIONS)}, got {rotation!r}")
+		if compression not in COMPRESSIONS:
+			raise ValueError(f"compression must be one of {tuple(COMPRESSIONS)}, got {compression!r}")
+		if compression == "zstd":
+			_zstd()
+		self.root = root
+		self.table = table
+		self.rotation = rotation
+		self.compression = compression
+		self.writer_id = writer_id or default_writer_id()
+		self.flush_rows = flush_rows
+		self.flush_seconds = flush_seconds
+		self._open: Dict[str, _Segment] = {}
+		self._seq = 0
+		self.segments_closed = 0
+
+	def _segment(self, bucket: str) -> _Segment:
+		seg = self._open.get(bucket)
+		if seg is None:
+			directory = os.path.join(self.root, self.table, bucket)
+			ensure_dir(directory)
+			path = os.path.join(directory, f"{self.writer_id}-{self._seq:04d}.csv")
+			self._seq += 1
+			seg = self._open[bucket] = _Segment(CsvSink(path, flush_rows=self.flush_rows, flush_seconds=self.flush_seconds), path, bucket)
+		return seg
+
+	def _append(self, bucket: str, batch: RecordBatch) -> None:
+		seg = self._segment(bucket)
+		seg.sink.write_batch(batch)
+		seg.rows += len(batch)
+		if "timestamp" in batch.columns:
+			ts = batch["timestamp"]
+			lo, hi = ts.min(), ts.max()
+			seg.min_ts = lo if seg.min_ts is None else min(seg.min_ts, lo)
+			seg.max_ts = hi if seg.max_ts is None else max(seg.max_ts, hi)
+
+	def write_batch(self, batch: RecordBatch) -> int:
+		if not len(batch):
+			return 0
+		if "timestamp" not in batch.columns:
+			self._append(STATIC_BUCKET, batch)
+			return len(batch)
+		buckets = batch["timestamp"].astype(f"datetime64[{ROTATIONS[self.rotation]}]")
+		for value in np.unique(buckets):
+			self._append(str(value), batch.take(buckets == value))
+		# Rows have moved on: seal every segment of an earlier bucket
+		newest = str(buckets.max())
+		for bucket in [b for b in self._open if b != STATIC_BUCKET and b < newest]:
+			self._seal(bucket)
+		return len(batch)
+
+	def _seal(self, bucket: str) -> None:
+		seg = self._open.pop(bucket)
+		seg.sink.close()
+		if not seg.rows:
+			if os.path.isfile(seg.path):
+				os.remove(seg.path)
+			return
+		final = seg.path + COMPRESSIONS[self.compression]
+		if self.compression != "none":
+			tmp = f"{final}.tmp"
+			if self.compression == "gzip":
+				with open(seg.path, "rb") as src, gzip.open(tmp, "wb") as dst:
+					shutil.copyfileobj(src, dst)
+			else:
+				with open(seg.path, "rb") as src, open(tmp, "wb") as dst:
+					_zstd().ZstdCompressor().copy_stream(src, dst)
+			os.replace(tmp, final)
+		start, end = bucket_bounds(bucket, self.rotation)
+		entry = {
+			"path": os.path.relpath(final, os.path.join(self.root, self.table)),
+			"bucket": bucket,
+			"start": iso_timestamps([start])[0] if start is not None else None,
+			"end": iso_timestamps([end])[0] if end is not None else None,
+			"min_ts": iso_timestamps([seg.min_ts])[0] if seg.min_ts is not None else None,
+			"max_ts": iso_timestamps([seg.max_ts])[0] if seg.max_ts is not None else None,
+			"rows": seg.rows,
+			"bytes": os.path.getsize(final),
+			"writer": self.writer_id,
+		}
+		_append_manifest(os.path.join(self.root, self.table, MANIFEST), entry)
+		# Readers skip a raw segment once the manifest lists it, so removing it last is safe
+		if final != seg.path:
+			os.remove(seg.path)
+		self.segments_closed += 1
+
+	def flush(self) -> None:
+		for seg in self._open.values():
+			seg.sink.flush()
+
+	def close(self) -> None:
+		for bucket in list(self._open):
+			self._seal(bucket)
+
+	def __enter__(self) -> "SegmentedCsvSink":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
+
+
+def _append_manifest(path: str, entry: dict) -> None:
+	line = (json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8")
+	fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+	try:
+		os.write(fd, line)
+	finally:
+		os.close(fd)
+
+
+def read_manifest(root: str, table: str) -> List[dict]:
+	path = os.path.join(root, table, MANIFEST)
+	if not os.path.isfile(path):
+		return []
+	entries = []
+	with open(path, encoding="utf-8") as f:
+		for line in f:
+			# A line being appended by another writer is skipped until it is complete
+			if line.endswith("\n"):
+				entries.append(json.loads(line))
+	return entries
+
+
+def list_segments(root: str, table: str, start=None, end=None) -> List[dict]:
+	"""Segments that may hold rows in [start, end): sealed ones from the manifest, then active raw ones.
+
+	``start``/``end`` are datetime64 (or None). Each item has ``path`` (absolute) and ``sealed``.
+	"""
+	base = os.path.join(root, table)
+	start = np.datetime64(start, "us") if start is not None else None
+	end = np.datetime64(end, "us") if end is not None else None
+
+	def overlaps(lo, hi) -> bool:
+		# lo/hi are the first and last timestamps held (inclusive); None = unknown or static
+		if lo is None or hi is None:
+			return True
+		return (end is None or lo < end) and (start is None or hi >= start)
+
+	out, sealed = [], set()
+	for entry in read_manifest(root, table):
+		sealed.add(entry["path"])
+		lo = np.datetime64(entry["min_ts"][:-6], "us") if entry.get("min_ts") else None
+		hi = np.datetime64(entry["max_ts"][:-6], "us") if entry.get("max_ts") else None
+		if overlaps(lo, hi):
+			out.append({"path": os.path.join(base, entry["path"]), "sealed": True})
+	if os.path.isdir(base):
+		for bucket in sorted(os.listdir(base)):
+			directory = os.path.join(base, bucket)
+			if not os.path.isdir(directory):
+				continue
+			b_start, b_end = bucket_bounds(bucket, None)
+			if b_start is not None and not overlaps(b_start, b_end - np.timedelta64(1, "us")):
+				continue
+			for name in sorted(os.listdir(directory)):
+				rel = os.path.join(bucket, name)
+				if name.endswith(".csv") and not any(rel + ext in sealed for ext in COMPRESSIONS.values()):
+					out.append({"path": os.path.join(directory, name), "sealed": False})
+	return out
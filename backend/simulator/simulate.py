@@ -1,26 +1,68 @@
 from __future__ import annotations
 
 import argparse
+import logging
 import math
+import os
 import random
-from dataclasses import asdict
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields, replace
 from datetime import datetime, timedelta, timezone
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
 
 from .bias import diurnal_profile, weather_variation, planned_outage_factor, fossil_price_shock_factor, compute_co2_intensity, bounded_normal
+from .bias import (
+	bounded_normal_batch,
+	compute_co2_intensity_batch,
+	diurnal_profile_batch,
+	fossil_price_shock_factor_batch,
+	planned_outage_factor_batch,
+	weather_variation_batch,
+)
 from .config import SimulatorConfig, load_config_from_env
-from .models import Co2IntensityRecord, GenerationMixRecord, NetZeroAlignmentRecord
-from .storage import append_csv
+from .kernels import scale_mix, scale_step
+from .keyed_random import KeyedRandom
+from .memmap_store import MemmapSink
+from .models import DEFAULT_REGION_ID, Co2IntensityRecord, GenerationMixRecord, NetZeroAlignmentRecord, RecordBatch
+from .pipeline import build_pipeline
+from .processes import WeatherOutageProcess
+from .regions import capacity_arrays, load_regions
+from .segments import SegmentedCsvSink, default_writer_id
+from .sqlite_store import SqliteSink, SqliteStore
+from .storage import CsvSink, ParquetSink, append_csv_batch, migrate_csv_header
 from .supabase_client import SupabaseClient
 
 
-def _now_tz(tz_name: str) -> datetime:
+# Backfill: steps generated per task (30 days of 15-minute steps) and rows per Supabase POST
+BACKFILL_CHUNK_STEPS = 2880
+SUPABASE_CHUNK_ROWS = 1000
+STEP_CONFLICT_KEY = "region_id,timestamp"
+OUTPUT_TABLES = ("co2_intensity", "generation_mix", "netzero_alignment")
+OUTPUT_RECORDS = {"co2_intensity": Co2IntensityRecord, "generation_mix": GenerationMixRecord, "netzero_alignment": NetZeroAlignmentRecord}
+
+logger = logging.getLogger(__name__)
+
+
+def _get_tz(tz_name: str):
 	try:
 		import zoneinfo  # Python 3.9+
-		tz = zoneinfo.ZoneInfo(key=tz_name)
+		return zoneinfo.ZoneInfo(key=tz_name)
 	except Exception:
-		tz = timezone.utc
-	return datetime.now(tz)
+		return timezone.utc
+
+
+def _now_tz(tz_name: str) -> datetime:
+	return datetime.now(_get_tz(tz_name))
+
+
+def _parse_time(value: str, tz_name: str) -> datetime:
+	ts = datetime.fromisoformat(value)
+	if ts.tzinfo is None:
+		ts = ts.replace(tzinfo=_get_tz(tz_name))
+	return ts
 
 
 def _seed_random(seed: int | None) -> None:
@@ -51,16 +93,7 @@ def simulate_generation_mix(ts: datetime, base_total_mw: float = 7000.0) -> Gene
 	fossil = max(0.0, base_fossil * price_shock)
 
 	# Adjust total to reflect demand
-	raw_total = hydro + wind + solar + nuclear + fossil
-	scale = (base_total_mw * load_factor) / raw_total if raw_total > 0 else 1.0
-	hydro *= scale
-	wind *= scale
-	solar *= scale
-	nuclear *= scale
-	fossil *= scale
-	total = hydro + wind + solar + nuclear + fossil
-	renewables = hydro + wind + solar
-	renew_pct = 100.0 * renewables / total if total > 0 else 0.0
+	hydro, wind, solar, nuclear, fossil, total, renew_pct = scale_step(hydro, wind, solar, nuclear, fossil, base_total_mw * load_factor)
 
 	return GenerationMixRecord(
 		id=None,
@@ -90,119 +123,553 @@ def simulate_netzero_alignment(year: int) -> NetZeroAlignmentRecord:
 	return NetZeroAlignmentRecord(year=year, actual_emissions_mt=round(actual, 1), target_emissions_mt=float(target), alignment_pct=round(alignment, 0))
 
 
-def to_row_dicts(records) -> List[dict]:
-	return [asdict(r) for r in records]
+def make_rng(seed: int | None = None) -> np.random.Generator:
+	return np.random.default_rng(seed)
+
+
+def _timestamp_arrays(timestamps) -> Tuple[np.ndarray, np.ndarray]:
+	"""Return (datetime64[ns] UTC, hour of day) for a DatetimeIndex, datetime64 or epoch-seconds array.
+
+	The hour is taken in the index's own timezone when it has one, matching ``ts.hour`` in the scalar path.
+	"""
+	if hasattr(timestamps, "asi8"):
+		# pandas DatetimeIndex; asi8 is in the index's own resolution
+		ts = np.asarray(timestamps.as_unit("ns").asi8).view("datetime64[ns]")
+		return ts, np.asarray(timestamps.hour, dtype=np.int64)
+	arr = np.asarray(timestamps)
+	if np.issubdtype(arr.dtype, np.datetime64):
+		ts = arr.astype("datetime64[ns]")
+	elif np.issubdtype(arr.dtype, np.integer):
+		ts = arr.astype("datetime64[s]").astype("datetime64[ns]")
+	else:
+		ts = np.round(arr.astype(np.float64) * 1e6).astype(np.int64).astype("datetime64[us]").astype("datetime64[ns]")
+	hour = (ts.astype("datetime64[h]").astype(np.int64) % 24)
+	return ts, hour
+
+
+def _generation_mix_columns(hour: np.ndarray, rng: np.random.Generator, base_total_mw=7000.0, hydro_mw=950.0, wind_mw=1800.0, solar_mw=150.0, nuclear_mw=2700.0, fossil_mw=1600.0, weather_scale=1.0, factors: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+	"""Vectorized body of simulate_generation_mix.
+
+	Capacities may be scalars or arrays (e.g. one row per region); every draw has the broadcast
+	shape of ``hour`` and the capacities. The defaults are the original single grid.
+	``factors`` (from WeatherOutageProcess.advance) replaces the independent weather, outage
+	and price-shock draws.
+	"""
+	shape = np.broadcast_shapes(np.shape(hour), np.shape(base_total_mw), np.shape(hydro_mw), np.shape(wind_mw), np.shape(solar_mw), np.shape(nuclear_mw), np.shape(fossil_mw), np.shape(weather_scale))
+	hour = np.broadcast_to(hour, shape)
+	load_factor = diurnal_profile_batch(hour, 0.85, 1.15)
+	if factors is None:
+		wind_f, solar_f, hydro_f = weather_variation_batch(rng, shape, scale=weather_scale)
+		planned_factor = planned_outage_factor_batch(rng, shape)
+		price_shock = fossil_price_shock_factor_batch(rng, shape)
+	else:
+		wind_f, solar_f, hydro_f = factors["wind_factor"], factors["solar_factor"], factors["hydro_factor"]
+		planned_factor, price_shock = factors["outage_factor"], factors["price_shock_factor"]
+
+	# Night-time solar is 1/15 of the daytime baseline and fossil never drops below 75% of its baseline (10 / 150 and 1200 / 1600 MW on the default grid)
+	base_hydro = hydro_mw * bounded_normal_batch(rng, 1.0, 0.5, 0.2, 2.0, shape)
+	base_wind = wind_mw * bounded_normal_batch(rng, 1.0, 0.8, 0.1, 3.0, shape)
+	base_solar = np.where((hour >= 8) & (hour <= 18), solar_mw, solar_mw / 15.0) * bounded_normal_batch(rng, 1.0, 1.0, 0.05, 4.0, shape)
+	base_nuclear = nuclear_mw * bounded_normal_batch(rng, 1.0, 0.3, 0.5, 1.5, shape)
+	base_fossil = np.maximum(0.75 * fossil_mw, fossil_mw * load_factor) * bounded_normal_batch(rng, 1.0, 0.5, 0.3, 2.0, shape)
+
+	hydro = np.maximum(0.0, base_hydro * hydro_f)
+	wind = np.maximum(0.0, base_wind * wind_f)
+	solar = np.maximum(0.0, base_solar * solar_f)
+	nuclear = np.maximum(0.0, base_nuclear * planned_factor)
+	fossil = np.maximum(0.0, base_fossil * price_shock)
+
+	hydro, wind, solar, nuclear, fossil, total, renew_pct = scale_mix(hydro, wind, solar, nuclear, fossil, base_total_mw * load_factor)
+
+	return {
+		"hydro_mw": np.round(hydro, 1),
+		"wind_mw": np.round(wind, 1),
+		"solar_mw": np.round(solar, 1),
+		"nuclear_mw": np.round(nuclear, 1),
+		"fossil_mw": np.round(fossil, 1),
+		"total_mw": np.round(total, 1),
+		"renewable_share_pct": np.round(renew_pct, 1),
+	}
+
+
+def simulate_generation_mix_batch(timestamps, base_total_mw: float = 7000.0, rng: Optional[np.random.Generator] = None, factors: Optional[Dict[str, np.ndarray]] = None) -> RecordBatch:
+	"""Generation mix for every timestamp at once, as a columnar batch of GenerationMixRecord."""
+	rng = rng if rng is not None else make_rng()
+	ts, hour = _timestamp_arrays(timestamps)
+	return RecordBatch(GenerationMixRecord, {"timestamp": ts, **_generation_mix_columns(hour, rng, base_total_mw, factors=factors)})
+
+
+def simulate_co2_intensity_batch(renewable_share_pct: np.ndarray, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+	rng = rng if rng is not None else make_rng()
+	return np.round(compute_co2_intensity_batch(rng, renewable_share_pct, base_range=(100, 300)), 1)
+
+
+def simulate_batch(timestamps, base_total_mw: float = 7000.0, rng: Optional[np.random.Generator] = None, factors: Optional[Dict[str, np.ndarray]] = None) -> Tuple[RecordBatch, RecordBatch]:
+	"""Vectorized run of simulate_generation_mix + simulate_co2_intensity over many timestamps.
+
+	``timestamps`` may be a pandas DatetimeIndex, a datetime64 array or epoch seconds.
+	Returns (co2 batch, generation mix batch).
+	"""
+	rng = rng if rng is not None else make_rng()
+	gen = simulate_generation_mix_batch(timestamps, base_total_mw=base_total_mw, rng=rng, factors=factors)
+	co2 = RecordBatch(Co2IntensityRecord, {
+		"timestamp": gen["timestamp"],
+		"co2_intensity_g_per_kwh": simulate_co2_intensity_batch(gen["renewable_share_pct"], rng=rng),
+	})
+	return co2, gen
+
+
+def simulate_keyed(timestamps, seed: int = 0, region: str = DEFAULT_REGION_ID, base_total_mw: float = 7000.0) -> Tuple[RecordBatch, RecordBatch]:
+	"""Like simulate_batch, but every step's draws are a function of (seed, region, timestamp) only.
+
+	Any timestamp or sub-range regenerates to the same values in O(1), in any process.
+	"""
+	ts, _ = _timestamp_arrays(timestamps)
+	epochs = ts.astype("datetime64[s]").astype(np.int64)
+	return simulate_batch(timestamps, base_total_mw=base_total_mw, rng=KeyedRandom(seed, epochs, region=region))
+
+
+def _keyed_seed(cfg: SimulatorConfig) -> int:
+	return cfg.random_seed if cfg.random_seed is not None else 0
+
+
+def _simulate_region_grid(regions, timestamps, seed: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+	"""(regions x timestamps) arrays for one shard of regions; draws keyed by (seed, region, timestamp)."""
+	ts, hour = _timestamp_arrays(timestamps)
+	epochs = ts.astype("datetime64[s]").astype(np.int64)
+	rng = KeyedRandom(seed, epochs, region=[r.region_id for r in regions])
+	gen = _generation_mix_columns(hour[None, :], rng, **capacity_arrays(regions))
+	gen["co2_intensity_g_per_kwh"] = simulate_co2_intensity_batch(gen["renewable_share_pct"], rng=rng)
+	return ts, gen
+
+
+def _region_shard(task):
+	"""Process-pool entry point for one shard of regions."""
+	regions, timestamps, seed = task
+	return _simulate_region_grid(regions, timestamps, seed)[1]
 
 
-def write_outputs(cfg: SimulatorConfig, sb: SupabaseClient, co2_rows, gen_rows, nz_rows) -> None:
-	if cfg.output_mode in ("csv", "both"):
-		append_csv(f"{cfg.csv_output_dir}/co2_intensity.csv", co2_rows)
-		append_csv(f"{cfg.csv_output_dir}/generation_mix.csv", gen_rows)
-		append_csv(f"{cfg.csv_output_dir}/netzero_alignment.csv", nz_rows)
-	if cfg.output_mode in ("supabase", "both") and sb.enabled():
-		sb.insert_rows(cfg.table_co2_intensity, co2_rows)
-		sb.insert_rows(cfg.table_generation_mix, gen_rows)
+def simulate_regions(regions, timestamps, seed: int = 0, pool: Optional[ProcessPoolExecutor] = None, shards: int = 1) -> Tuple[RecordBatch, RecordBatch]:
+	"""Simulate every region over ``timestamps``, optionally sharding regions across a process pool.
+
+	Draws are keyed by (seed, region, timestamp), so the result does not depend on how regions
+	are sharded. Columns are flattened time-major: all regions for the first timestamp, then the next.
+	Returns (co2 batch, generation mix batch), both with a ``region_id`` column.
+	"""
+	regions = list(regions)
+	ts, _ = _timestamp_arrays(timestamps)
+	if pool is not None and shards > 1 and len(regions) > 1:
+		bounds = np.linspace(0, len(regions), min(shards, len(regions)) + 1).astype(int)
+		tasks = [(regions[a:b], ts, seed) for a, b in zip(bounds[:-1], bounds[1:])]
+		parts = list(pool.map(_region_shard, tasks))
+		grid = {k: np.concatenate([p[k] for p in parts], axis=0) for k in parts[0]}
+	else:
+		grid = _simulate_region_grid(regions, timestamps, seed)[1]
+	n_regions, n_steps = len(regions), len(ts)
+	flat = {k: v.T.ravel() for k, v in grid.items()}
+	timestamp = np.repeat(ts, n_regions)
+	region_id = np.tile(np.array([r.region_id for r in regions], dtype=object), n_steps)
+	co2 = RecordBatch(Co2IntensityRecord, {"timestamp": timestamp, "co2_intensity_g_per_kwh": flat.pop("co2_intensity_g_per_kwh"), "region_id": region_id})
+	gen = RecordBatch(GenerationMixRecord, {"timestamp": timestamp, **flat, "region_id": region_id})
+	return co2, gen
+
+
+def open_sinks(cfg: SimulatorConfig) -> Dict[str, Dict[str, object]]:
+	"""Long-lived sinks per configured local output ("csv", "segments", "parquet", "sqlite", "memmap") and table, for runs that write many steps."""
+	outputs = cfg.outputs()
+	sinks: Dict[str, Dict[str, object]] = {}
+	if "csv" in outputs:
+		sinks["csv"] = {name: CsvSink(f"{cfg.csv_output_dir}/{name}.csv", flush_rows=cfg.csv_flush_rows, flush_seconds=cfg.csv_flush_seconds, fsync=cfg.csv_fsync, names=[f.name for f in fields(OUTPUT_RECORDS[name])]) for name in OUTPUT_TABLES}
+	if "segments" in outputs:
+		# One writer id per process: its segments never collide with other simulators'
+		writer_id = default_writer_id()
+		sinks["segments"] = {
+			name: SegmentedCsvSink(cfg.segment_output_dir, name, rotation=cfg.segment_rotation, compression=cfg.segment_compression, writer_id=writer_id, flush_rows=cfg.csv_flush_rows, flush_seconds=cfg.csv_flush_seconds)
+			for name in OUTPUT_TABLES
+		}
+	if "parquet" in outputs:
+		sinks["parquet"] = {name: ParquetSink(cfg.parquet_output_dir, name, flush_rows=cfg.parquet_flush_rows, flush_seconds=cfg.parquet_flush_seconds) for name in OUTPUT_TABLES}
+	if "sqlite" in outputs:
+		store = SqliteStore(cfg.sqlite_path)
+		sinks["sqlite"] = {name: SqliteSink(store, name) for name in OUTPUT_TABLES}
+	if "memmap" in outputs:
+		sinks["memmap"] = {name: MemmapSink(cfg.memmap_output_dir, name, float_dtype=cfg.memmap_float_dtype) for name in OUTPUT_TABLES}
+	return sinks
+
+
+def close_sinks(sinks: Optional[Dict[str, Dict[str, object]]]) -> None:
+	for tables in (sinks or {}).values():
+		for sink in tables.values():
+			sink.close()
+
+
+def write_tables(tables: Dict[str, object], co2: RecordBatch, gen: RecordBatch, nz: RecordBatch) -> None:
+	"""Write one step's batches to a {table name: sink} mapping."""
+	tables["co2_intensity"].write_batch(co2)
+	tables["generation_mix"].write_batch(gen)
+	tables["netzero_alignment"].write_batch(nz)
+
+
+def write_csv_batches(cfg: SimulatorConfig, co2: RecordBatch, gen: RecordBatch, nz: RecordBatch) -> None:
+	append_csv_batch(f"{cfg.csv_output_dir}/co2_intensity.csv", co2)
+	append_csv_batch(f"{cfg.csv_output_dir}/generation_mix.csv", gen)
+	append_csv_batch(f"{cfg.csv_output_dir}/netzero_alignment.csv", nz)
+
+
+def write_segment_batches(cfg: SimulatorConfig, co2: RecordBatch, gen: RecordBatch, nz: RecordBatch) -> None:
+	"""One-shot write: one sealed (compressed) segment per table and bucket."""
+	tables = open_sinks(replace(cfg, output_mode="segments"))["segments"]
+	write_tables(tables, co2, gen, nz)
+	close_sinks({"segments": tables})
+
+
+def write_parquet_batches(cfg: SimulatorConfig, co2: RecordBatch, gen: RecordBatch, nz: RecordBatch) -> None:
+	"""One-shot Parquet write (one part file per table and day)."""
+	tables = {name: ParquetSink(cfg.parquet_output_dir, name) for name in OUTPUT_TABLES}
+	write_tables(tables, co2, gen, nz)
+	close_sinks({"parquet": tables})
+
+
+def write_sqlite_batches(cfg: SimulatorConfig, co2: RecordBatch, gen: RecordBatch, nz: RecordBatch) -> None:
+	"""One-shot SQLite write (one transaction per table)."""
+	store = SqliteStore(cfg.sqlite_path)
+	try:
+		write_tables({name: SqliteSink(store, name) for name in OUTPUT_TABLES}, co2, gen, nz)
+	finally:
+		store.close()
+
+
+def write_memmap_batches(cfg: SimulatorConfig, co2: RecordBatch, gen: RecordBatch, nz: RecordBatch) -> None:
+	"""One-shot append to the binary column files (netzero_alignment is not stored there)."""
+	tables = {name: MemmapSink(cfg.memmap_output_dir, name, float_dtype=cfg.memmap_float_dtype) for name in OUTPUT_TABLES}
+	write_tables(tables, co2, gen, nz)
+	close_sinks({"memmap": tables})
+
+
+def snap_batch(batch: RecordBatch, step_minutes: int) -> RecordBatch:
+	"""``batch`` with its timestamps rounded to the nearest step, so every step has one upsert key."""
+	ts = batch.columns.get("timestamp")
+	if ts is None or np.ndim(ts) == 0 or not len(batch):
+		return batch
+	step = step_minutes * 60 * 1_000_000
+	us = ts.astype("datetime64[us]").astype(np.int64)
+	snapped = ((us + step // 2) // step * step).astype("datetime64[us]")
+	return RecordBatch(batch.record_type, {**batch.columns, "timestamp": snapped})
+
+
+def supabase_writes(cfg: SimulatorConfig, co2: RecordBatch, gen: RecordBatch, nz: RecordBatch) -> List[Tuple[str, RecordBatch, Optional[str], Optional[str], Optional[int]]]:
+	"""(table, batch, on_conflict, resolution, chunk_size) for each table; the writes are independent."""
+	if cfg.supabase_spool_dir or cfg.supabase_step_upserts:
+		# Upserts on the unique keys of database/sql/07_unique_steps.sql: a retried batch rewrites its rows
+		steps = [(t, snap_batch(b, cfg.step_minutes), STEP_CONFLICT_KEY, "merge-duplicates") for t, b in ((cfg.table_co2_intensity, co2), (cfg.table_generation_mix, gen))]
+	else:
+		# Plain inserts: works without the unique indexes, but a re-sent batch is duplicated
+		steps = [(cfg.table_co2_intensity, co2, None, None), (cfg.table_generation_mix, gen, None, None)]
+	return [
+		*((table, batch, on_conflict, resolution, SUPABASE_CHUNK_ROWS) for table, batch, on_conflict, resolution in steps),
 		# Upsert yearly alignment to avoid duplicate key conflicts
-		sb.insert_rows(cfg.table_netzero_alignment, nz_rows, on_conflict="year", resolution="ignore-duplicates")
+		(cfg.table_netzero_alignment, nz, "year", "ignore-duplicates", None),
+	]
+
+
+def write_supabase_batches(cfg: SimulatorConfig, sb: SupabaseClient, co2: RecordBatch, gen: RecordBatch, nz: RecordBatch) -> None:
+	for table, batch, on_conflict, resolution, chunk_size in supabase_writes(cfg, co2, gen, nz):
+		sb.insert_batch(table, batch, on_conflict=on_conflict, resolution=resolution, chunk_size=chunk_size)
+
 
+def write_output_batches(cfg: SimulatorConfig, sb: SupabaseClient, co2: RecordBatch, gen: RecordBatch, nz: RecordBatch, sinks: Optional[Dict[str, Dict[str, object]]] = None) -> None:
+	"""Write one step's batches to every configured output; no per-row dicts on the way to any output.
 
-def run_once(cfg: SimulatorConfig, anchor: datetime | None = None) -> datetime:
+	Local outputs go through ``sinks`` (from open_sinks) when given, else are written one-shot.
+	"""
+	outputs = cfg.outputs()
+	sinks = sinks or {}
+	if "csv" in outputs:
+		if "csv" in sinks:
+			write_tables(sinks["csv"], co2, gen, nz)
+		else:
+			write_csv_batches(cfg, co2, gen, nz)
+	if "segments" in outputs:
+		if "segments" in sinks:
+			write_tables(sinks["segments"], co2, gen, nz)
+		else:
+			write_segment_batches(cfg, co2, gen, nz)
+	if "parquet" in outputs:
+		if "parquet" in sinks:
+			write_tables(sinks["parquet"], co2, gen, nz)
+		else:
+			write_parquet_batches(cfg, co2, gen, nz)
+	if "sqlite" in outputs:
+		if "sqlite" in sinks:
+			write_tables(sinks["sqlite"], co2, gen, nz)
+		else:
+			write_sqlite_batches(cfg, co2, gen, nz)
+	if "memmap" in outputs:
+		if "memmap" in sinks:
+			write_tables(sinks["memmap"], co2, gen, nz)
+		else:
+			write_memmap_batches(cfg, co2, gen, nz)
+	if "supabase" in outputs and sb.enabled():
+		write_supabase_batches(cfg, sb, co2, gen, nz)
+
+
+def _regions(cfg: SimulatorConfig):
+	return load_regions(cfg.regions) if cfg.regions else None
+
+
+def current_anchor(cfg: SimulatorConfig) -> datetime:
+	_now = _now_tz(cfg.timezone).replace(microsecond=0)
+	# Compute a default anchor rounded down to step_minutes (whole seconds, so repeated runs share the slot)
+	step_seconds = int(cfg.step_minutes * 60)
+	return _now - timedelta(seconds=int(_now.timestamp()) % step_seconds)
+
+
+def load_process(cfg: SimulatorConfig, rng: Optional[np.random.Generator] = None) -> Optional[WeatherOutageProcess]:
+	"""The ar1 weather/outage process to continue from (saved state, else a stationary start); None in independent mode."""
+	if cfg.weather_model != "ar1":
+		return None
+	if _regions(cfg) or cfg.rng_mode == "keyed":
+		raise ValueError("weather_model=ar1 carries state from step to step; it supports the single sequential grid only")
+	process = WeatherOutageProcess.load(cfg.state_file, step_minutes=cfg.step_minutes)
+	if process is None:
+		return WeatherOutageProcess.stationary(rng if rng is not None else make_rng(cfg.random_seed), step_minutes=cfg.step_minutes)
+	logger.info("Resuming weather/outage state from %s (last step %s)", cfg.state_file, process.state.timestamp)
+	return process
+
+
+def _step_rng(cfg: SimulatorConfig, anchor: datetime) -> np.random.Generator:
+	"""Per-step generator: reproducible for a seed without any state carried between steps."""
+	if cfg.random_seed is None:
+		return make_rng()
+	return np.random.default_rng([cfg.random_seed, int(anchor.timestamp())])
+
+
+def generate_step(cfg: SimulatorConfig, anchor: datetime, pool: Optional[ProcessPoolExecutor] = None, process: Optional[WeatherOutageProcess] = None):
+	"""Simulate one step for every configured region. Returns (co2, generation mix, netzero) batches.
+
+	With a region catalogue configured, regions are sharded over ``pool`` when given.
+	With an ar1 ``process`` its state is advanced by one step.
+	"""
+	import pandas as pd
+	regions = _regions(cfg)
+	if process is not None:
+		rng = _step_rng(cfg, anchor)
+		co2, gen = simulate_batch(pd.DatetimeIndex([anchor]), rng=rng, factors=process.advance(rng, 1))
+		process.state.timestamp = anchor.isoformat()
+	elif regions:
+		co2, gen = simulate_regions(regions, pd.DatetimeIndex([anchor]), seed=_keyed_seed(cfg), pool=pool, shards=cfg.workers)
+	elif cfg.rng_mode == "keyed":
+		co2, gen = simulate_keyed(pd.DatetimeIndex([anchor]), seed=_keyed_seed(cfg))
+	else:
+		gen_record = simulate_generation_mix(anchor)
+		gen = RecordBatch.from_records([gen_record])
+		co2 = RecordBatch.from_records([simulate_co2_intensity(anchor, gen_record)])
+	# Yearly record updated once per step for simplicity
+	nz = RecordBatch.from_records([simulate_netzero_alignment(anchor.year)])
+	return co2, gen, nz
+
+
+def run_once(cfg: SimulatorConfig, anchor: datetime | None = None, pool: Optional[ProcessPoolExecutor] = None) -> datetime:
 	"""Generate one step. If anchor not provided, compute from current time.
 
+	All regions are written as one batch per table.
 	Returns the timestamp used so caller can advance consistently.
 	"""
 	if anchor is None:
-		_now = _now_tz(cfg.timezone)
-		# Compute a default anchor rounded to step_minutes
-		step_seconds = int(cfg.step_minutes * 60)
-		anchor = _now - timedelta(seconds=int(_now.timestamp()) % step_seconds)
-
-	gen = simulate_generation_mix(anchor)
-	co2 = simulate_co2_intensity(anchor, gen)
-	# Yearly record updated once per run for simplicity
-	nz = simulate_netzero_alignment(anchor.year)
-	co2_rows = to_row_dicts([co2])
-	gen_rows = to_row_dicts([gen])
-	nz_rows = to_row_dicts([nz])
-	sb = SupabaseClient(cfg.supabase_url, cfg.supabase_key)
-	write_outputs(cfg, sb, co2_rows, gen_rows, nz_rows)
+		anchor = current_anchor(cfg)
+	process = load_process(cfg)
+	co2, gen, nz = generate_step(cfg, anchor, pool=pool, process=process)
+	# Each output is written by its own worker, so one failing output does not skip the others
+	with build_pipeline(cfg, backpressure="block") as pipeline:
+		pipeline.submit(co2, gen, nz)
+	if process is not None:
+		process.save(cfg.state_file)
 	return anchor
 
 
 def run_continuous(cfg: SimulatorConfig) -> None:
+	"""Run until interrupted, one step per wall-clock interval (see runner.run_continuous_async)."""
+	import asyncio
+	from .runner import run_continuous_async
+	asyncio.run(run_continuous_async(cfg))
+
+
+def _backfill_chunk(task) -> Tuple[RecordBatch, RecordBatch]:
+	"""Process-pool entry point: generate one chunk of steps from its own seed.
+
+	With a keyed seed the chunk's values depend only on (seed, timestamp), not on chunking.
+	Multi-region chunks are always keyed, by (seed, region, timestamp).
+	"""
+	import pandas as pd
+	start_epoch, n_steps, step_seconds, tz_name, seed_seq, keyed_seed, regions, factors = task
+	epochs = start_epoch + step_seconds * np.arange(n_steps, dtype=np.int64)
+	timestamps = pd.to_datetime(epochs, unit="s", utc=True).tz_convert(tz_name)
+	if regions:
+		return simulate_regions(regions, timestamps, seed=keyed_seed)
+	if keyed_seed is not None:
+		return simulate_keyed(timestamps, seed=keyed_seed)
+	return simulate_batch(timestamps, rng=np.random.default_rng(seed_seq), factors=factors)
+
+
+def _ordered_imap(pool: ProcessPoolExecutor, fn, tasks, window: int):
+	"""Like pool.map, but keeps at most ``window`` tasks in flight so memory stays bounded."""
+	pending = deque()
+	for task in tasks:
+		pending.append(pool.submit(fn, task))
+		if len(pending) >= window:
+			yield pending.popleft().result()
+	while pending:
+		yield pending.popleft().result()
+
+
+def run_backfill(cfg: SimulatorConfig, start: datetime, end: datetime, workers: int = 1, chunk_steps: int = BACKFILL_CHUNK_STEPS) -> dict:
+	"""Generate every step in [start, end) as fast as the CPU allows and write it in chunks.
+
+	Each chunk draws from its own child of SeedSequence(cfg.random_seed), so a given seed and
+	chunk size produce identical output whatever the number of workers. With the ar1 weather
+	model the process paths for the whole range are generated up front and the final state is
+	saved for the next run.
+	"""
 	import time
-	# Initialize anchor at the rounded current step
-	step = timedelta(minutes=cfg.step_minutes)
-	anchor = run_once(cfg)
-	while True:
-		# Advance simulated time by step for each wall-clock tick
-		anchor = anchor + step
-		run_once(cfg, anchor=anchor)
-		time.sleep(cfg.wall_interval_seconds)
+	step_seconds = int(cfg.step_minutes * 60)
+	first = -(-int(start.timestamp()) // step_seconds) * step_seconds  # first step on or after start
+	n_steps = max(0, -(-(int(end.timestamp()) - first) // step_seconds))
+	regions = _regions(cfg)
+	if regions:
+		# Keep rows per chunk roughly constant however many regions there are
+		chunk_steps = max(1, chunk_steps // len(regions))
+	offsets = range(0, n_steps, chunk_steps)
+	seed_seq = np.random.SeedSequence(cfg.random_seed)
+	tz = _get_tz(cfg.timezone)
+	keyed_seed = _keyed_seed(cfg) if cfg.rng_mode == "keyed" or regions else None
+	children = seed_seq.spawn(len(offsets) + 1)
+	process_rng = np.random.default_rng(children[-1])
+	process = load_process(cfg, rng=process_rng)
+	factors = process.advance(process_rng, n_steps) if process is not None else None
+	tasks = [
+		(first + off * step_seconds, min(chunk_steps, n_steps - off), step_seconds, str(tz), child, keyed_seed, regions,
+			{k: v[off:off + chunk_steps] for k, v in factors.items()} if factors is not None else None)
+		for off, child in zip(offsets, children)
+	]
+	# One alignment record per year covered, not one per step
+	if n_steps:
+		last = first + (n_steps - 1) * step_seconds
+		years = range(datetime.fromtimestamp(first, tz).year, datetime.fromtimestamp(last, tz).year + 1)
+	else:
+		years = range(0)
+	nz = RecordBatch.from_records([simulate_netzero_alignment(y) for y in years], NetZeroAlignmentRecord)
+	no_nz = RecordBatch.empty(NetZeroAlignmentRecord)
+
+	# Chunks are written by one worker per output while the next ones are generated; a backfill never drops
+	pipeline = build_pipeline(cfg, backpressure="block", queue_size=2)
+	workers = workers or os.cpu_count() or 1
+	started = time.perf_counter()
+	try:
+		if workers > 1 and len(tasks) > 1:
+			with ProcessPoolExecutor(max_workers=workers) as pool:
+				for co2, gen in _ordered_imap(pool, _backfill_chunk, tasks, window=2 * workers):
+					pipeline.submit(co2, gen, no_nz)
+		else:
+			for task in tasks:
+				co2, gen = _backfill_chunk(task)
+				pipeline.submit(co2, gen, no_nz)
+		pipeline.submit(RecordBatch.empty(Co2IntensityRecord), RecordBatch.empty(GenerationMixRecord), nz)
+	finally:
+		sink_stats = pipeline.close()
+	if process is not None and n_steps:
+		process.state.timestamp = datetime.fromtimestamp(first + (n_steps - 1) * step_seconds, tz).isoformat()
+		process.save(cfg.state_file)
+	elapsed = time.perf_counter() - started
+
+	rows = 2 * n_steps * (len(regions) if regions else 1) + len(nz)
+	stats = {
+		"steps": n_steps,
+		"rows": rows,
+		"seconds": round(elapsed, 3),
+		"rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else float("inf"),
+		"seed_entropy": seed_seq.entropy,
+		"sinks": sink_stats,
+	}
+	print(f"Backfilled {n_steps} steps ({rows} rows) with {workers} worker(s) in {elapsed:.2f}s: {stats['rows_per_sec']:,.0f} rows/sec (seed entropy {seed_seq.entropy})")
+	return stats
 
 
 def main() -> None:
 	parser = argparse.ArgumentParser(description="Sustainability Intelligence data simulator")
-	parser.add_argument("mode", choices=["once", "continuous"], nargs="?", default="once")
+	parser.add_argument("mode", choices=["once", "continuous", "backfill", "replay", "compact", "retention", "migrate-csv"], nargs="?", default="once")
 	parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducibility")
-	parser.add_argument("--output", choices=["csv", "supabase", "both"], default=None, help="Override output mode")
+	parser.add_argument("--output", type=str, default=None, help="Override output mode: csv, segments, supabase, parquet, sqlite, memmap, both, or a comma-separated list")
 	parser.add_argument("--wall", type=int, default=None, help="Wall-clock interval seconds (e.g., 5)")
 	parser.add_argument("--step", type=int, default=None, help="Simulated step minutes (e.g., 15)")
+	parser.add_argument("--rng", choices=["sequential", "keyed"], default=None, help="Override RNG mode (keyed = values depend only on seed and timestamp)")
+	parser.add_argument("--weather", choices=["independent", "ar1"], default=None, help="Override weather/outage model (ar1 = persistent, resumable processes)")
+	parser.add_argument("--start", type=str, default=None, help="Backfill/replay start (ISO 8601, inclusive)")
+	parser.add_argument("--end", type=str, default=None, help="Backfill/replay end (ISO 8601, exclusive)")
+	parser.add_argument("--workers", type=int, default=None, help="Worker processes for backfill chunks and region shards (0 = all cores)")
+	parser.add_argument("--regions", type=str, default=None, help="Region catalogue CSV, or synthetic:N")
+	parser.add_argument("--chunk-steps", type=int, default=BACKFILL_CHUNK_STEPS, help="Backfill steps per chunk")
+	parser.add_argument("--source", choices=["csv", "supabase"], default="csv", help="Replay source")
+	parser.add_argument("--input-dir", type=str, default="data", help="Replay source / compact and migrate-csv target CSV directory")
+	parser.add_argument("--index", action="store_true", help="Compact: also write a sidecar time index (<file>.idx) per CSV")
+	parser.add_argument("--retain-days", type=int, default=None, help="Retention: days of raw rows to keep (default RETENTION_DAYS)")
+	parser.add_argument("--speed", type=float, default=1.0, help="Replay speed-up over real time (0 = as fast as possible)")
+	parser.add_argument("--shift-to-now", action="store_true", help="Replay with timestamps shifted to start at the current step")
 	args = parser.parse_args()
+	logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+	if args.mode == "backfill" and not (args.start and args.end):
+		parser.error("backfill requires --start and --end")
 
 	cfg = load_config_from_env()
+	overrides = {}
 	if args.seed is not None:
-		cfg = type(cfg)(
-			timezone=cfg.timezone,
-			interval_seconds=cfg.interval_seconds,
-			wall_interval_seconds=cfg.wall_interval_seconds,
-			step_minutes=cfg.step_minutes,
-			random_seed=args.seed,
-			output_mode=args.output or cfg.output_mode,
-			csv_output_dir=cfg.csv_output_dir,
-			supabase_url=cfg.supabase_url,
-			supabase_key=cfg.supabase_key,
-			table_co2_intensity=cfg.table_co2_intensity,
-			table_generation_mix=cfg.table_generation_mix,
-			table_netzero_alignment=cfg.table_netzero_alignment,
-		)
-	else:
-		if args.output:
-			cfg = type(cfg)(
-				timezone=cfg.timezone,
-				interval_seconds=cfg.interval_seconds,
-				wall_interval_seconds=cfg.wall_interval_seconds,
-				step_minutes=cfg.step_minutes,
-				random_seed=cfg.random_seed,
-				output_mode=args.output,
-				csv_output_dir=cfg.csv_output_dir,
-				supabase_url=cfg.supabase_url,
-				supabase_key=cfg.supabase_key,
-				table_co2_intensity=cfg.table_co2_intensity,
-				table_generation_mix=cfg.table_generation_mix,
-				table_netzero_alignment=cfg.table_netzero_alignment,
-			)
-
-	_seed_random(cfg.random_seed)
+		overrides["random_seed"] = args.seed
+	if args.output:
+		overrides["output_mode"] = args.output
 	# Allow overriding cadence from CLI
-	if args.wall is not None or args.step is not None:
-		cfg = type(cfg)(
-			timezone=cfg.timezone,
-			interval_seconds=cfg.interval_seconds,
-			wall_interval_seconds=args.wall if args.wall is not None else cfg.wall_interval_seconds,
-			step_minutes=args.step if args.step is not None else cfg.step_minutes,
-			random_seed=cfg.random_seed,
-			output_mode=cfg.output_mode,
-			csv_output_dir=cfg.csv_output_dir,
-			supabase_url=cfg.supabase_url,
-			supabase_key=cfg.supabase_key,
-			table_co2_intensity=cfg.table_co2_intensity,
-			table_generation_mix=cfg.table_generation_mix,
-			table_netzero_alignment=cfg.table_netzero_alignment,
-		)
+	if args.wall is not None:
+		overrides["wall_interval_seconds"] = args.wall
+	if args.step is not None:
+		overrides["step_minutes"] = args.step
+	if args.rng:
+		overrides["rng_mode"] = args.rng
+	if args.weather:
+		overrides["weather_model"] = args.weather
+	if args.workers is not None:
+		overrides["workers"] = args.workers or os.cpu_count() or 1
+	if args.regions:
+		overrides["regions"] = args.regions
+	cfg = replace(cfg, **overrides)
+	if cfg.weather_model == "ar1" and (cfg.regions or cfg.rng_mode == "keyed"):
+		parser.error("--weather ar1 supports the single grid with the sequential RNG only")
+	if args.mode == "replay" and args.source == "csv" and "csv" in cfg.outputs() and os.path.abspath(args.input_dir) == os.path.abspath(cfg.csv_output_dir):
+		parser.error("replay would append to the CSVs it reads; use a different --input-dir or CSV_OUTPUT_DIR")
+	_seed_random(cfg.random_seed)
 
 	if args.mode == "continuous":
 		run_continuous(cfg)
+	elif args.mode == "backfill":
+		run_backfill(cfg, _parse_time(args.start, cfg.timezone), _parse_time(args.end, cfg.timezone), workers=cfg.workers, chunk_steps=args.chunk_steps)
+	elif args.mode == "replay":
+		from .replay import run_replay
+		start = _parse_time(args.start, cfg.timezone) if args.start else None
+		end = _parse_time(args.end, cfg.timezone) if args.end else None
+		try:
+			run_replay(cfg, source=args.source, input_dir=args.input_dir, speed=args.speed, shift_to_now=args.shift_to_now, start=start, end=end)
+		except ValueError as e:
+			parser.error(str(e))
+	elif args.mode == "compact":
+		from .compact import compact_dir
+		for table, stats in compact_dir(args.input_dir, step_minutes=cfg.step_minutes, index=args.index).items():
+			print(f"{table}: {stats['rows_in']} -> {stats['rows_out']} rows")
+	elif args.mode == "migrate-csv":
+		# CSVs from before region_id was added are moved to the current columns, as region 'default'
+		for table, record_type in OUTPUT_RECORDS.items():
+			rows = migrate_csv_header(os.path.join(args.input_dir, f"{table}.csv"), [f.name for f in fields(record_type)], {"region_id": DEFAULT_REGION_ID})
+			print(f"{table}: {rows} rows migrated")
+	elif args.mode == "retention":
+		from .retention import apply_retention
+		for output, stats in apply_retention(cfg, retain_days=args.retain_days).items():
+			print(f"{output}: {stats}")
 	else:
 		run_once(cfg)
 
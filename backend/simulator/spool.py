@@ -0,0 +1,269 @@
+"""Durable local spool in front of Supabase.
+
+Every batch is appended (and fsynced) to a local log before anything is sent, so a step is
+never lost when Supabase is slow or down. A background flusher replays the log in large
+batches, oldest first, backing off exponentially while requests fail. Batches are sent as
+upserts keyed on the table's unique columns (``region_id,timestamp`` or ``year``, see
+database/sql/07_unique_steps.sql), so re-sending after a crash or a partial failure
+updates the same rows instead of adding duplicates.
+
+Layout of the spool directory: ``log-NNNNNN.jsonl`` (one JSON line per batch),
+``cursor.json`` (file and byte offset of the first unsent line), ``dead.jsonl`` (batches
+Supabase rejected as invalid) and ``spool.lock`` (one process per spool).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .models import RecordBatch
+from .storage import ensure_dir
+
+try:
+	import fcntl
+except ImportError:  # Windows: no advisory locking
+	fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SPOOL_SEGMENT_BYTES = 64 * 1024 * 1024
+SPOOL_MAX_BATCH_ROWS = 5000
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+# Client errors that are worth retrying; any other 4xx means the batch itself is bad
+_RETRYABLE_STATUS = {408, 409, 425, 429}
+
+
+def _is_permanent(error: Exception) -> bool:
+	response = getattr(error, "response", None)
+	status = getattr(response, "status_code", None)
+	return status is not None and 400 <= status < 500 and status not in _RETRYABLE_STATUS
+
+
+def _dedup(rows: List[dict], on_conflict: Optional[str], keep_last: bool = True) -> List[dict]:
+	"""One row per conflict key (the last, or the first for ignore-duplicates): one upsert may
+	not touch the same row twice."""
+	if not on_conflict:
+		return rows
+	cols = on_conflict.split(",")
+	kept: Dict[tuple, dict] = {}
+	for r in rows:
+		key = tuple(r.get(c) for c in cols)
+		if keep_last or key not in kept:
+			kept[key] = r
+	return list(kept.values())
+
+
+class SupabaseSpool:
+	"""Append-first stand-in for SupabaseClient.insert_batch with a background flusher."""
+
+	def __init__(self, directory: str, client, max_batch_rows: int = SPOOL_MAX_BATCH_ROWS, segment_bytes: int = SPOOL_SEGMENT_BYTES, drain_seconds: float = 10.0, linger_rows: int = 0, linger_seconds: float = 0.0):
+		self.directory = directory
+		self.client = client
+		self.max_batch_rows = max_batch_rows
+		# Wait for this many new rows, or until the oldest has waited linger_seconds, before sending
+		self.linger_rows = linger_rows
+		self.linger_seconds = linger_seconds
+		self._unsent_rows = 0
+		self._unsent_since: Optional[float] = None
+		self.segment_bytes = segment_bytes
+		self.drain_seconds = drain_seconds
+		self.stats: Dict[str, int] = {"appended": 0, "sent_batches": 0, "sent_rows": 0, "failures": 0, "dead": 0}
+		ensure_dir(directory)
+		self._lock_file = open(os.path.join(directory, "spool.lock"), "w")
+		if fcntl is not None:
+			try:
+				fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+			except OSError:
+				self._lock_file.close()
+				raise RuntimeError(f"Spool {directory} is in use by another process; set SUPABASE_SPOOL_DIR per process")
+		self._cursor = self._load_cursor()
+		logs = self._logs()
+		self._active_name = logs[-1] if logs else self._log_name(1)
+		self._active = open(os.path.join(directory, self._active_name), "ab")
+		self._write_lock = threading.Lock()
+		self._wake = threading.Event()
+		self._stopping = False
+		self._thread = threading.Thread(target=self._run, name="supabase-spool", daemon=True)
+		self._thread.start()
+		if self.pending_bytes():
+			logger.info("Spool %s has %d unsent bytes from an earlier run; replaying", directory, self.pending_bytes())
+			self._unsent_since = 0.0
+			self._wake.set()
+
+	# --- Writing -----------------------------------------------------------
+
+	def enabled(self) -> bool:
+		return self.client.enabled()
+
+	def insert_batch(self, table: str, batch: RecordBatch, on_conflict: Optional[str] = None, resolution: Optional[str] = None, chunk_size: Optional[int] = None) -> None:
+		"""Persist a batch for sending (same signature as SupabaseClient.insert_batch)."""
+		if not len(batch):
+			return
+		head = json.dumps({"table": table, "on_conflict": on_conflict, "resolution": resolution})
+		line = f'{head[:-1]}, "rows": {batch.to_json()}}}\n'.encode("utf-8")
+		with self._write_lock:
+			self._active.write(line)
+			self._active.flush()
+			os.fsync(self._active.fileno())
+			if self._active.tell() >= self.segment_bytes:
+				self._rotate()
+			self.stats["appended"] += 1
+			self._unsent_rows += len(batch)
+			if self._unsent_since is None:
+				self._unsent_since = time.monotonic()
+		if self._unsent_rows >= self.linger_rows or self.linger_seconds <= 0:
+			self._wake.set()
+
+	def _rotate(self) -> None:
+		self._active.close()
+		self._active_name = self._log_name(int(self._active_name[4:10]) + 1)
+		self._active = open(os.path.join(self.directory, self._active_name), "ab")
+
+	# --- Log and cursor ----------------------------------------------------
+
+	@staticmethod
+	def _log_name(n: int) -> str:
+		return f"log-{n:06d}.jsonl"
+
+	def _logs(self) -> List[str]:
+		return sorted(n for n in os.listdir(self.directory) if n.startswith("log-") and n.endswith(".jsonl"))
+
+	def _load_cursor(self) -> Tuple[str, int]:
+		path = os.path.join(self.directory, "cursor.json")
+		if os.path.isfile(path):
+			with open(path, encoding="utf-8") as f:
+				data = json.load(f)
+			return data["file"], int(data["offset"])
+		logs = self._logs()
+		return (logs[0] if logs else self._log_name(1)), 0
+
+	def _save_cursor(self, name: str, offset: int) -> None:
+		path = os.path.join(self.directory, "cursor.json")
+		tmp = f"{path}.tmp"
+		with open(tmp, "w", encoding="utf-8") as f:
+			json.dump({"file": name, "offset": offset}, f)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp, path)
+		self._cursor = (name, offset)
+		# Logs before the cursor's file are fully sent
+		for old in self._logs():
+			if old < name:
+				os.remove(os.path.join(self.directory, old))
+
+	def _pending(self) -> Iterator[Tuple[str, int, dict]]:
+		"""Unsent entries as (file, offset after the line, entry), oldest first."""
+		name, offset = self._cursor
+		for log in self._logs():
+			if log < name:
+				continue
+			with open(os.path.join(self.directory, log), "rb") as f:
+				f.seek(offset if log == name else 0)
+				for line in iter(f.readline, b""):
+					if not line.endswith(b"\n"):
+						break  # still being written
+					yield log, f.tell(), json.loads(line)
+
+	def pending_bytes(self) -> int:
+		name, offset = self._cursor
+		total = 0
+		for log in self._logs():
+			if log >= name:
+				total += os.path.getsize(os.path.join(self.directory, log)) - (offset if log == name else 0)
+		return total
+
+	# --- Flushing ----------------------------------------------------------
+
+	def _next_round(self) -> Optional[Tuple[Dict[tuple, List[dict]], str, int]]:
+		"""Pending entries up to max_batch_rows rows, grouped per table/upsert mode in log order."""
+		groups: Dict[tuple, List[dict]] = {}
+		rows, end = 0, None
+		for log, offset, entry in self._pending():
+			if end is not None and rows + len(entry["rows"]) > self.max_batch_rows:
+				break
+			groups.setdefault((entry["table"], entry["on_conflict"], entry["resolution"]), []).extend(entry["rows"])
+			rows += len(entry["rows"])
+			end = (log, offset)
+		if end is None:
+			return None
+		return groups, end[0], end[1]
+
+	def flush_once(self) -> bool:
+		"""Send the next round (one request per table); returns False when the spool is empty.
+
+		Raises on a retryable failure; tables already sent in that round are sent again on the
+		next attempt, which the upserts make harmless.
+		"""
+		nxt = self._next_round()
+		if nxt is None:
+			return False
+		groups, log, offset = nxt
+		for (table, on_conflict, resolution), rows in groups.items():
+			meta = {"table": table, "on_conflict": on_conflict, "resolution": resolution}
+			rows = _dedup(rows, on_conflict, keep_last=resolution != "ignore-duplicates")
+			try:
+				self.client.insert_rows(table, rows, on_conflict=on_conflict, resolution=resolution)
+			except Exception as e:
+				if not _is_permanent(e):
+					raise
+				# Resending cannot succeed: park the rows so the rest of the spool keeps moving
+				with open(os.path.join(self.directory, "dead.jsonl"), "a", encoding="utf-8") as f:
+					f.write(json.dumps({**meta, "error": str(e), "rows": rows}) + "\n")
+				self.stats["dead"] += 1
+				logger.error("Supabase rejected %d %s rows; moved to dead.jsonl: %s", len(rows), table, e)
+			else:
+				self.stats["sent_batches"] += 1
+				self.stats["sent_rows"] += len(rows)
+		self._save_cursor(log, offset)
+		return True
+
+	def _run(self) -> None:
+		delay, retry_at = 0.0, 0.0
+		while True:
+			if delay:
+				timeout = max(0.0, retry_at - time.monotonic())
+			elif self._unsent_since is not None:
+				timeout = max(0.0, self._unsent_since + self.linger_seconds - time.monotonic())
+			else:
+				timeout = None
+			self._wake.wait(timeout=timeout)
+			self._wake.clear()
+			if self._stopping:
+				return
+			now = time.monotonic()
+			if now < retry_at:
+				continue  # new appends do not cut a backoff short
+			if self._unsent_since is None or (self._unsent_rows < self.linger_rows and now - self._unsent_since < self.linger_seconds):
+				continue
+			with self._write_lock:
+				self._unsent_rows, self._unsent_since = 0, None
+			try:
+				while self.flush_once() and not self._stopping:
+					pass
+				delay = 0.0
+			except Exception as e:
+				self.stats["failures"] += 1
+				with self._write_lock:
+					self._unsent_since = 0.0  # resend as soon as the backoff ends
+				delay = min(BACKOFF_MAX_SECONDS, max(BACKOFF_BASE_SECONDS, delay * 2))
+				retry_at = time.monotonic() + delay
+				logger.warning("Supabase flush failed (%s); %d bytes spooled, retrying in %.1fs", e, self.pending_bytes(), delay)
+
+	def close(self) -> None:
+		"""Stop the flusher after a last attempt (up to drain_seconds) to send what is spooled."""
+		self._stopping = True
+		self._wake.set()
+		self._thread.join()
+		deadline = time.monotonic() + self.drain_seconds
+		try:
+			while time.monotonic() < deadline and self.flush_once():
+				pass
+		except Exception as e:
+			logger.warning("Supabase unavailable at shutdown (%s); %d bytes stay spooled for the next run", e, self.pending_bytes())
+		with self._write_lock:
+			self._active.close()
+		self._lock_file.close()
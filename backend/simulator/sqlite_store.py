@@ -0,0 +1,127 @@
+"""Embedded SQLite store mirroring the Supabase schema, for running the stack offline.
+
+Tables and indexes follow database/sql/01_schema_tables.sql, 02_indexes.sql,
+05_forecasts.sql and 06_regions.sql. Timestamps are stored as ISO-8601 UTC text, which
+sorts chronologically, so time-range queries use the timestamp indexes. The database runs
+in WAL mode so readers (analysis, Streamlit, forecasting) are not blocked by the simulator.
+"""
+
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, List
+
+from .models import RecordBatch
+from .storage import ensure_dir
+
+SCHEMA = """
+create table if not exists co2_intensity (
+	id integer primary key,
+	"timestamp" text not null,
+	co2_intensity_g_per_kwh real not null,
+	region_id text not null default 'default'
+);
+
+create table if not exists generation_mix (
+	id integer primary key,
+	"timestamp" text not null,
+	hydro_mw real not null,
+	wind_mw real not null,
+	solar_mw real not null,
+	nuclear_mw real not null,
+	fossil_mw real not null,
+	total_mw real not null,
+	renewable_share_pct real not null,
+	region_id text not null default 'default'
+);
+
+create table if not exists netzero_alignment (
+	"year" integer primary key,
+	actual_emissions_mt real not null,
+	target_emissions_mt real not null,
+	alignment_pct real not null
+);
+
+create table if not exists co2_forecasts (
+	id integer primary key,
+	"timestamp" text not null,
+	co2_intensity_g_per_kwh real not null,
+	forecast_type text not null default 'linear_regression',
+	forecast_horizon_hours integer not null default 24,
+	created_at text not null default (strftime('%Y-%m-%dT%H:%M:%S+00:00', 'now')),
+	updated_at text not null default (strftime('%Y-%m-%dT%H:%M:%S+00:00', 'now'))
+);
+
+create index if not exists idx_co2_intensity_ts on co2_intensity ("timestamp");
+create index if not exists idx_generation_mix_ts on generation_mix ("timestamp");
+create index if not exists idx_co2_intensity_region_ts on co2_intensity (region_id, "timestamp");
+create index if not exists idx_generation_mix_region_ts on generation_mix (region_id, "timestamp");
+create index if not exists idx_co2_forecasts_timestamp on co2_forecasts ("timestamp");
+create index if not exists idx_co2_forecasts_created_at on co2_forecasts (created_at);
+create index if not exists idx_co2_forecasts_type on co2_forecasts (forecast_type);
+"""
+
+# Yearly alignment keeps the first row per year, like the Supabase ignore-duplicates upsert
+_IGNORE_DUPLICATES = {"netzero_alignment"}
+
+
+def connect(path: str) -> sqlite3.Connection:
+	"""Open (creating if needed) the database with the schema applied and WAL enabled."""
+	ensure_dir(os.path.dirname(path))
+	# The async runner writes from worker threads, one call at a time per sink
+	conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+	conn.execute("pragma journal_mode=wal")
+	# WAL keeps the database consistent with NORMAL; only the last commits may be lost on power failure
+	conn.execute("pragma synchronous=normal")
+	conn.executescript(SCHEMA)
+	return conn
+
+
+def _insert_sql(table: str, columns: List[str]) -> str:
+	verb = "insert or ignore" if table in _IGNORE_DUPLICATES else "insert"
+	names = ", ".join(f'"{c}"' for c in columns)
+	return f"{verb} into {table} ({names}) values ({', '.join('?' * len(columns))})"
+
+
+class SqliteStore:
+	"""One connection used for bulk inserts; each call is a single transaction."""
+
+	def __init__(self, path: str):
+		self.path = path
+		self._conn = connect(path)
+
+	def insert_batch(self, table: str, batch: RecordBatch) -> int:
+		# id columns are None so SQLite assigns them
+		columns = [n for n in batch.names if batch.columns[n] is not None]
+		if not len(batch) or not columns:
+			return 0
+		with self._conn:
+			self._conn.executemany(_insert_sql(table, columns), batch.rows(columns))
+		return len(batch)
+
+	def insert_rows(self, table: str, rows: Iterable[Dict[str, Any]]) -> int:
+		rows = list(rows)
+		if not rows:
+			return 0
+		columns = [k for k, v in rows[0].items() if v is not None]
+		with self._conn:
+			self._conn.executemany(_insert_sql(table, columns), [tuple(r.get(c) for c in columns) for r in rows])
+		return len(rows)
+
+	def close(self) -> None:
+		if self._conn is not None:
+			self._conn.close()
+			self._conn = None
+
+
+class SqliteSink:
+	"""write_batch/close adapter for one table of a shared SqliteStore (see simulate.open_sinks)."""
+
+	def __init__(self, store: SqliteStore, table: str):
+		self.store = store
+		self.table = table
+
+	def write_batch(self, batch: RecordBatch) -> int:
+		return self.store.insert_batch(self.table, batch)
+
+	def close(self) -> None:
+		self.store.close()
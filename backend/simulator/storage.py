@@ -1,7 +1,14 @@
 import csv
+import io
 import os
+import time
+import uuid
 from datetime import datetime
-from typing import Iterable, Dict, Any
+from typing import Iterable, Dict, Any, List, Optional
+
+import numpy as np
+
+from .models import RecordBatch
 
 
 def ensure_dir(path: str) -> None:
@@ -9,15 +16,68 @@ def ensure_dir(path: str) -> None:
 		os.makedirs(path, exist_ok=True)
 
 
+def read_csv_header(path: str) -> Optional[List[str]]:
+	"""Column names on the first line of ``path``; None when the file is missing or empty."""
+	if not os.path.isfile(path) or os.path.getsize(path) == 0:
+		return None
+	with open(path, newline="", encoding="utf-8") as f:
+		return next(csv.reader(f), None)
+
+
+def check_csv_header(path: str, names: List[str]) -> bool:
+	"""True when ``path`` still needs a header; raises ValueError when it has different columns.
+
+	Appending rows under another header would shift every field for all readers.
+	"""
+	header = read_csv_header(path)
+	if header is None:
+		return True
+	if header != list(names):
+		raise ValueError(f"{path} has columns {header}, but the simulator writes {list(names)}; run `python -m simulator.simulate migrate-csv` or move the file aside")
+	return False
+
+
+def migrate_csv_header(path: str, names: List[str], defaults: Dict[str, str]) -> int:
+	"""Rewrite ``path`` with columns ``names``, filling added columns from ``defaults``.
+
+	Streams the file to a temporary copy that replaces it atomically; returns the rows
+	migrated (0 when the header already matches or the file is missing). Raises ValueError
+	when the file has a column outside ``names`` or lacks one without a default.
+	"""
+	header = read_csv_header(path)
+	if header is None or header == list(names):
+		return 0
+	unknown = [c for c in header if c not in names]
+	missing = [c for c in names if c not in header and c not in defaults]
+	if unknown or missing:
+		raise ValueError(f"{path}: cannot migrate columns {header} to {list(names)} (unknown {unknown}, no default for {missing})")
+	tmp = f"{path}.migrate"
+	rows = 0
+	with open(path, newline="", encoding="utf-8") as src, open(tmp, "w", newline="", encoding="utf-8") as dst:
+		reader = csv.DictReader(src)
+		writer = csv.writer(dst)
+		writer.writerow(names)
+		for row in reader:
+			writer.writerow([row[c] if c in header else defaults[c] for c in names])
+			rows += 1
+		dst.flush()
+		os.fsync(dst.fileno())
+	os.replace(tmp, path)
+	# A sidecar index from compaction holds byte offsets of the old layout
+	if os.path.isfile(f"{path}.idx"):
+		os.remove(f"{path}.idx")
+	return rows
+
+
 def append_csv(path: str, rows: Iterable[Dict[str, Any]]) -> None:
 	rows = list(rows)
 	if not rows:
 		return
 	ensure_dir(os.path.dirname(path))
-	file_exists = os.path.isfile(path)
+	needs_header = check_csv_header(path, list(rows[0].keys()))
 	with open(path, "a", newline="", encoding="utf-8") as f:
 		writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
-		if not file_exists:
+		if needs_header:
 			writer.writeheader()
 		for row in rows:
 			writer.writerow(_serialize_row(row))
@@ -33,4 +93,189 @@ def _serialize_row(row: Dict[str, Any]) -> Dict[str, Any]:
 	return out
 
 
+def append_csv_batch(path: str, batch: RecordBatch) -> int:
+	"""Append a RecordBatch column-wise, without building per-row dicts. Returns the row count."""
+	if not len(batch):
+		return 0
+	ensure_dir(os.path.dirname(path))
+	needs_header = check_csv_header(path, batch.names)
+	with open(path, "a", newline="", encoding="utf-8") as f:
+		writer = csv.writer(f)
+		if needs_header:
+			writer.writerow(batch.names)
+		writer.writerows(batch.csv_rows())
+	return len(batch)
+
+
+FSYNC_POLICIES = ("none", "per-flush", "per-row")
+
+
+class CsvSink:
+	"""Long-lived, buffered appender for one CSV file.
+
+	The file is opened and its header checked once (at construction when ``names`` is given);
+	an existing file with different columns raises ValueError. Rows are formatted column-wise into an
+	in-memory buffer and written when ``flush_rows`` rows are pending or ``flush_seconds``
+	have passed since the last flush (checked on each write), and on close. ``fsync``
+	controls durability: "none" leaves it to the OS, "per-flush" syncs after every flush,
+	"per-row" writes and syncs each row as it arrives.
+	"""
+
+	def __init__(self, path: str, flush_rows: int = 1000, flush_seconds: float = 5.0, fsync: str = "none", names: Optional[List[str]] = None):
+		if fsync not in FSYNC_POLICIES:
+			raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+		if names is not None:
+			# Fail when the run starts, not on its first write, if an existing file has other columns
+			check_csv_header(path, names)
+		self.path = path
+		self.flush_rows = flush_rows
+		self.flush_seconds = flush_seconds
+		self.fsync = fsync
+		self._file = None
+		self._header_written = False
+		self._buffer = io.StringIO()
+		self._writer = csv.writer(self._buffer)
+		self._pending = 0
+		self._last_flush = time.monotonic()
+		self.rows_written = 0
+
+	def _open(self, names: List[str]) -> None:
+		ensure_dir(os.path.dirname(self.path))
+		# Checked once per sink, not per write: an existing file must have the same columns
+		self._header_written = not check_csv_header(self.path, names)
+		self._file = open(self.path, "a", newline="", encoding="utf-8")
+
+	def write_batch(self, batch: RecordBatch) -> int:
+		"""Buffer a RecordBatch; returns the number of rows accepted."""
+		if not len(batch):
+			return 0
+		if self._file is None:
+			self._open(batch.names)
+		if not self._header_written:
+			self._writer.writerow(batch.names)
+			self._header_written = True
+		if self.fsync == "per-row":
+			for row in batch.csv_rows():
+				self._writer.writerow(row)
+				self._pending += 1
+				self.flush()
+		else:
+			self._writer.writerows(batch.csv_rows())
+			self._pending += len(batch)
+			if self._pending >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+				self.flush()
+		return len(batch)
+
+	def flush(self) -> None:
+		"""Write buffered rows to the file (and sync them, per the fsync policy)."""
+		if self._file is None:
+			return
+		text = self._buffer.getvalue()
+		if text:
+			self._file.write(text)
+			self._buffer.seek(0)
+			self._buffer.truncate()
+		self._file.flush()
+		if self.fsync != "none" and text:
+			os.fsync(self._file.fileno())
+		self.rows_written += self._pending
+		self._pending = 0
+		self._last_flush = time.monotonic()
+
+	def close(self) -> None:
+		if self._file is None:
+			return
+		self.flush()
+		self._file.close()
+		self._file = None
+
+	def __enter__(self) -> "CsvSink":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
+
+
+def _pyarrow():
+	try:
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+	except ImportError as e:
+		raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)") from e
+	return pa, pq
+
+
+def batch_to_arrow(batch: RecordBatch):
+	"""Arrow table of a RecordBatch; timestamps as UTC microseconds, None columns dropped."""
+	pa, _ = _pyarrow()
+	arrays = {}
+	for name in batch.names:
+		col = batch.column(name)
+		if col is None:
+			continue
+		if np.issubdtype(col.dtype, np.datetime64):
+			arrays[name] = pa.array(col.astype("datetime64[us]"), type=pa.timestamp("us", tz="UTC"))
+		else:
+			arrays[name] = pa.array(col)
+	return pa.table(arrays)
+
+
+class ParquetSink:
+	"""Buffered writer for one table into ``<root>/<table>/date=YYYY-MM-DD/part-*.parquet``.
+
+	Rows are flushed as one new part file per day touched, after ``flush_rows`` rows or
+	``flush_seconds`` (checked on write), and on close. Tables without a timestamp are
+	written unpartitioned. Part files appear atomically and have unique names, so readers
+	never see partial files and several writers can share a root.
+	"""
+
+	def __init__(self, root: str, table: str, flush_rows: int = 10000, flush_seconds: float = 600.0):
+		_pyarrow()
+		self.root = root
+		self.table = table
+		self.flush_rows = flush_rows
+		self.flush_seconds = flush_seconds
+		self._pending: list = []
+		self._pending_rows = 0
+		self._last_flush = time.monotonic()
+		self.files_written = 0
+
+	def write_batch(self, batch: RecordBatch) -> int:
+		if not len(batch):
+			return 0
+		self._pending.append(batch)
+		self._pending_rows += len(batch)
+		if self._pending_rows >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+			self.flush()
+		return len(batch)
+
+	def flush(self) -> None:
+		if self._pending:
+			batch = RecordBatch.concat(self._pending)
+			self._pending, self._pending_rows = [], 0
+			if "timestamp" in batch.columns:
+				days = batch["timestamp"].astype("datetime64[D]")
+				for day in np.unique(days):
+					self._write_part(batch.take(days == day), os.path.join(self.root, self.table, f"date={day}"))
+			else:
+				self._write_part(batch, os.path.join(self.root, self.table))
+		self._last_flush = time.monotonic()
+
+	def _write_part(self, batch: RecordBatch, directory: str) -> None:
+		_, pq = _pyarrow()
+		ensure_dir(directory)
+		path = os.path.join(directory, f"part-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet")
+		tmp = f"{path}.tmp"
+		pq.write_table(batch_to_arrow(batch), tmp)
+		os.replace(tmp, path)
+		self.files_written += 1
+
+	def close(self) -> None:
+		self.flush()
+
+	def __enter__(self) -> "ParquetSink":
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self.close()
 
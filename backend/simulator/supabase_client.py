@@ -1,22 +1,64 @@
-from typing import Iterable, Dict, Any, Optional
+import json
+import logging
+import threading
+from typing import Iterable, Dict, Any, List, Optional, Tuple
+import numpy as np
 import requests
 from datetime import datetime
 
+from .models import RecordBatch
+from .transport import HttpTransport, get_transport
+
+logger = logging.getLogger(__name__)
+
+# Batching mode keeps at most this many batch_rows worth of unsent rows while Supabase fails
+MAX_PENDING_BATCHES = 50
+
+
+def dedup_batch(batch: RecordBatch, on_conflict: str, keep_last: bool = True) -> RecordBatch:
+	"""One row per ``on_conflict`` key, in order: an upsert may not touch the same row twice."""
+	keys = zip(*(batch.column(c).tolist() for c in on_conflict.split(",")))
+	index: Dict[tuple, int] = {}
+	for i, key in enumerate(keys):
+		if keep_last or key not in index:
+			index[key] = i
+	if len(index) == len(batch):
+		return batch
+	return batch.take(np.sort(np.fromiter(index.values(), dtype=np.int64)))
+
 
 class SupabaseClient:
-	def __init__(self, url: Optional[str], key: Optional[str]):
+	"""PostgREST client. With ``batch_rows`` set, insert_batch accumulates rows per table across
+	calls and sends them when ``batch_rows`` rows are pending or the oldest has waited
+	``batch_seconds``; call flush()/close() on shutdown.
+	"""
+
+	def __init__(self, url: Optional[str], key: Optional[str], transport: Optional[HttpTransport] = None, batch_rows: int = 0, batch_seconds: float = 5.0):
 		self.url = url
 		self.key = key
+		# Pooled keep-alive connections shared by every client in the process
+		self.transport = transport or get_transport()
+		self.batch_rows = batch_rows
+		self.batch_seconds = batch_seconds
+		# (table, on_conflict, resolution, chunk_size) -> batches in arrival order
+		self._pending: Dict[Tuple[str, Optional[str], Optional[str], Optional[int]], List[RecordBatch]] = {}
+		self._pending_rows = 0
+		self._lock = threading.RLock()
+		self._timer: Optional[threading.Timer] = None
 
 	def enabled(self) -> bool:
 		return bool(self.url and self.key)
 
-	def insert_rows(self, table: str, rows: Iterable[Dict[str, Any]], on_conflict: Optional[str] = None, resolution: Optional[str] = None) -> None:
+	def insert_rows(self, table: str, rows: Iterable[Dict[str, Any]], on_conflict: Optional[str] = None, resolution: Optional[str] = None, chunk_size: Optional[int] = None) -> None:
 		if not self.enabled():
 			return
 		rows = list(rows)
 		if not rows:
 			return
+		if chunk_size and len(rows) > chunk_size:
+			for i in range(0, len(rows), chunk_size):
+				self.insert_rows(table, rows[i:i + chunk_size], on_conflict=on_conflict, resolution=resolution)
+			return
 		# Serialize datetimes to ISO strings for JSON
 		payload = []
 		for r in rows:
@@ -30,6 +72,128 @@ class SupabaseClient:
 				else:
 					obj[k] = v
 			payload.append(obj)
+		self._post(table, json.dumps(payload), on_conflict=on_conflict, resolution=resolution)
+
+	def insert_batch(self, table: str, batch: RecordBatch, on_conflict: Optional[str] = None, resolution: Optional[str] = None, chunk_size: Optional[int] = None) -> None:
+		"""Insert a RecordBatch; the JSON body is serialized column-wise, once per chunk."""
+		if not self.enabled() or not len(batch):
+			return
+		if not self.batch_rows:
+			if on_conflict:
+				batch = dedup_batch(batch, on_conflict, keep_last=resolution != "ignore-duplicates")
+			self._send_batch(table, batch, on_conflict, resolution, chunk_size)
+			return
+		with self._lock:
+			self._pending.setdefault((table, on_conflict, resolution, chunk_size), []).append(batch)
+			self._pending_rows += len(batch)
+			if self._timer is None and self.batch_seconds > 0:
+				self._timer = threading.Timer(self.batch_seconds, self._flush_on_timer)
+				self._timer.daemon = True
+				self._timer.start()
+			if self._pending_rows >= self.batch_rows:
+				# Once buffered, rows are retried by the buffer (timer, next flush, close), not by
+				# the caller: re-raising would make it insert the same rows again
+				try:
+					self.flush()
+				except Exception as e:
+					logger.warning("Supabase batch flush failed (%s); %d rows stay buffered", e, self._pending_rows)
+					self._schedule_retry()
+
+	def _send_batch(self, table: str, batch: RecordBatch, on_conflict: Optional[str], resolution: Optional[str], chunk_size: Optional[int], sent: Optional[List[int]] = None) -> None:
+		for chunk in batch.chunks(chunk_size or len(batch)):
+			self._post(table, chunk.to_json(), on_conflict=on_conflict, resolution=resolution)
+			if sent is not None:
+				sent[0] += len(chunk)
+
+	def flush(self) -> None:
+		"""Send every accumulated row, one concatenated payload per table (chunked by chunk_size).
+
+		On failure the unsent rows (not chunks already accepted) stay queued for the next flush
+		and the error is raised.
+		"""
+		with self._lock:
+			if self._timer is not None:
+				self._timer.cancel()
+				self._timer = None
+			while self._pending:
+				key = next(iter(self._pending))
+				table, on_conflict, resolution, chunk_size = key
+				batches = self._pending[key]
+				batch = batches[0] if len(batches) == 1 else RecordBatch.concat(batches)
+				if on_conflict:
+					# Same key twice: upserts keep the latest row, ignore-duplicates the first
+					batch = dedup_batch(batch, on_conflict, keep_last=resolution != "ignore-duplicates")
+				sent = [0]
+				try:
+					self._send_batch(table, batch, on_conflict, resolution, chunk_size, sent)
+				except Exception:
+					if sent[0]:
+						self._pending[key] = [batch.slice(sent[0], len(batch))]
+						self._pending_rows -= sum(len(b) for b in batches) - (len(batch) - sent[0])
+					self._trim_pending()
+					raise
+				del self._pending[key]
+				self._pending_rows -= sum(len(b) for b in batches)
+
+	def _trim_pending(self) -> None:
+		# Bound memory while Supabase is down: drop the oldest batches beyond the cap
+		limit = self.batch_rows * MAX_PENDING_BATCHES
+		for batches in self._pending.values():
+			while self._pending_rows > limit and len(batches) > 1:
+				dropped = batches.pop(0)
+				self._pending_rows -= len(dropped)
+				logger.error("Supabase unavailable; dropped %d buffered rows", len(dropped))
+
+	def _flush_on_timer(self) -> None:
+		with self._lock:
+			self._timer = None
+			try:
+				self.flush()
+			except Exception as e:
+				logger.warning("Supabase batch flush failed (%s); %d rows stay buffered", e, self._pending_rows)
+				self._schedule_retry()
+
+	def _schedule_retry(self) -> None:
+		if self._pending and self._timer is None and self.batch_seconds > 0:
+			self._timer = threading.Timer(self.batch_seconds, self._flush_on_timer)
+			self._timer.daemon = True
+			self._timer.start()
+
+	def close(self) -> None:
+		"""Flush accumulated rows (batching mode)."""
+		self.flush()
+
+	def select_rows(self, table: str, params: Dict[str, str], offset: int = 0, limit: int = 1000) -> List[Dict[str, Any]]:
+		"""One page of a PostgREST select (``params`` are query filters, e.g. select/order/timestamp)."""
+		endpoint = f"{self.url}/rest/v1/{table}"
+		headers = {
+			"apikey": self.key,
+			"Authorization": f"Bearer {self.key}",
+		}
+		resp = self.transport.get(endpoint, params={**params, "offset": str(offset), "limit": str(limit)}, headers=headers)
+		try:
+			resp.raise_for_status()
+		except requests.HTTPError as e:
+			raise requests.HTTPError(f"{e} | details: {resp.text}") from e
+		return resp.json()
+
+	def rpc(self, function: str, params: Dict[str, Any]) -> Any:
+		"""Call a Postgres function exposed by PostgREST (``/rest/v1/rpc/<function>``)."""
+		endpoint = f"{self.url}/rest/v1/rpc/{function}"
+		headers = {
+			"apikey": self.key,
+			"Authorization": f"Bearer {self.key}",
+			"Content-Type": "application/json",
+		}
+		# Long-running maintenance functions get a longer read timeout
+		resp = self.transport.post(endpoint, data=json.dumps(params), headers=headers, timeout=(self.transport.timeout[0], 300))
+		try:
+			resp.raise_for_status()
+		except requests.HTTPError as e:
+			raise requests.HTTPError(f"{e} | details: {resp.text}", response=resp) from e
+		return resp.json() if resp.content else None
+
+	def _post(self, table: str, body: str, on_conflict: Optional[str] = None, resolution: Optional[str] = None) -> None:
 		endpoint = f"{self.url}/rest/v1/{table}"
 		if on_conflict:
 			endpoint = f"{endpoint}?on_conflict={on_conflict}"
@@ -39,10 +203,10 @@ class SupabaseClient:
 			"Content-Type": "application/json",
 			"Prefer": f"{'resolution='+resolution+',' if resolution else ''}return=minimal",
 		}
-		resp = requests.post(endpoint, json=payload, headers=headers, timeout=30)
+		# Upserts may be re-sent after a timeout or 5xx; plain inserts only when the connection never opened
+		resp = self.transport.post(endpoint, data=body.encode("utf-8"), headers=headers, idempotent=bool(on_conflict))
 		try:
 			resp.raise_for_status()
 		except requests.HTTPError as e:
-			# Attach response text for easier debugging
-			raise requests.HTTPError(f"{e} | details: {resp.text}") from e
-
+			# Attach response text for easier debugging; keep the response for status checks
+			raise requests.HTTPError(f"{e} | details: {resp.text}", response=resp) from e
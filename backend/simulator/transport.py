@@ -0,0 +1,153 @@
+"""Shared HTTP transport for Supabase: one keep-alive session, retries, timeouts and counters.
+
+Every Supabase call (simulator writes, analysis and dashboard reads, the forecaster) goes
+through ``get_transport()``, so connections are pooled and reused instead of paying a TCP
+and TLS handshake per request. Connection errors, 429 and 5xx responses are retried with
+jittered exponential backoff (``Retry-After`` is honoured). Timeouts and 5xx on requests
+that may already have been applied are retried only when the caller marks them idempotent.
+
+Settings come from the environment: HTTP_POOL_SIZE (10), HTTP_MAX_RETRIES (3),
+HTTP_BACKOFF_SECONDS (0.5), HTTP_CONNECT_TIMEOUT (5) and HTTP_READ_TIMEOUT (30).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+BACKOFF_MAX_SECONDS = 30.0
+
+
+@dataclass
+class TransportStats:
+	requests: int = 0
+	retries: int = 0
+	failures: int = 0
+	last_latency_s: float = 0.0
+	max_latency_s: float = 0.0
+	total_latency_s: float = 0.0
+
+	@property
+	def mean_latency_s(self) -> float:
+		return self.total_latency_s / self.requests if self.requests else 0.0
+
+
+def _never_sent(error: Exception) -> bool:
+	"""True when the connection could not be opened, so the server cannot have seen the request."""
+	if isinstance(error, requests.ConnectTimeout):
+		return True
+	reason = getattr(error.args[0], "reason", None) if error.args else None
+	return isinstance(reason, NewConnectionError)
+
+
+class HttpTransport:
+	"""A pooled ``requests.Session`` with retries; safe to share between threads."""
+
+	def __init__(self, pool_size: int = 10, max_retries: int = 3, backoff_seconds: float = 0.5, connect_timeout: float = 5.0, read_timeout: float = 30.0):
+		self.max_retries = max_retries
+		self.backoff_seconds = backoff_seconds
+		self.timeout = (connect_timeout, read_timeout)
+		self.session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+		self.session.mount("https://", adapter)
+		self.session.mount("http://", adapter)
+		self._lock = threading.Lock()
+		self._stats = TransportStats()
+
+	def _delay(self, attempt: int, resp: Optional[requests.Response]) -> float:
+		retry_after = resp.headers.get("Retry-After") if resp is not None else None
+		if retry_after and retry_after.isdigit():
+			return min(BACKOFF_MAX_SECONDS, float(retry_after))
+		# Full jitter: concurrent clients do not retry in lockstep
+		return random.uniform(0, min(BACKOFF_MAX_SECONDS, self.backoff_seconds * 2 ** attempt))
+
+	def request(self, method: str, url: str, idempotent: Optional[bool] = None, timeout=None, **kwargs) -> requests.Response:
+		"""Send a request, retrying transient failures; returns the last response (not raised for status).
+
+		``idempotent`` defaults to True for GET/HEAD; it allows retrying read timeouts and 5xx,
+		after which the server may already have applied the request.
+		"""
+		if idempotent is None:
+			idempotent = method.upper() in ("GET", "HEAD")
+		for attempt in range(self.max_retries + 1):
+			resp, error = None, None
+			start = time.perf_counter()
+			try:
+				resp = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+			except (requests.ConnectionError, requests.Timeout) as e:
+				error = e
+			latency = time.perf_counter() - start
+			with self._lock:
+				s = self._stats
+				s.requests += 1
+				s.last_latency_s = latency
+				s.max_latency_s = max(s.max_latency_s, latency)
+				s.total_latency_s += latency
+			if error is not None:
+				retryable = idempotent or _never_sent(error)
+			else:
+				retryable = resp.status_code == 429 or (resp.status_code in RETRY_STATUS and idempotent)
+			if not retryable or attempt == self.max_retries:
+				if error is not None:
+					with self._lock:
+						self._stats.failures += 1
+					raise error
+				if resp.status_code >= 400:
+					with self._lock:
+						self._stats.failures += 1
+				return resp
+			delay = self._delay(attempt, resp)
+			with self._lock:
+				self._stats.retries += 1
+			logger.warning("%s %s failed (%s); retry %d/%d in %.2fs", method, url.split("?", 1)[0], error or resp.status_code, attempt + 1, self.max_retries, delay)
+			time.sleep(delay)
+		raise AssertionError("unreachable")
+
+	def get(self, url: str, **kwargs) -> requests.Response:
+		return self.request("GET", url, **kwargs)
+
+	def post(self, url: str, **kwargs) -> requests.Response:
+		return self.request("POST", url, **kwargs)
+
+	def stats(self) -> TransportStats:
+		with self._lock:
+			return TransportStats(**asdict(self._stats))
+
+	def close(self) -> None:
+		self.session.close()
+
+
+_shared: Optional[HttpTransport] = None
+_shared_lock = threading.Lock()
+
+
+def transport_settings() -> dict:
+	"""HttpTransport keyword arguments from the environment (shared with the async client)."""
+	return {
+		"pool_size": int(os.getenv("HTTP_POOL_SIZE", "10")),
+		"max_retries": int(os.getenv("HTTP_MAX_RETRIES", "3")),
+		"backoff_seconds": float(os.getenv("HTTP_BACKOFF_SECONDS", "0.5")),
+		"connect_timeout": float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+		"read_timeout": float(os.getenv("HTTP_READ_TIMEOUT", "30")),
+	}
+
+
+def get_transport() -> HttpTransport:
+	"""The process-wide transport, created from the environment on first use."""
+	global _shared
+	with _shared_lock:
+		if _shared is None:
+			_shared = HttpTransport(**transport_settings())
+		return _shared
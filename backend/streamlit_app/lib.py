@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 import os
+from typing import Optional
+
 import pandas as pd
-import requests
 
 
 def get_env():
@@ -11,15 +12,13 @@ def get_env():
 	return os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
 
 
-def fetch_table(table: str, limit: int = 500, order: str = "timestamp") -> pd.DataFrame:
+def fetch_table(table: str, limit: int = 500, order: str = "timestamp", columns: Optional[list[str]] = None) -> pd.DataFrame:
+	"""Latest ``limit`` rows of ``table``, from Supabase or, with DATA_BACKEND=sqlite, the local SQLite database."""
 	url, key = get_env()
+	if os.getenv("DATA_BACKEND", "supabase") == "sqlite":
+		from analysis.data_access import read_sqlite_table
+		return read_sqlite_table(os.getenv("SQLITE_PATH", "data/simulator.db"), table, columns=columns, limit=limit, order=order, descending=True)
 	if not url or not key:
 		raise RuntimeError("Supabase URL/KEY not set")
-	endpoint = f"{url}/rest/v1/{table}?select=*&order={order}.desc&limit={limit}"
-	headers = {"apikey": key, "Authorization": f"Bearer {key}"}
-	resp = requests.get(endpoint, headers=headers, timeout=30)
-	resp.raise_for_status()
-	return pd.DataFrame(resp.json())
-
-
-
+	from analysis.data_access import fetch_supabase_table
+	return fetch_supabase_table(table, limit=limit, order=order, columns=columns)
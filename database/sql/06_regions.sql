@@ -0,0 +1,9 @@
+-- Multi-region support: every time-series row belongs to a region (grid).
+-- Existing rows are assigned to the original single grid, 'default'.
+-- Required by the simulator even for a single grid: it always writes region_id (as 'default').
+
+alter table public.co2_intensity add column if not exists region_id text not null default 'default';
+alter table public.generation_mix add column if not exists region_id text not null default 'default';
+
+create index if not exists idx_co2_intensity_region_ts on public.co2_intensity (region_id, "timestamp");
+create index if not exists idx_generation_mix_region_ts on public.generation_mix (region_id, "timestamp");
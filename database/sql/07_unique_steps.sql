@@ -0,0 +1,40 @@
+-- Idempotent simulator writes: at most one row per region and step.
+-- With SUPABASE_SPOOL_DIR (or SUPABASE_STEP_UPSERTS) set, the simulator upserts on
+-- (region_id, "timestamp") and snaps timestamps to the step grid, so a batch that is re-sent
+-- after a timeout or partial failure updates rows instead of duplicating them.
+-- Run after 06_regions.sql. Existing rows are snapped to the nearest step of the 15-minute grid
+-- (older runs wrote wall-clock timestamps off the grid; for another SIM_STEP_MINUTES replace 900
+-- and 450 with the step and half step in seconds), and only the latest row (highest id) of each region and step is kept.
+
+delete from public.co2_intensity
+where id in (
+  select id from (
+    select id, row_number() over (
+      partition by region_id, floor((extract(epoch from "timestamp") + 450) / 900)
+      order by id desc
+    ) as rn
+    from public.co2_intensity
+  ) ranked
+  where rn > 1
+);
+
+delete from public.generation_mix
+where id in (
+  select id from (
+    select id, row_number() over (
+      partition by region_id, floor((extract(epoch from "timestamp") + 450) / 900)
+      order by id desc
+    ) as rn
+    from public.generation_mix
+  ) ranked
+  where rn > 1
+);
+
+update public.co2_intensity set "timestamp" = to_timestamp(floor((extract(epoch from "timestamp") + 450) / 900) * 900)
+where extract(epoch from "timestamp") <> floor((extract(epoch from "timestamp") + 450) / 900) * 900;
+
+update public.generation_mix set "timestamp" = to_timestamp(floor((extract(epoch from "timestamp") + 450) / 900) * 900)
+where extract(epoch from "timestamp") <> floor((extract(epoch from "timestamp") + 450) / 900) * 900;
+
+create unique index if not exists uq_co2_intensity_region_ts on public.co2_intensity (region_id, "timestamp");
+create unique index if not exists uq_generation_mix_region_ts on public.generation_mix (region_id, "timestamp");
@@ -0,0 +1,128 @@
+-- Retention: raw co2_intensity / generation_mix rows are kept for a window (default 30 days);
+-- older rows are folded into hourly and daily rollups per region and then deleted.
+-- Run after 07_unique_steps.sql. Call with the service role key:
+--   select public.apply_retention(30, 15);            -- retain_days, step_minutes
+-- or schedule it daily with pg_cron:
+--   select cron.schedule('apply-retention', '15 0 * * *', $$select public.apply_retention(30, 15)$$);
+-- The first run over a long history may need a longer statement_timeout.
+
+create table if not exists public.co2_intensity_hourly (
+	"timestamp" timestamptz not null,
+	region_id text not null,
+	samples integer not null,
+	co2_intensity_g_per_kwh_mean numeric,
+	co2_intensity_g_per_kwh_min numeric,
+	co2_intensity_g_per_kwh_max numeric,
+	co2_intensity_g_per_kwh_weighted numeric, -- weighted by generation_mix.total_mw
+	energy_mwh numeric,
+	primary key (region_id, "timestamp")
+);
+
+create table if not exists public.co2_intensity_daily (like public.co2_intensity_hourly including all);
+
+create table if not exists public.generation_mix_hourly (
+	"timestamp" timestamptz not null,
+	region_id text not null,
+	samples integer not null,
+	hydro_mw_mean numeric, hydro_mw_min numeric, hydro_mw_max numeric,
+	wind_mw_mean numeric, wind_mw_min numeric, wind_mw_max numeric,
+	solar_mw_mean numeric, solar_mw_min numeric, solar_mw_max numeric,
+	nuclear_mw_mean numeric, nuclear_mw_min numeric, nuclear_mw_max numeric,
+	fossil_mw_mean numeric, fossil_mw_min numeric, fossil_mw_max numeric,
+	total_mw_mean numeric, total_mw_min numeric, total_mw_max numeric,
+	renewable_share_pct_mean numeric, renewable_share_pct_min numeric, renewable_share_pct_max numeric,
+	energy_mwh numeric,
+	primary key (region_id, "timestamp")
+);
+
+create table if not exists public.generation_mix_daily (like public.generation_mix_hourly including all);
+
+alter table public.co2_intensity_hourly enable row level security;
+alter table public.co2_intensity_daily enable row level security;
+alter table public.generation_mix_hourly enable row level security;
+alter table public.generation_mix_daily enable row level security;
+
+drop policy if exists "co2_intensity_hourly anon read" on public.co2_intensity_hourly;
+create policy "co2_intensity_hourly anon read" on public.co2_intensity_hourly for select using (true);
+drop policy if exists "co2_intensity_daily anon read" on public.co2_intensity_daily;
+create policy "co2_intensity_daily anon read" on public.co2_intensity_daily for select using (true);
+drop policy if exists "generation_mix_hourly anon read" on public.generation_mix_hourly;
+create policy "generation_mix_hourly anon read" on public.generation_mix_hourly for select using (true);
+drop policy if exists "generation_mix_daily anon read" on public.generation_mix_daily;
+create policy "generation_mix_daily anon read" on public.generation_mix_daily for select using (true);
+
+-- Rows that arrive after their bucket was rolled up are merged into it (counts, means, min/max
+-- and the energy weighting combine exactly), so running the job again is always safe.
+create or replace function public.apply_retention(retain_days integer default 30, step_minutes integer default 15)
+returns jsonb
+language plpgsql
+as $$
+declare
+	cutoff timestamptz := date_trunc('day', now() - make_interval(days => retain_days), 'UTC');
+	step_hours numeric := step_minutes / 60.0;
+	gen_metrics text[] := array['hydro_mw', 'wind_mw', 'solar_mw', 'nuclear_mw', 'fossil_mw', 'total_mw', 'renewable_share_pct'];
+	res text;
+	m text;
+	gen_cols text := '';
+	gen_select text := '';
+	gen_update text := '';
+	co2_deleted bigint;
+	gen_deleted bigint;
+begin
+	foreach m in array gen_metrics loop
+		gen_cols := gen_cols || format(', %1$I, %2$I, %3$I', m || '_mean', m || '_min', m || '_max');
+		gen_select := gen_select || format(', avg(%1$I), min(%1$I), max(%1$I)', m);
+		gen_update := gen_update || format(
+			', %1$I = (t.%1$I * t.samples + excluded.%1$I * excluded.samples) / (t.samples + excluded.samples)'
+			', %2$I = least(t.%2$I, excluded.%2$I), %3$I = greatest(t.%3$I, excluded.%3$I)',
+			m || '_mean', m || '_min', m || '_max');
+	end loop;
+
+	foreach res in array array['hour', 'day'] loop
+		execute format($sql$
+			insert into public.%I as t ("timestamp", region_id, samples,
+				co2_intensity_g_per_kwh_mean, co2_intensity_g_per_kwh_min, co2_intensity_g_per_kwh_max,
+				co2_intensity_g_per_kwh_weighted, energy_mwh)
+			select date_trunc(%L, c."timestamp", 'UTC'), c.region_id, count(*),
+				avg(c.co2_intensity_g_per_kwh), min(c.co2_intensity_g_per_kwh), max(c.co2_intensity_g_per_kwh),
+				sum(c.co2_intensity_g_per_kwh * g.total_mw) / nullif(sum(g.total_mw), 0),
+				sum(g.total_mw) * $2
+			from public.co2_intensity c
+			left join public.generation_mix g on g.region_id = c.region_id and g."timestamp" = c."timestamp"
+			where c."timestamp" < $1
+			group by 1, 2
+			on conflict (region_id, "timestamp") do update set
+				samples = t.samples + excluded.samples,
+				co2_intensity_g_per_kwh_mean = (t.co2_intensity_g_per_kwh_mean * t.samples + excluded.co2_intensity_g_per_kwh_mean * excluded.samples) / (t.samples + excluded.samples),
+				co2_intensity_g_per_kwh_min = least(t.co2_intensity_g_per_kwh_min, excluded.co2_intensity_g_per_kwh_min),
+				co2_intensity_g_per_kwh_max = greatest(t.co2_intensity_g_per_kwh_max, excluded.co2_intensity_g_per_kwh_max),
+				co2_intensity_g_per_kwh_weighted = (coalesce(t.co2_intensity_g_per_kwh_weighted * t.energy_mwh, 0) + coalesce(excluded.co2_intensity_g_per_kwh_weighted * excluded.energy_mwh, 0))
+					/ nullif(coalesce(t.energy_mwh, 0) + coalesce(excluded.energy_mwh, 0), 0),
+				energy_mwh = coalesce(t.energy_mwh, 0) + coalesce(excluded.energy_mwh, 0)
+			$sql$, 'co2_intensity_' || case res when 'hour' then 'hourly' else 'daily' end, res)
+			using cutoff, step_hours;
+
+		execute format($sql$
+			insert into public.%I as t ("timestamp", region_id, samples%s, energy_mwh)
+			select date_trunc(%L, g."timestamp", 'UTC'), g.region_id, count(*)%s, sum(g.total_mw) * $2
+			from public.generation_mix g
+			where g."timestamp" < $1
+			group by 1, 2
+			on conflict (region_id, "timestamp") do update set
+				samples = t.samples + excluded.samples%s,
+				energy_mwh = coalesce(t.energy_mwh, 0) + coalesce(excluded.energy_mwh, 0)
+			$sql$, 'generation_mix_' || case res when 'hour' then 'hourly' else 'daily' end, gen_cols, res, gen_select, gen_update)
+			using cutoff, step_hours;
+	end loop;
+
+	delete from public.co2_intensity where "timestamp" < cutoff;
+	get diagnostics co2_deleted = row_count;
+	delete from public.generation_mix where "timestamp" < cutoff;
+	get diagnostics gen_deleted = row_count;
+	return jsonb_build_object('cutoff', cutoff, 'co2_intensity_deleted', co2_deleted, 'generation_mix_deleted', gen_deleted);
+end;
+$$;
+
+-- Deletes raw history: only the service role may run it
+revoke all on function public.apply_retention(integer, integer) from public, anon, authenticated;
+grant execute on function public.apply_retention(integer, integer) to service_role;
@@ -0,0 +1,107 @@
+"""Benchmark the simulator hot loops with and without Numba.
+
+Runs the same seeded workloads in two subprocesses, one with SIM_NUMBA=0 (pure Python /
+NumPy) and one with the compiled kernels, checks that the outputs are identical and prints
+the timings side by side.
+
+	python scripts/benchmark_kernels.py [--steps 20000] [--batch 35040] [--repeat 5]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1] / "backend"
+
+
+def _best(fn, repeat: int) -> float:
+	best = float("inf")
+	for _ in range(repeat):
+		started = time.perf_counter()
+		fn()
+		best = min(best, time.perf_counter() - started)
+	return best
+
+
+def _digest(values) -> str:
+	return hashlib.sha256(repr(values).encode("utf-8")).hexdigest()[:16]
+
+
+def run_workloads(steps: int, batch: int, repeat: int) -> dict:
+	sys.path.insert(0, str(BACKEND))
+	import random
+	from datetime import datetime, timedelta, timezone
+
+	import numpy as np
+	import pandas as pd
+
+	from simulator import kernels
+	from simulator.bias import compute_co2_intensity
+	from simulator.simulate import simulate_batch, simulate_generation_mix
+
+	start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+	stamps = [start + timedelta(minutes=15 * i) for i in range(steps)]
+	index = pd.date_range(start, periods=batch, freq="15min")
+
+	def scalar_steps():
+		random.seed(42)
+		out = []
+		for ts in stamps:
+			gen = simulate_generation_mix(ts)
+			out.append((gen.total_mw, gen.renewable_share_pct, compute_co2_intensity(gen.renewable_share_pct, base_range=(100, 300))))
+		return out
+
+	def batch_steps():
+		co2, gen = simulate_batch(index, rng=np.random.default_rng(42))
+		return gen["total_mw"].tolist(), co2["co2_intensity_g_per_kwh"].tolist()
+
+	# Warm-up compiles (or loads cached) kernels outside the timings
+	scalar_outputs = scalar_steps()
+	batch_outputs = batch_steps()
+	return {
+		"numba": kernels.HAVE_NUMBA,
+		"scalar_s": _best(scalar_steps, repeat),
+		"batch_s": _best(batch_steps, repeat),
+		"scalar_digest": _digest(scalar_outputs),
+		"batch_digest": _digest(batch_outputs),
+	}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Benchmark simulator kernels with and without Numba")
+	parser.add_argument("--steps", type=int, default=20000, help="Scalar steps (simulate_generation_mix calls)")
+	parser.add_argument("--batch", type=int, default=35040, help="Timestamps per batch (a year of 15-minute steps)")
+	parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions; the best is reported")
+	parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.worker:
+		print(json.dumps(run_workloads(args.steps, args.batch, args.repeat)))
+		return
+
+	results = {}
+	for label, flag in (("fallback", "0"), ("numba", "1")):
+		env = {**os.environ, "SIM_NUMBA": flag}
+		cmd = [sys.executable, __file__, "--worker", "--steps", str(args.steps), "--batch", str(args.batch), "--repeat", str(args.repeat)]
+		out = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True).stdout
+		results[label] = json.loads(out.strip().splitlines()[-1])
+
+	base, fast = results["fallback"], results["numba"]
+	if not fast["numba"]:
+		print("Numba is not installed; only the fallback was measured.")
+	print(f"{'workload':<28}{'fallback':>12}{'numba':>12}{'speed-up':>10}")
+	for key, name in (("scalar_s", f"scalar x{args.steps}"), ("batch_s", f"batch of {args.batch}")):
+		print(f"{name:<28}{base[key] * 1000:>10.1f}ms{fast[key] * 1000:>10.1f}ms{base[key] / fast[key]:>9.2f}x")
+	same = base["scalar_digest"] == fast["scalar_digest"] and base["batch_digest"] == fast["batch_digest"]
+	print(f"identical results: {'yes' if same else 'NO'}")
+	if not same:
+		sys.exit(1)
+
+
+if __name__ == "__main__":
+	main()
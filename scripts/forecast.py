@@ -2,19 +2,24 @@
 """
 CO₂ Intensity Forecasting Script
 Generates 24-hour forecasts using historical data and saves to Supabase
+(or, with DATA_BACKEND=sqlite, to the local SQLite database at SQLITE_PATH)
 """
 
 import os
 import sys
 import json
-import requests
 from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any
 import numpy as np
 from dotenv import load_dotenv
 
 # Add the project root to the path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+# Shared helpers (SQLite readers, the pooled Supabase transport) live in the backend packages
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'backend'))
+
+from simulator.transport import get_transport
 
 load_dotenv()
 
@@ -22,8 +27,12 @@ class CO2Forecaster:
     def __init__(self):
         self.supabase_url = os.getenv('SUPABASE_URL')
         self.supabase_key = os.getenv('SUPABASE_KEY')
+        self.sqlite_path = os.getenv('SQLITE_PATH', 'data/simulator.db') if os.getenv('DATA_BACKEND') == 'sqlite' else None
+        
+        # Keep-alive connections and retries shared with every other Supabase call in the process
+        self.http = get_transport()
         
-        if not self.supabase_url or not self.supabase_key:
+        if not self.sqlite_path and (not self.supabase_url or not self.supabase_key):
             raise ValueError("Missing Supabase credentials")
     
     def fetch_historical_data(self, hours: int = 168) -> List[Dict[str, Any]]:
@@ -31,22 +40,15 @@ class CO2Forecaster:
         # Calculate start time (hours ago)
         start_time = datetime.now(timezone.utc) - timedelta(hours=hours)
         
-        url = f"{self.supabase_url}/rest/v1/co2_intensity"
-        headers = {
-            "apikey": self.supabase_key,
-            "Authorization": f"Bearer {self.supabase_key}",
-            "Content-Type": "application/json"
-        }
-        
-        params = {
-            "timestamp": f"gte.{start_time.isoformat()}",
-            "order": "timestamp.asc"
-        }
-        
-        response = requests.get(url, headers=headers, params=params)
-        response.raise_for_status()
+        if self.sqlite_path:
+            from analysis.data_access import read_sqlite_table
+            df = read_sqlite_table(self.sqlite_path, 'co2_intensity', start=start_time, columns=['timestamp', 'co2_intensity_g_per_kwh'])
+            return df.to_dict(orient='records')
         
-        return response.json()
+        # Only the two columns used; rows already in the local cache are not downloaded again
+        from analysis.data_access import fetch_supabase_cached
+        df = fetch_supabase_cached('co2_intensity', columns=['timestamp', 'co2_intensity_g_per_kwh'], start=start_time)
+        return df.to_dict(orient='records')
     
     def simple_linear_forecast(self, data: List[Dict[str, Any]], forecast_hours: int = 24) -> List[Dict[str, Any]]:
         """Simple linear regression forecast"""
@@ -149,6 +151,16 @@ class CO2Forecaster:
         if not forecasts:
             return
         
+        if self.sqlite_path:
+            from simulator.sqlite_store import SqliteStore
+            store = SqliteStore(self.sqlite_path)
+            try:
+                store.insert_rows('co2_forecasts', [{**f, "forecast_horizon_hours": 24} for f in forecasts])
+            finally:
+                store.close()
+            print(f"Saved {len(forecasts)} forecasts to {self.sqlite_path}")
+            return
+        
         url = f"{self.supabase_url}/rest/v1/co2_forecasts"
         headers = {
             "apikey": self.supabase_key,
@@ -162,7 +174,7 @@ class CO2Forecaster:
             forecast["created_at"] = datetime.now(timezone.utc).isoformat()
             forecast["forecast_horizon_hours"] = 24
         
-        response = requests.post(url, headers=headers, json=forecasts)
+        response = self.http.post(url, headers=headers, json=forecasts)
         response.raise_for_status()
         
         print(f"Saved {len(forecasts)} forecasts to Supabase")